@@ -7,6 +7,9 @@ from models import (
 )
 from auth import admin_required
 from security import check_user_security_score
+from metrics import metrics
+from health import provider_health
+from tts_cache import model_deactivated
 from sqlalchemy import func, desc, extract, text
 from datetime import datetime, timedelta
 import json
@@ -103,12 +106,16 @@ def edit_model(model_id):
     model = Model.query.get_or_404(model_id)
     
     if request.method == "POST":
+        was_active = model.is_active
         model.name = request.form.get("name")
         model.is_active = "is_active" in request.form
         model.is_open = "is_open" in request.form
         model.model_url = request.form.get("model_url")
         
         db.session.commit()
+        if was_active and not model.is_active:
+            # Drop the model's pregenerated clips from the TTS cache
+            model_deactivated(model.id)
         flash(f"Model '{model.name}' updated successfully", "success")
         return redirect(url_for("admin.models"))
     
@@ -688,6 +695,32 @@ def security():
         return redirect(url_for("admin.index"))
 
 
+@admin.route("/generation-metrics")
+@admin_required
+def generation_metrics():
+    """Per-model generation latency, payload size and error rates"""
+    model_names = {model.id: model.name for model in Model.query.all()}
+    return render_template(
+        "admin/generation_metrics.html",
+        generation_stats=metrics.generation_summary(),
+        cache_stats=metrics.cache_summary(),
+        breakers=provider_health.snapshot(),
+        model_names=model_names,
+    )
+
+
+@admin.route("/api/generation-metrics")
+@admin_required
+def generation_metrics_api():
+    """Raw metrics registry snapshot and circuit breaker states as JSON"""
+    return jsonify({
+        "generation": metrics.generation_summary(),
+        "cache": metrics.cache_summary(),
+        "breakers": provider_health.snapshot(),
+        "metrics": metrics.snapshot(),
+    })
+
+
 @admin.route("/timeouts")
 @admin_required
 def timeouts():
@@ -4,6 +4,7 @@ from apscheduler.schedulers.background import BackgroundScheduler
 from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import threading # Added for locking
+import atexit
 from sqlalchemy import or_ # Added for vote counting query
 from datasets import load_dataset
 
@@ -43,12 +44,14 @@ from flask import (
     url_for,
     session,
     abort,
+    Response,
 )
 from flask_login import LoginManager, current_user
 from models import *
 from models import (
-    hash_sentence, is_sentence_consumed, mark_sentence_consumed,
-    get_unconsumed_sentences, get_consumed_sentences_count, get_random_unconsumed_sentence
+    hash_sentence, is_sentence_consumed, is_sentence_used, mark_sentence_consumed,
+    get_unconsumed_sentences, get_consumed_sentences_count, get_random_unconsumed_sentence,
+    release_consumed_sentence
 )
 from auth import auth, init_oauth, is_admin
 from admin import admin
@@ -60,7 +63,29 @@ from flask_limiter.util import get_remote_address
 import uuid
 import tempfile
 import shutil
-from tts import predict_tts
+from generation import generation_engine
+from health import provider_health
+from metrics import metrics
+from tts import pyht_clients
+from audio import StreamingAudioFile
+from transcode import (
+    schedule_variants, negotiate_variant, variant_path, AUDIO_VARIANTS, MIMETYPE_FORMATS,
+)
+from waveform import ensure_peaks, peaks_path
+from audio_store import audio_store
+from tts_cache import (
+    cache_manifest, tts_cache, cache_arrivals, refill_state, RefillScheduler, CacheAutoscaler, PRIORITY_HIT,
+    on_model_deactivated, select_evictions, TTS_CACHE_MAX_SIZE,
+)
+from shared_state import SHARED_STATE, acquire_leader_lock
+from session_store import (
+    tts_sessions,
+    conversational_sessions,
+    session_reaper,
+    SESSION_TTL,
+    TTSSession,
+    ConversationalSession,
+)
 import random
 import json
 from datetime import datetime, timedelta
@@ -157,29 +182,49 @@ limiter = Limiter(
 )
 
 # TTS Cache Configuration - Read from environment
+# Starting target size; cache_autoscaler adjusts it between TTS_CACHE_MIN_SIZE and TTS_CACHE_MAX_SIZE
 TTS_CACHE_SIZE = int(os.getenv("TTS_CACHE_SIZE", "10"))
-CACHE_AUDIO_SUBDIR = "cache"
-tts_cache = {} # sentence -> {model_a, model_b, audio_a, audio_b, created_at}
-tts_cache_lock = threading.Lock()
+TTS_CACHE_AUTOSCALE = os.getenv("TTS_CACHE_AUTOSCALE", "True").lower() == "true"
+# Models generated per cached sentence; the pair is picked from them when it is served
+TTS_CACHE_MODELS_PER_SENTENCE = max(2, int(os.getenv("TTS_CACHE_MODELS_PER_SENTENCE", "3")))
+# Cache entries older than this are evicted and regenerated
+TTS_CACHE_TTL_HOURS = float(os.getenv("TTS_CACHE_TTL_HOURS", "24"))
+# Disk budget for cached audio, variants and peaks included (0 for no limit)
+TTS_CACHE_MAX_BYTES = int(float(os.getenv("TTS_CACHE_MAX_MB", "500")) * 1024 * 1024)
 SMOOTHING_FACTOR_MODEL_SELECTION = 500 # For weighted random model selection
-# Increased max_workers to 8 for concurrent generation/refill
-cache_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='CacheReplacer')
+# Deadline for a full generation (both models) through the generation engine
+GENERATION_TIMEOUT = int(os.getenv("TTS_GENERATION_TIMEOUT", "120"))
+# Stream conversational audio to listeners while it is still being generated
+# "recommended" offers cached sentences first to raise the cache hit rate; "uniform" doesn't
+SENTENCE_RECOMMENDATION_MODE = os.getenv("SENTENCE_RECOMMENDATION_MODE", "recommended")
+CONVERSATIONAL_STREAMING = os.getenv("CONVERSATIONAL_STREAMING", "False").lower() == "true"
+# Let the front proxy send audio store files instead of the worker, e.g. for nginx
+#   location /_audio_store/ {
+#       internal;
+#       alias /path/to/audio_store/;
+#       etag off;  # nginx's own mtime-size ETag would replace the content ETag
+#       add_header ETag $upstream_http_etag;
+#   }
+# with AUDIO_ACCEL_REDIRECT_PREFIX=/_audio_store/. USE_X_SENDFILE=True does the
+# same for Apache or lighttpd through Flask's X-Sendfile support.
+AUDIO_ACCEL_REDIRECT_PREFIX = os.getenv("AUDIO_ACCEL_REDIRECT_PREFIX", "")
+app.config["USE_X_SENDFILE"] = os.getenv("USE_X_SENDFILE", "False").lower() == "true"
+# Streams written at once; a streamed podcast writes two. Podcasts beyond this get a 503
+# rather than waiting for a writer while their listeners time out
+AUDIO_STREAM_LIMIT = int(os.getenv("AUDIO_STREAM_LIMIT", "8"))
+stream_executor = ThreadPoolExecutor(max_workers=AUDIO_STREAM_LIMIT, thread_name_prefix='AudioStream')
+stream_slots = threading.BoundedSemaphore(AUDIO_STREAM_LIMIT) # Writers not yet reserved
+audio_streams = {} # audio path -> StreamingAudioFile while it is being written
 all_harvard_sentences = [] # Keep the full list available
 
-# Create temp directories
-TEMP_AUDIO_DIR = os.path.join(tempfile.gettempdir(), "tts_arena_audio")
-CACHE_AUDIO_DIR = os.path.join(TEMP_AUDIO_DIR, CACHE_AUDIO_SUBDIR)
-os.makedirs(TEMP_AUDIO_DIR, exist_ok=True)
-os.makedirs(CACHE_AUDIO_DIR, exist_ok=True) # Ensure cache subdir exists
-
+# Generated audio lives in the content-addressed audio_store; sessions and
+# cache entries hold references to it and release them on cleanup
 
-# Store active TTS sessions
-app.tts_sessions = {}
-tts_sessions = app.tts_sessions
 
-# Store active conversational sessions
-app.conversational_sessions = {}
-conversational_sessions = app.conversational_sessions
+# Store active TTS and conversational sessions; in the shared state
+# database when several worker processes serve the app
+app.tts_sessions = tts_sessions
+app.conversational_sessions = conversational_sessions
 
 # Register blueprints
 app.register_blueprint(auth, url_prefix="/auth")
@@ -344,8 +389,9 @@ initial_sentences = []
 
 @app.route("/")
 def arena():
-    # Pass a subset of sentences for the random button fallback
-    return render_template("arena.html", harvard_sentences=json.dumps(initial_sentences))
+    # Pass a subset of sentences for the random button fallback, cached ones first
+    fallback_sentences = [sentence for sentence, _ in recommend_sentences(500, pool=initial_sentences)]
+    return render_template("arena.html", harvard_sentences=json.dumps(fallback_sentences))
 
 
 @app.route("/leaderboard")
@@ -424,54 +470,99 @@ def about():
 
 # --- TTS Caching Functions ---
 
-def generate_and_save_tts(text, model_id, output_dir):
-    """Generates TTS and saves it to a specific directory, returning the full path."""
-    temp_audio_path = None # Initialize to None
-    try:
-        app.logger.debug(f"[TTS Gen {model_id}] Starting generation for: '{text[:30]}...'")
-        # If predict_tts saves file itself and returns path:
-        temp_audio_path = predict_tts(text, model_id)
-        app.logger.debug(f"[TTS Gen {model_id}] predict_tts returned: {temp_audio_path}")
-
-        if not temp_audio_path or not os.path.exists(temp_audio_path):
-            app.logger.warning(f"[TTS Gen {model_id}] predict_tts failed or returned invalid path: {temp_audio_path}")
-            raise ValueError("predict_tts did not return a valid path or file does not exist")
-
-        file_uuid = str(uuid.uuid4())
-        dest_path = os.path.join(output_dir, f"{file_uuid}.wav")
-        app.logger.debug(f"[TTS Gen {model_id}] Moving {temp_audio_path} to {dest_path}")
-        # Move the file generated by predict_tts to the target cache directory
-        shutil.move(temp_audio_path, dest_path)
-        app.logger.debug(f"[TTS Gen {model_id}] Move successful. Returning {dest_path}")
-        return dest_path
+def save_generated_audio(audio, model_id):
+    """Stores an AudioResult from predict_tts in the audio store, returning its path.
 
-    except Exception as e:
-        app.logger.error(f"Error generating/saving TTS for model {model_id} and text '{text[:30]}...': {str(e)}")
-        # Ensure temporary file from predict_tts (if any) is cleaned up
-        if temp_audio_path and os.path.exists(temp_audio_path):
-            try:
-                app.logger.debug(f"[TTS Gen {model_id}] Cleaning up temporary file {temp_audio_path} after error.")
-                os.remove(temp_audio_path)
-            except OSError:
-                pass # Ignore error if file couldn't be removed
-        return None
+    The caller holds one reference and hands it back with release_audio_file().
+    Shared by the TTS and conversational arenas, whatever backend produced the audio.
+    """
+    dest_path, created = audio_store.put(audio)
+    app.logger.debug(f"[TTS Gen {model_id}] Stored audio at {dest_path} (new: {created})")
+    if created:
+        schedule_variants(dest_path)
+    return dest_path
+
+
+def release_audio_file(audio_path):
+    """Releases a reference to generated audio; the last one removes it and its variants."""
+    audio_store.release(audio_path)
+
+
+def reserve_audio_streams(count):
+    """Reserves a writer for each of `count` streams; False, reserving none, if too few are free."""
+    reserved = 0
+    while reserved < count and stream_slots.acquire(blocking=False):
+        reserved += 1
+    if reserved < count:
+        release_audio_streams(reserved)
+        return False
+    return True
+
+
+def release_audio_streams(count):
+    """Returns writers reserved for streams that won't be started."""
+    for _ in range(count):
+        stream_slots.release()
+
+
+def start_audio_stream(audio, model_id):
+    """Starts writing a streamed AudioResult into the audio store in the background.
+
+    Uses a writer reserved with reserve_audio_streams(), and frees it when done.
+    Returns the path right away; the file can be served while it grows.
+    """
+    dest_path = audio_store.staging_path()
+    stream = StreamingAudioFile(dest_path)
+    audio_streams[dest_path] = stream
+
+    def write_stream():
+        try:
+            stream.write_from(audio)
+            schedule_variants(dest_path)
+            app.logger.debug(f"[TTS Stream {model_id}] Finished writing {dest_path}")
+        except Exception as e:
+            app.logger.error(f"Error streaming audio for model {model_id}: {str(e)}")
+        finally:
+            stream_slots.release()
+
+    stream_executor.submit(write_stream)
+    return dest_path
+
+
+def wait_for_audio_streams(audio_paths, timeout):
+    """Waits up to `timeout` in all for any of audio_paths still being streamed; False if one failed or timed out."""
+    deadline = time.monotonic() + timeout
+    for audio_path in audio_paths:
+        stream = audio_streams.get(audio_path)
+        if stream is not None and not stream.wait(max(0, deadline - time.monotonic())):
+            return False
+    return True
+
+
+def choose_refill_sentence(exclude=()):
+    """Picks an unconsumed sentence that isn't cached or in `exclude`, or None if none are left."""
+    with app.app_context():
+        cached_keys = set(tts_cache.sentences())
+        # Get unconsumed sentences that are also not already cached or being generated
+        unconsumed_sentences = get_unconsumed_sentences(all_harvard_sentences)
+        available_sentences = [
+            s for s in unconsumed_sentences if s not in cached_keys and s not in exclude
+        ]
+        if not available_sentences:
+            app.logger.warning("No more unconsumed sentences available for caching. All sentences have been consumed.")
+            return None
+        return random.choice(available_sentences)
 
 
 def _generate_cache_entry_task(sentence):
-    """Task function to generate audio for a sentence and add to cache."""
+    """Generates audio for a sentence and adds it to the cache. Returns True if it was added."""
     # Wrap the entire task in an application context
     with app.app_context():
         if not sentence:
             # Select a new sentence if not provided (for replacement)
-            with tts_cache_lock:
-                cached_keys = set(tts_cache.keys())
-            # Get unconsumed sentences that are also not already cached
-            unconsumed_sentences = get_unconsumed_sentences(all_harvard_sentences)
-            available_sentences = [s for s in unconsumed_sentences if s not in cached_keys]
-            if not available_sentences:
-                app.logger.warning("No more unconsumed sentences available for caching. All sentences have been consumed.")
-                return
-            sentence = random.choice(available_sentences)
+            sentence = choose_refill_sentence()
+            if not sentence:
+                return False
 
         # app.logger.info removed duplicate log
         print(f"[Cache Task] Querying models for: '{sentence[:50]}...'")
@@ -481,57 +572,173 @@ def _generate_cache_entry_task(sentence):
 
         if len(available_models) < 2:
             app.logger.error("Not enough active TTS models to generate cache entry.")
-            return
+            return False
+
+        if not cache_has_room():
+            app.logger.warning(f"TTS cache is at its disk budget. Skipping generation for '{sentence[:50]}...'.")
+            return False
 
+        clips = {}
         try:
-            models = get_weighted_random_models(available_models, 2, ModelType.TTS)
-            model_a_id = models[0].id
-            model_b_id = models[1].id
-
-            # Generate audio concurrently using a local executor for clarity within the task
-            with ThreadPoolExecutor(max_workers=2, thread_name_prefix='AudioGen') as audio_executor:
-                future_a = audio_executor.submit(generate_and_save_tts, sentence, model_a_id, CACHE_AUDIO_DIR)
-                future_b = audio_executor.submit(generate_and_save_tts, sentence, model_b_id, CACHE_AUDIO_DIR)
-
-                timeout_seconds = 120
-                audio_a_path = future_a.result(timeout=timeout_seconds)
-                audio_b_path = future_b.result(timeout=timeout_seconds)
-
-            if audio_a_path and audio_b_path:
-                with tts_cache_lock:
-                    # Only add if the sentence isn't already back in the cache
-                    # And ensure cache size doesn't exceed limit
-                    if sentence not in tts_cache and len(tts_cache) < TTS_CACHE_SIZE:
-                        tts_cache[sentence] = {
-                            "model_a": model_a_id,
-                            "model_b": model_b_id,
-                            "audio_a": audio_a_path,
-                            "audio_b": audio_b_path,
-                            "created_at": datetime.utcnow(),
-                        }
-                        # Mark sentence as consumed for cache usage
-                        mark_sentence_consumed(sentence, usage_type='cache')
-                        app.logger.info(f"Successfully cached entry for: '{sentence[:50]}...'")
-                    elif sentence in tts_cache:
-                         app.logger.warning(f"Sentence '{sentence[:50]}...' already re-cached. Discarding new generation.")
-                         # Clean up the newly generated files if not added
-                         if os.path.exists(audio_a_path): os.remove(audio_a_path)
-                         if os.path.exists(audio_b_path): os.remove(audio_b_path)
-                    else: # Cache is full
-                        app.logger.warning(f"Cache is full ({len(tts_cache)} entries). Discarding new generation for '{sentence[:50]}...'.")
-                        # Clean up the newly generated files if not added
-                        if os.path.exists(audio_a_path): os.remove(audio_a_path)
-                        if os.path.exists(audio_b_path): os.remove(audio_b_path)
+            healthy_models = filter_healthy_models(available_models)
+            models = get_weighted_random_models(
+                healthy_models,
+                min(TTS_CACHE_MODELS_PER_SENTENCE, len(healthy_models)),
+                ModelType.TTS,
+            )
 
-            else:
-                app.logger.error(f"Failed to generate one or both audio files for cache: '{sentence[:50]}...'")
-                # Clean up whichever file might have been created
-                if audio_a_path and os.path.exists(audio_a_path): os.remove(audio_a_path)
-                if audio_b_path and os.path.exists(audio_b_path): os.remove(audio_b_path)
+            # Generate each model's clip concurrently on the generation engine;
+            # one failing provider doesn't throw away the others
+            futures = {
+                model.id: generation_engine.submit(
+                    sentence, [model.id], timeout=GENERATION_TIMEOUT, background=True
+                )
+                for model in models
+            }
+            for model_id, future in futures.items():
+                try:
+                    (audio,) = future.result()
+                    audio_path = save_generated_audio(audio, model_id)
+                except Exception as e:
+                    app.logger.error(f"Error generating cached TTS with {model_id} for '{sentence[:50]}...': {str(e)}")
+                    continue
+                clips[model_id] = {"audio": audio_path, "created_at": datetime.utcnow()}
+                # Precompute waveform peaks so cache hits can draw immediately
+                try:
+                    ensure_peaks(audio_path)
+                except Exception as e:
+                    app.logger.warning(f"Error computing peaks for {audio_path}: {str(e)}")
+
+            if len(clips) < 2:
+                app.logger.error(f"Failed to generate at least two clips for cache: '{sentence[:50]}...'")
+            elif is_sentence_consumed(sentence):
+                # Someone used the sentence live while it was being generated
+                app.logger.warning(f"Sentence '{sentence[:50]}...' was consumed during generation. Discarding new generation.")
+            # Only added if the sentence isn't already back in the cache and the cache isn't full
+            elif tts_cache.add(sentence, {"clips": clips, "created_at": datetime.utcnow()}, cache_refills.target):
+                # Mark sentence as consumed for cache usage
+                mark_sentence_consumed(sentence, usage_type='cache')
+                app.logger.info(f"Successfully cached {len(clips)} clips for: '{sentence[:50]}...'")
+                return True
+            elif sentence in tts_cache:
+                app.logger.warning(f"Sentence '{sentence[:50]}...' already re-cached. Discarding new generation.")
+            else: # Cache is full
+                app.logger.warning(f"Cache is full ({len(tts_cache)} entries). Discarding new generation for '{sentence[:50]}...'.")
 
         except Exception as e:
             # Log the exception within the app context
             app.logger.error(f"Exception in _generate_cache_entry_task for '{sentence[:50]}...': {str(e)}", exc_info=True)
+        # Clean up the newly generated files if not added
+        release_cache_clips(clips)
+        return False
+
+
+def release_cache_clips(clips):
+    """Releases the audio of cached clips that won't be served."""
+    for clip in clips.values():
+        release_audio_file(clip["audio"])
+
+
+def cache_entry_bytes(entry):
+    """Disk used by a cache entry's clips, with their compressed variants and peaks."""
+    total = 0
+    for clip in entry["clips"].values():
+        audio_path = clip["audio"]
+        paths = [audio_path, peaks_path(audio_path)]
+        paths += [variant_path(audio_path, fmt) for fmt in AUDIO_VARIANTS]
+        total += sum(os.path.getsize(path) for path in paths if os.path.exists(path))
+    return total
+
+
+def cache_has_room():
+    """Whether another entry of average size fits in the disk budget."""
+    if not TTS_CACHE_MAX_BYTES:
+        return True
+    entries = [entry for _, entry in tts_cache.items()]
+    if not entries:
+        return True
+    sizes = [cache_entry_bytes(entry) for entry in entries]
+    return sum(sizes) + sum(sizes) / len(sizes) <= TTS_CACHE_MAX_BYTES
+
+
+def evict_cache_entries(sentences, reason):
+    """Removes entries from the cache and returns their unheard sentences to the pool."""
+    evicted = [(s, tts_cache.pop(s)) for s in sentences]
+    # Another worker may have served or evicted some of them already
+    evicted = [(s, entry) for s, entry in evicted if entry is not None]
+    for sentence, entry in evicted:
+        release_cache_clips(entry["clips"])
+        release_consumed_sentence(sentence, usage_type='cache')
+        metrics.increment("tts_cache_evictions_total", reason=reason)
+    if evicted:
+        app.logger.info(f"Evicted {len(evicted)} TTS cache entries ({reason})")
+    return len(evicted)
+
+
+def cleanup_stale_cache_entries():
+    """Evicts entries past their TTL and the oldest ones over the disk budget, then refills."""
+    with app.app_context():
+        expired, over_budget, total_bytes = select_evictions(
+            tts_cache.items(),  # Oldest first
+            datetime.utcnow(),
+            timedelta(hours=TTS_CACHE_TTL_HOURS),
+            TTS_CACHE_MAX_BYTES,
+            cache_entry_bytes,
+        )
+        evicted = evict_cache_entries(expired, "ttl")
+        evicted += evict_cache_entries(over_budget, "disk_budget")
+        metrics.set_gauge("tts_cache_bytes", total_bytes)
+
+        if evicted:
+            cache_refills.top_up()
+
+
+@on_model_deactivated
+def invalidate_model_clips(model_id):
+    """Drops a deactivated model's clips, evicting entries left with fewer than two."""
+    dropped_clips, too_small = tts_cache.drop_model(model_id)
+    release_cache_clips(dropped_clips)
+    metrics.increment("tts_cache_clip_evictions_total", len(dropped_clips), reason="model_deactivated")
+    app.logger.info(f"Dropped {len(dropped_clips)} cached clips for deactivated model {model_id}")
+    if evict_cache_entries(too_small, "model_deactivated"):
+        cache_refills.top_up()
+
+
+def compose_cached_pair(clips):
+    """
+    Picks the pair to serve from a cache entry's clips, using the currently
+    active models and selection weights. Returns the two chosen models, or
+    None when fewer than two clips are still usable. Clips that aren't chosen
+    are released.
+    """
+    usable_models = Model.query.filter(
+        Model.id.in_(list(clips)),
+        Model.model_type == ModelType.TTS,
+        Model.is_active == True,
+    ).all()
+    pair = []
+    if len(usable_models) >= 2:
+        pair = get_weighted_random_models(usable_models, 2, ModelType.TTS)
+    chosen_ids = {model.id for model in pair}
+    release_cache_clips({m: c for m, c in clips.items() if m not in chosen_ids})
+    return pair if len(pair) == 2 else None
+
+
+# Keeps the cache at its target size, counting fills that are already queued or running
+cache_refills = RefillScheduler(
+    choose=choose_refill_sentence,
+    fill=_generate_cache_entry_task,
+    cache_size=lambda: len(tts_cache),
+    target=TTS_CACHE_SIZE,
+    shared=refill_state,  # Workers other than the leader report the leader's refills
+)
+atexit.register(cache_refills.shutdown)
+# Moves the target with demand; only applied when TTS_CACHE_AUTOSCALE is on.
+# Counts generate requests from every worker when they share state
+cache_autoscaler = CacheAutoscaler(cache_refills, arrivals=cache_arrivals)
+if TTS_CACHE_AUTOSCALE:
+    # Nothing is filled yet: the scheduler only starts once the cache is restored
+    cache_refills.set_target(cache_autoscaler.clamp(TTS_CACHE_SIZE))
 
 
 def update_initial_sentences():
@@ -550,9 +757,49 @@ def update_initial_sentences():
         initial_sentences = []  # No fallback to consumed sentences
 
 
+def restore_tts_cache():
+    """Reloads cache entries recorded by a previous run whose audio is still usable.
+
+    Must run before audio_store.sweep(), which deletes any audio not referenced.
+    With shared state the recorded entries are the live cache and their clips
+    still hold references, so unusable entries are popped and released instead.
+    """
+    restored = dropped = 0
+    known_sentences = set(all_harvard_sentences)
+    active_models = {
+        model.id for model in Model.query.filter_by(model_type=ModelType.TTS, is_active=True)
+    }
+    for sentence, entry in cache_manifest.entries():
+        clips = {
+            model_id: clip for model_id, clip in entry["clips"].items()
+            if model_id in active_models
+            and audio_store.blob_id(clip["audio"]) and os.path.exists(clip["audio"])
+        }
+        usable = sentence in known_sentences and len(clips) >= 2
+        # Up to the largest target, since these generations are already paid for
+        if SHARED_STATE:
+            if usable and restored < TTS_CACHE_MAX_SIZE:
+                restored += 1  # Clips of inactive models are skipped when the entry is served
+                continue
+            popped = tts_cache.pop(sentence)
+            if popped is not None:
+                release_cache_clips(popped["clips"])
+        else:
+            entry["clips"] = clips
+            # Rewrites the manifest rows too, forgetting the clips that were dropped
+            if usable and tts_cache.add(sentence, entry, TTS_CACHE_MAX_SIZE):
+                for clip in clips.values():
+                    audio_store.acquire(clip["audio"])
+                restored += 1
+                continue
+            cache_manifest.remove(sentence)
+        dropped += 1
+    app.logger.info(f"Restored {restored} TTS cache entries from the manifest, dropped {dropped}")
+
+
 def initialize_tts_cache():
     print("Initializing TTS cache")
-    """Selects initial sentences and starts generation tasks."""
+    """Selects initial sentences and starts generation tasks for any empty cache slots."""
     with app.app_context(): # Ensure access to models
         if not all_harvard_sentences:
             app.logger.error("Harvard sentences not loaded. Cannot initialize cache.")
@@ -567,13 +814,14 @@ def initialize_tts_cache():
             app.logger.error("No unconsumed sentences available for cache initialization. Cache will remain empty.")
             app.logger.warning("WARNING: All sentences from the dataset have been consumed. No new TTS generations will be possible.")
             return
-        initial_selection = random.sample(unconsumed_sentences, min(len(unconsumed_sentences), TTS_CACHE_SIZE))
-        app.logger.info(f"Initializing TTS cache with {len(initial_selection)} sentences...")
-
-        for sentence in initial_selection:
-            # Use the main cache_executor for initial population too
-            cache_executor.submit(_generate_cache_entry_task, sentence)
-        app.logger.info("Submitted initial cache generation tasks.")
+        # Entries restored from the manifest already fill part of the cache
+        needed = cache_refills.target - len(tts_cache)
+        if needed <= 0:
+            app.logger.info("TTS cache fully restored from the manifest.")
+            return
+        for sentence in random.sample(unconsumed_sentences, min(len(unconsumed_sentences), needed)):
+            cache_refills.schedule(sentence)
+        app.logger.info(f"Scheduled {min(len(unconsumed_sentences), needed)} initial cache generation tasks.")
 
 # --- End TTS Caching Functions ---
 
@@ -599,58 +847,50 @@ def generate_tts():
     if not is_english_text(text):
         return jsonify({"error": "Only English language text is supported for now. Please provide text in English. A multilingual Arena is coming soon!"}), 400
     
-    # Check if sentence has already been consumed
-    if is_sentence_consumed(text):
-        remaining_count = len(get_unconsumed_sentences(all_harvard_sentences))
-        if remaining_count == 0:
-            return jsonify({"error": "This sentence has already been used and no unconsumed sentences remain. All sentences from the dataset have been consumed."}), 400
-        else:
-            return jsonify({"error": f"This sentence has already been used. Please select a different sentence. {remaining_count} sentences remain available."}), 400
-
     # --- Cache Check ---
+    # Checked before consumption: cached sentences are marked consumed when they
+    # are cached, and popping the entry is what keeps a hit single-use
     cache_hit = False
-    session_data_from_cache = None
-    with tts_cache_lock:
-        if text in tts_cache:
+    cache_autoscaler.record_request()
+    # Remove from cache immediately; with shared state only one worker gets the entry
+    cached_entry = tts_cache.pop(text)
+    if cached_entry is not None:
+        # --- Trigger background tasks to refill the cache ---
+        # The scheduler only queues fills for slots not already being refilled
+        refills_submitted = cache_refills.top_up(priority=PRIORITY_HIT)
+        refill_stats = cache_refills.stats()
+        app.logger.info(
+            f"Cache hit: Queued {refills_submitted} refill(s) (size: {len(tts_cache)}, "
+            f"pending: {refill_stats['pending']}, in flight: {refill_stats['in_flight']}, "
+            f"target: {cache_refills.target})."
+        )
+        # --- End Refill Trigger ---
+
+        # Pick the pair now, from the clips whose models are still active
+        pair = compose_cached_pair(cached_entry["clips"])
+        if pair:
             cache_hit = True
-            cached_entry = tts_cache.pop(text) # Remove from cache immediately
             app.logger.info(f"TTS Cache HIT for: '{text[:50]}...'")
+            model_a, model_b = pair
 
             # Prepare session data using cached info
             session_id = str(uuid.uuid4())
-            session_data_from_cache = {
-                "model_a": cached_entry["model_a"],
-                "model_b": cached_entry["model_b"],
-                "audio_a": cached_entry["audio_a"], # Paths are now from cache_dir
-                "audio_b": cached_entry["audio_b"],
-                "text": text,
-                "created_at": datetime.utcnow(),
-                "expires_at": datetime.utcnow() + timedelta(minutes=30),
-                "voted": False,
-                "cache_hit": True,
-            }
-            app.tts_sessions[session_id] = session_data_from_cache
-            
+            app.tts_sessions.add(session_id, TTSSession.create(
+                model_a.id,
+                model_b.id,
+                cached_entry["clips"][model_a.id]["audio"],
+                cached_entry["clips"][model_b.id]["audio"],
+                text=text,
+                cache_hit=True,
+            ))
             # Note: Sentence was already marked as consumed when it was cached
             # No need to mark it again here
+        else:
+            app.logger.warning(f"Cached clips for '{text[:50]}...' no longer cover two active models. Generating on the fly.")
 
-            # --- Trigger background tasks to refill the cache ---
-            # Calculate how many slots need refilling
-            current_cache_size = len(tts_cache) # Size *before* adding potentially new items
-            needed_refills = TTS_CACHE_SIZE - current_cache_size
-            # Limit concurrent refills to 8 or the actual need
-            refills_to_submit = min(needed_refills, 8)
-
-            if refills_to_submit > 0:
-                app.logger.info(f"Cache hit: Submitting {refills_to_submit} background task(s) to refill cache (current size: {current_cache_size}, target: {TTS_CACHE_SIZE}).")
-                for _ in range(refills_to_submit):
-                     # Pass None to signal replacement selection within the task
-                    cache_executor.submit(_generate_cache_entry_task, None)
-            else:
-                app.logger.info(f"Cache hit: Cache is already full or at target size ({current_cache_size}/{TTS_CACHE_SIZE}). No refill tasks submitted.")
-            # --- End Refill Trigger ---
+    metrics.increment("tts_cache_lookup_total", outcome="hit" if cache_hit else "miss")
 
-    if cache_hit and session_data_from_cache:
+    if cache_hit:
         # Return response using cached data
         # Note: The files are now managed by the session lifecycle (cleanup_session)
         return jsonify(
@@ -658,12 +898,23 @@ def generate_tts():
                 "session_id": session_id,
                 "audio_a": f"/api/tts/audio/{session_id}/a",
                 "audio_b": f"/api/tts/audio/{session_id}/b",
-                "expires_in": 1800,  # 30 minutes in seconds
+                "peaks_a": f"/api/tts/peaks/{session_id}/a",
+                "peaks_b": f"/api/tts/peaks/{session_id}/b",
+                "expires_in": int(SESSION_TTL.total_seconds()),
                 "cache_hit": True,
             }
         )
     # --- End Cache Check ---
 
+    # Check if sentence has already been used. A recommended sentence whose cached pair
+    # another client just took is only reserved by the cache, so it is generated live
+    if cached_entry is None and is_sentence_used(text):
+        remaining_count = len(get_unconsumed_sentences(all_harvard_sentences))
+        if remaining_count == 0:
+            return jsonify({"error": "This sentence has already been used and no unconsumed sentences remain. All sentences from the dataset have been consumed."}), 400
+        else:
+            return jsonify({"error": f"This sentence has already been used. Please select a different sentence. {remaining_count} sentences remain available."}), 400
+
     # --- Cache Miss: Generate on the fly ---
     app.logger.info(f"TTS Cache MISS for: '{text[:50]}...'. Generating on the fly.")
     available_models = Model.query.filter_by(
@@ -672,31 +923,22 @@ def generate_tts():
     if len(available_models) < 2:
         return jsonify({"error": "Not enough TTS models available"}), 500
 
-    selected_models = get_weighted_random_models(available_models, 2, ModelType.TTS)
+    selected_models = get_weighted_random_models(
+        filter_healthy_models(available_models), 2, ModelType.TTS
+    )
 
     try:
         audio_files = []
         model_ids = []
 
-        # Function to process a single model (generate directly to TEMP_AUDIO_DIR, not cache subdir)
-        def process_model_on_the_fly(model):
-             # Generate and save directly to the main temp dir
-             # Assume predict_tts handles saving temporary files
-             temp_audio_path = predict_tts(text, model.id)
-             if not temp_audio_path or not os.path.exists(temp_audio_path):
-                 raise ValueError(f"predict_tts failed for model {model.id}")
-
-             # Create a unique name in the main TEMP_AUDIO_DIR for the session
-             file_uuid = str(uuid.uuid4())
-             dest_path = os.path.join(TEMP_AUDIO_DIR, f"{file_uuid}.wav")
-             shutil.move(temp_audio_path, dest_path) # Move from predict_tts's temp location
-
-             return {"model_id": model.id, "audio_path": dest_path}
-
-
-        # Use ThreadPoolExecutor to process models concurrently
-        with ThreadPoolExecutor(max_workers=2) as executor:
-            results = list(executor.map(process_model_on_the_fly, selected_models))
+        # Generate both models concurrently on the shared generation engine
+        generated_audio = generation_engine.generate(
+            text, [model.id for model in selected_models], timeout=GENERATION_TIMEOUT
+        )
+        results = []
+        for model, audio in zip(selected_models, generated_audio):
+            dest_path = save_generated_audio(audio, model.id)
+            results.append({"model_id": model.id, "audio_path": dest_path})
 
         # Extract results
         for result in results:
@@ -705,17 +947,9 @@ def generate_tts():
 
         # Create session
         session_id = str(uuid.uuid4())
-        app.tts_sessions[session_id] = {
-            "model_a": model_ids[0],
-            "model_b": model_ids[1],
-            "audio_a": audio_files[0], # Paths are now from TEMP_AUDIO_DIR directly
-            "audio_b": audio_files[1],
-            "text": text,
-            "created_at": datetime.utcnow(),
-            "expires_at": datetime.utcnow() + timedelta(minutes=30),
-            "voted": False,
-            "cache_hit": False,
-        }
+        app.tts_sessions.add(session_id, TTSSession.create(
+            model_ids[0], model_ids[1], audio_files[0], audio_files[1], text=text
+        ))
         
         # Don't mark as consumed yet - wait until vote is submitted to maintain security
         # while allowing legitimate votes to count for ELO
@@ -726,7 +960,9 @@ def generate_tts():
                 "session_id": session_id,
                 "audio_a": f"/api/tts/audio/{session_id}/a",
                 "audio_b": f"/api/tts/audio/{session_id}/b",
-                "expires_in": 1800,
+                "peaks_a": f"/api/tts/peaks/{session_id}/a",
+                "peaks_b": f"/api/tts/peaks/{session_id}/b",
+                "expires_in": int(SESSION_TTL.total_seconds()),
                 "cache_hit": False,
             }
         )
@@ -736,43 +972,147 @@ def generate_tts():
         # Cleanup any files potentially created during the failed attempt
         if 'results' in locals():
              for res in results:
-                 if 'audio_path' in res and os.path.exists(res['audio_path']):
+                 if 'audio_path' in res:
                      try:
-                         os.remove(res['audio_path'])
+                         release_audio_file(res['audio_path'])
                      except OSError:
                          pass
         return jsonify({"error": "Failed to generate TTS"}), 500
     # --- End Cache Miss ---
 
 
+def get_session_audio_path(sessions, session_id, model_key, cleanup):
+    """
+    Look up audio "a" or "b" of a session. Returns (path, seconds until the
+    session expires, None), or (None, None, error response).
+    """
+    session_data = sessions.get(session_id)
+    if session_data is None:
+        return None, None, (jsonify({"error": "Invalid or expired session"}), 404)
+
+    # Check if session expired
+    remaining = session_data.expires_at - time.time()
+    if remaining < 0:
+        cleanup(session_id)
+        return None, None, (jsonify({"error": "Session expired"}), 410)
+
+    if model_key == "a":
+        audio_path = session_data.audio_a
+    elif model_key == "b":
+        audio_path = session_data.audio_b
+    else:
+        return None, None, (jsonify({"error": "Invalid model key"}), 400)
+
+    # Check if file exists
+    if not os.path.exists(audio_path):
+        return None, None, (jsonify({"error": "Audio file not found"}), 404)
+
+    return audio_path, int(remaining), None
+
+
+def content_etag(audio_path, representation):
+    """
+    A strong ETag for one representation ("wav", "mp3", "opus", "peaks") of
+    a stored clip, from its content hash. None for audio outside the store,
+    which gets Flask's file-based ETag instead.
+    """
+    blob_id = audio_store.blob_id(audio_path)
+    return f"{blob_id}-{representation}" if blob_id else None
+
+
+def send_audio_file(file_path, mimetype, etag, max_age):
+    """
+    Sends a file from the audio store with byte ranges (206), conditional
+    requests against `etag`, and private caching for max_age seconds. With
+    AUDIO_ACCEL_REDIRECT_PREFIX set, the proxy sends the bytes (and handles
+    ranges); this worker only answers If-None-Match. nginx drops the ETag of
+    an X-Accel-Redirect response, so its location must turn off its own and
+    pass this one on (see AUDIO_ACCEL_REDIRECT_PREFIX).
+    """
+    relative_path = os.path.relpath(os.path.abspath(file_path), os.path.abspath(audio_store.root))
+    if AUDIO_ACCEL_REDIRECT_PREFIX and not relative_path.startswith(".."):
+        response = Response(mimetype=mimetype)
+        response.headers["X-Accel-Redirect"] = (
+            AUDIO_ACCEL_REDIRECT_PREFIX.rstrip("/") + "/" + relative_path.replace(os.sep, "/")
+        )
+        if etag:
+            response.set_etag(etag)
+        response = response.make_conditional(request)
+        response.cache_control.max_age = max_age
+    else:
+        response = send_file(
+            file_path, mimetype=mimetype, etag=etag or True, conditional=True, max_age=max_age
+        )
+    # Session audio is only for the user who generated it
+    response.cache_control.private = True
+    response.cache_control.public = False
+    return response
+
+
+def send_session_audio(sessions, session_id, model_key, cleanup):
+    """Serve audio "a" or "b" of a TTS or conversational session."""
+    audio_path, max_age, error = get_session_audio_path(sessions, session_id, model_key, cleanup)
+    if error:
+        return error
+
+    # Serve audio that is still being generated progressively
+    stream = audio_streams.get(audio_path)
+    if stream is not None:
+        if stream.error is not None:
+            return jsonify({"error": "Audio generation failed"}), 500
+        if not stream.complete:
+            return Response(
+                stream.follow(),
+                mimetype="audio/wav",
+                headers={"Cache-Control": "no-store", "X-Accel-Buffering": "no"},
+            )
+
+    # Negotiate Opus/MP3 from Accept (or ?format=). A variant still queued is transcoded
+    # now, so every request for this URL and Accept gets the same encoding
+    file_path, mimetype = negotiate_variant(
+        audio_path, request.accept_mimetypes, request.args.get("format")
+    )
+    # Seeking and replays fetch byte ranges or revalidate instead of the whole file
+    etag = content_etag(audio_path, MIMETYPE_FORMATS[mimetype])
+    response = send_audio_file(file_path, mimetype, etag, max_age)
+    response.vary.add("Accept")
+    return response
+
+
 @app.route("/api/tts/audio/<session_id>/<model_key>")
 def get_audio(session_id, model_key):
     # If verification not setup, handle it first
     if app.config["TURNSTILE_ENABLED"] and not session.get("turnstile_verified"):
         return jsonify({"error": "Turnstile verification required"}), 403
 
-    if session_id not in app.tts_sessions:
-        return jsonify({"error": "Invalid or expired session"}), 404
+    return send_session_audio(app.tts_sessions, session_id, model_key, cleanup_session)
 
-    session_data = app.tts_sessions[session_id]
 
-    # Check if session expired
-    if datetime.utcnow() > session_data["expires_at"]:
-        cleanup_session(session_id)
-        return jsonify({"error": "Session expired"}), 410
+@app.route("/api/tts/peaks/<session_id>/<model_key>")
+def get_audio_peaks(session_id, model_key):
+    """Waveform peaks for a session's audio, so the player can draw before decoding."""
+    if app.config["TURNSTILE_ENABLED"] and not session.get("turnstile_verified"):
+        return jsonify({"error": "Turnstile verification required"}), 403
 
-    if model_key == "a":
-        audio_path = session_data["audio_a"]
-    elif model_key == "b":
-        audio_path = session_data["audio_b"]
-    else:
-        return jsonify({"error": "Invalid model key"}), 400
+    audio_path, max_age, error = get_session_audio_path(
+        app.tts_sessions, session_id, model_key, cleanup_session
+    )
+    if error:
+        return error
 
-    # Check if file exists
-    if not os.path.exists(audio_path):
-        return jsonify({"error": "Audio file not found"}), 404
+    try:
+        # Cache entries come with peaks; live generations compute them on first request
+        peaks_file = ensure_peaks(audio_path)
+    except Exception as e:
+        app.logger.error(f"Error computing peaks for {audio_path}: {str(e)}")
+        return jsonify({"error": "Failed to compute waveform"}), 500
 
-    return send_file(audio_path, mimetype="audio/wav")
+    # A session's clip never changes, so the peaks can be cached for its lifetime
+    response = send_audio_file(
+        peaks_file, "application/json", content_etag(audio_path, "peaks"), max_age
+    )
+    response.cache_control.immutable = True
+    return response
 
 
 @app.route("/api/tts/vote", methods=["POST"])
@@ -798,60 +1138,63 @@ def submit_vote():
     session_id = data.get("session_id")
     chosen_model_key = data.get("chosen_model")  # "a" or "b"
 
-    if not session_id or session_id not in app.tts_sessions:
+    session_data = app.tts_sessions.get(session_id) if session_id else None
+    if session_data is None:
         return jsonify({"error": "Invalid or expired session"}), 404
 
     if not chosen_model_key or chosen_model_key not in ["a", "b"]:
         return jsonify({"error": "Invalid chosen model"}), 400
 
-    session_data = app.tts_sessions[session_id]
-
     # Check if session expired
-    if datetime.utcnow() > session_data["expires_at"]:
+    if time.time() > session_data.expires_at:
         cleanup_session(session_id)
         return jsonify({"error": "Session expired"}), 410
 
     # Check if already voted
-    if session_data["voted"]:
+    if session_data.voted:
         return jsonify({"error": "Vote already submitted for this session"}), 400
 
     # Get model IDs and audio paths
     chosen_id = (
-        session_data["model_a"] if chosen_model_key == "a" else session_data["model_b"]
+        session_data.model_a if chosen_model_key == "a" else session_data.model_b
     )
     rejected_id = (
-        session_data["model_b"] if chosen_model_key == "a" else session_data["model_a"]
+        session_data.model_b if chosen_model_key == "a" else session_data.model_a
     )
     chosen_audio_path = (
-        session_data["audio_a"] if chosen_model_key == "a" else session_data["audio_b"]
+        session_data.audio_a if chosen_model_key == "a" else session_data.audio_b
     )
     rejected_audio_path = (
-        session_data["audio_b"] if chosen_model_key == "a" else session_data["audio_a"]
+        session_data.audio_b if chosen_model_key == "a" else session_data.audio_a
     )
 
     # Calculate session duration and gather analytics data
-    vote_time = datetime.utcnow()
-    session_duration = (vote_time - session_data["created_at"]).total_seconds()
+    session_duration = time.time() - session_data.created_at
     client_ip = get_client_ip()
     user_agent = request.headers.get('User-Agent')
-    cache_hit = session_data.get("cache_hit", False)
+    cache_hit = session_data.cache_hit
+
+    # Claim the vote before recording it, so concurrent requests can't both vote
+    if not app.tts_sessions.claim_vote(session_id):
+        return jsonify({"error": "Vote already submitted for this session"}), 400
 
     # Record vote in database with analytics data
     vote, error = record_vote(
         current_user.id, 
-        session_data["text"], 
+        session_data.text, 
         chosen_id, 
         rejected_id, 
         ModelType.TTS,
         session_duration=session_duration,
         ip_address=client_ip,
         user_agent=user_agent,
-        generation_date=session_data["created_at"],
+        generation_date=datetime.utcfromtimestamp(session_data.created_at),
         cache_hit=cache_hit,
         all_dataset_sentences=all_harvard_sentences
     )
 
     if error:
+        app.tts_sessions.release_vote(session_id)
         return jsonify({"error": error}), 500
 
     # Sentence consumption is now handled within record_vote function
@@ -862,15 +1205,15 @@ def submit_vote():
         vote_dir = os.path.join("./votes", vote_uuid)
         os.makedirs(vote_dir, exist_ok=True)
 
-        # Copy audio files
-        shutil.copy(chosen_audio_path, os.path.join(vote_dir, "chosen.wav"))
-        shutil.copy(rejected_audio_path, os.path.join(vote_dir, "rejected.wav"))
+        # Link audio files from the audio store instead of copying them
+        audio_store.link(chosen_audio_path, os.path.join(vote_dir, "chosen.wav"))
+        audio_store.link(rejected_audio_path, os.path.join(vote_dir, "rejected.wav"))
 
         # Create metadata
         chosen_model_obj = Model.query.get(chosen_id)
         rejected_model_obj = Model.query.get(rejected_id)
         metadata = {
-            "text": session_data["text"],
+            "text": session_data.text,
             "chosen_model": chosen_model_obj.name if chosen_model_obj else "Unknown",
             "chosen_model_id": chosen_model_obj.id if chosen_model_obj else "Unknown",
             "rejected_model": rejected_model_obj.name if rejected_model_obj else "Unknown",
@@ -887,9 +1230,6 @@ def submit_vote():
         app.logger.error(f"Error saving preference data for vote {session_id}: {str(e)}")
         # Continue even if saving preference data fails, vote is already recorded
 
-    # Mark session as voted
-    session_data["voted"] = True
-
     # Check for coordinated voting campaigns (async to not slow down response)
     try:
         from threading import Thread
@@ -924,19 +1264,19 @@ def submit_vote():
 
 def cleanup_session(session_id):
     """Remove session and its audio files"""
-    if session_id in app.tts_sessions:
-        session = app.tts_sessions[session_id]
+    # Popped first, so a session cleaned up by two workers is only released once
+    session = app.tts_sessions.pop(session_id)
+    if session is not None:
+        release_session_audio(session_id, session)
 
-        # Remove audio files
-        for audio_file in [session["audio_a"], session["audio_b"]]:
-            if os.path.exists(audio_file):
-                try:
-                    os.remove(audio_file)
-                except Exception as e:
-                    app.logger.error(f"Error removing audio file: {str(e)}")
 
-        # Remove session
-        del app.tts_sessions[session_id]
+def release_session_audio(session_id, session):
+    """Release the audio of a TTS session that has been removed from its store."""
+    for audio_file in [session.audio_a, session.audio_b]:
+        try:
+            release_audio_file(audio_file)
+        except Exception as e:
+            app.logger.error(f"Error removing audio file: {str(e)}")
 
 
 @app.route("/api/conversational/generate", methods=["POST"])
@@ -985,51 +1325,43 @@ def generate_podcast():
     if len(available_models) < 2:
         return jsonify({"error": "Not enough conversational models available"}), 500
 
-    selected_models = get_weighted_random_models(available_models, 2, ModelType.CONVERSATIONAL)
+    selected_models = get_weighted_random_models(
+        filter_healthy_models(available_models), 2, ModelType.CONVERSATIONAL
+    )
+    # A stream can only be followed by the worker writing it, so not with shared state
+    stream_audio = (CONVERSATIONAL_STREAMING or data.get("stream") is True) and not SHARED_STATE
+    if stream_audio and not reserve_audio_streams(len(selected_models)):
+        return jsonify({"error": "Too many podcasts are streaming right now. Please try again shortly."}), 503
+    unstarted_streams = len(selected_models) if stream_audio else 0
 
     try:
         # Generate audio for both models concurrently
         audio_files = []
         model_ids = []
 
-        # Function to process a single model
-        def process_model(model):
-            # Call conversational TTS service
-            audio_content = predict_tts(script, model.id)
-
-            # Save to temp file with unique name
-            file_uuid = str(uuid.uuid4())
-            dest_path = os.path.join(TEMP_AUDIO_DIR, f"{file_uuid}.wav")
-
-            with open(dest_path, "wb") as f:
-                f.write(audio_content)
-
-            return {"model_id": model.id, "audio_path": dest_path}
-
-        # Use ThreadPoolExecutor to process models concurrently
-        with ThreadPoolExecutor(max_workers=2) as executor:
-            results = list(executor.map(process_model, selected_models))
-
-        # Extract results
-        for result in results:
-            model_ids.append(result["model_id"])
-            audio_files.append(result["audio_path"])
+        # Generate both models concurrently on the shared generation engine
+        # When streaming, respond as soon as audio starts arriving
+        generated_audio = generation_engine.generate(
+            script,
+            [model.id for model in selected_models],
+            timeout=GENERATION_TIMEOUT,
+            stream=stream_audio,
+        )
+        for model, audio in zip(selected_models, generated_audio):
+            if stream_audio:
+                dest_path = start_audio_stream(audio, model.id)
+                unstarted_streams -= 1
+            else:
+                dest_path = save_generated_audio(audio, model.id)
+            model_ids.append(model.id)
+            audio_files.append(dest_path)
 
         # Create session
         session_id = str(uuid.uuid4())
-        script_text = " ".join([line["text"] for line in script])
-        app.conversational_sessions[session_id] = {
-            "model_a": model_ids[0],
-            "model_b": model_ids[1],
-            "audio_a": audio_files[0],
-            "audio_b": audio_files[1],
-            "text": script_text[:1000],  # Limit text length
-            "created_at": datetime.utcnow(),
-            "expires_at": datetime.utcnow() + timedelta(minutes=30),
-            "voted": False,
-            "script": script,
-            "cache_hit": False,  # Conversational is always generated on-demand
-        }
+        # Conversational is always generated on-demand, never a cache hit
+        app.conversational_sessions.add(session_id, ConversationalSession.create(
+            model_ids[0], model_ids[1], audio_files[0], audio_files[1], script=script
+        ))
 
         # Return audio file paths and session
         return jsonify(
@@ -1037,13 +1369,16 @@ def generate_podcast():
                 "session_id": session_id,
                 "audio_a": f"/api/conversational/audio/{session_id}/a",
                 "audio_b": f"/api/conversational/audio/{session_id}/b",
-                "expires_in": 1800,  # 30 minutes in seconds
+                "expires_in": int(SESSION_TTL.total_seconds()),
+                "streaming": stream_audio,
             }
         )
 
     except Exception as e:
         app.logger.error(f"Conversational generation error: {str(e)}")
         return jsonify({"error": f"Failed to generate podcast: {str(e)}"}), 500
+    finally:
+        release_audio_streams(unstarted_streams)
 
 
 @app.route("/api/conversational/audio/<session_id>/<model_key>")
@@ -1052,28 +1387,9 @@ def get_podcast_audio(session_id, model_key):
     if app.config["TURNSTILE_ENABLED"] and not session.get("turnstile_verified"):
         return jsonify({"error": "Turnstile verification required"}), 403
 
-    if session_id not in app.conversational_sessions:
-        return jsonify({"error": "Invalid or expired session"}), 404
-
-    session_data = app.conversational_sessions[session_id]
-
-    # Check if session expired
-    if datetime.utcnow() > session_data["expires_at"]:
-        cleanup_conversational_session(session_id)
-        return jsonify({"error": "Session expired"}), 410
-
-    if model_key == "a":
-        audio_path = session_data["audio_a"]
-    elif model_key == "b":
-        audio_path = session_data["audio_b"]
-    else:
-        return jsonify({"error": "Invalid model key"}), 400
-
-    # Check if file exists
-    if not os.path.exists(audio_path):
-        return jsonify({"error": "Audio file not found"}), 404
-
-    return send_file(audio_path, mimetype="audio/wav")
+    return send_session_audio(
+        app.conversational_sessions, session_id, model_key, cleanup_conversational_session
+    )
 
 
 @app.route("/api/conversational/vote", methods=["POST"])
@@ -1099,60 +1415,67 @@ def submit_podcast_vote():
     session_id = data.get("session_id")
     chosen_model_key = data.get("chosen_model")  # "a" or "b"
 
-    if not session_id or session_id not in app.conversational_sessions:
+    session_data = app.conversational_sessions.get(session_id) if session_id else None
+    if session_data is None:
         return jsonify({"error": "Invalid or expired session"}), 404
 
     if not chosen_model_key or chosen_model_key not in ["a", "b"]:
         return jsonify({"error": "Invalid chosen model"}), 400
 
-    session_data = app.conversational_sessions[session_id]
-
     # Check if session expired
-    if datetime.utcnow() > session_data["expires_at"]:
+    if time.time() > session_data.expires_at:
         cleanup_conversational_session(session_id)
         return jsonify({"error": "Session expired"}), 410
 
     # Check if already voted
-    if session_data["voted"]:
+    if session_data.voted:
         return jsonify({"error": "Vote already submitted for this session"}), 400
 
     # Get model IDs and audio paths
     chosen_id = (
-        session_data["model_a"] if chosen_model_key == "a" else session_data["model_b"]
+        session_data.model_a if chosen_model_key == "a" else session_data.model_b
     )
     rejected_id = (
-        session_data["model_b"] if chosen_model_key == "a" else session_data["model_a"]
+        session_data.model_b if chosen_model_key == "a" else session_data.model_a
     )
     chosen_audio_path = (
-        session_data["audio_a"] if chosen_model_key == "a" else session_data["audio_b"]
+        session_data.audio_a if chosen_model_key == "a" else session_data.audio_b
     )
     rejected_audio_path = (
-        session_data["audio_b"] if chosen_model_key == "a" else session_data["audio_a"]
+        session_data.audio_b if chosen_model_key == "a" else session_data.audio_a
     )
 
+    # Streamed audio must be complete before it is saved as preference data
+    if not wait_for_audio_streams([chosen_audio_path, rejected_audio_path], GENERATION_TIMEOUT):
+        return jsonify({"error": "Audio generation did not complete"}), 409
+
     # Calculate session duration and gather analytics data
-    vote_time = datetime.utcnow()
-    session_duration = (vote_time - session_data["created_at"]).total_seconds()
+    session_duration = time.time() - session_data.created_at
     client_ip = get_client_ip()
     user_agent = request.headers.get('User-Agent')
-    cache_hit = session_data.get("cache_hit", False)
+    cache_hit = session_data.cache_hit
+
+    # Claim the vote before recording it, so concurrent requests can't both vote
+    if not app.conversational_sessions.claim_vote(session_id):
+        return jsonify({"error": "Vote already submitted for this session"}), 400
 
     # Record vote in database with analytics data
     vote, error = record_vote(
         current_user.id, 
-        session_data["text"], 
+        session_data.text, 
         chosen_id, 
         rejected_id, 
         ModelType.CONVERSATIONAL,
         session_duration=session_duration,
         ip_address=client_ip,
         user_agent=user_agent,
-        generation_date=session_data["created_at"],
+        generation_date=datetime.utcfromtimestamp(session_data.created_at),
         cache_hit=cache_hit,
         all_dataset_sentences=all_harvard_sentences  # Note: conversational uses scripts, not sentences
     )
 
     if error:
+        app.conversational_sessions.release_vote(session_id)
         return jsonify({"error": error}), 500
 
     # Sentence consumption is now handled within record_vote function
@@ -1163,15 +1486,15 @@ def submit_podcast_vote():
         vote_dir = os.path.join("./votes", vote_uuid)
         os.makedirs(vote_dir, exist_ok=True)
 
-        # Copy audio files
-        shutil.copy(chosen_audio_path, os.path.join(vote_dir, "chosen.wav"))
-        shutil.copy(rejected_audio_path, os.path.join(vote_dir, "rejected.wav"))
+        # Link audio files from the audio store instead of copying them
+        audio_store.link(chosen_audio_path, os.path.join(vote_dir, "chosen.wav"))
+        audio_store.link(rejected_audio_path, os.path.join(vote_dir, "rejected.wav"))
 
         # Create metadata
         chosen_model_obj = Model.query.get(chosen_id)
         rejected_model_obj = Model.query.get(rejected_id)
         metadata = {
-            "script": session_data["script"], # Save the full script
+            "script": session_data.script, # Save the full script
             "chosen_model": chosen_model_obj.name if chosen_model_obj else "Unknown",
             "chosen_model_id": chosen_model_obj.id if chosen_model_obj else "Unknown",
             "rejected_model": rejected_model_obj.name if rejected_model_obj else "Unknown",
@@ -1188,9 +1511,6 @@ def submit_podcast_vote():
         app.logger.error(f"Error saving preference data for conversational vote {session_id}: {str(e)}")
         # Continue even if saving preference data fails, vote is already recorded
 
-    # Mark session as voted
-    session_data["voted"] = True
-
     # Check for coordinated voting campaigns (async to not slow down response)
     try:
         from threading import Thread
@@ -1210,8 +1530,8 @@ def submit_podcast_vote():
                 "name": rejected_model_obj.name if rejected_model_obj else "Unknown",
             },
             "names": {
-                "a": Model.query.get(session_data["model_a"]).name,
-                "b": Model.query.get(session_data["model_b"]).name,
+                "a": Model.query.get(session_data.model_a).name,
+                "b": Model.query.get(session_data.model_b).name,
             },
         }
     )
@@ -1219,54 +1539,44 @@ def submit_podcast_vote():
 
 def cleanup_conversational_session(session_id):
     """Remove conversational session and its audio files"""
-    if session_id in app.conversational_sessions:
-        session = app.conversational_sessions[session_id]
+    session = app.conversational_sessions.pop(session_id)
+    if session is not None:
+        release_conversational_session_audio(session_id, session)
 
-        # Remove audio files
-        for audio_file in [session["audio_a"], session["audio_b"]]:
-            if os.path.exists(audio_file):
-                try:
-                    os.remove(audio_file)
-                except Exception as e:
-                    app.logger.error(
-                        f"Error removing conversational audio file: {str(e)}"
-                    )
 
-        # Remove session
-        del app.conversational_sessions[session_id]
+def release_conversational_session_audio(session_id, session):
+    """Stop streams and release the audio of a removed conversational session."""
+    for audio_file in [session.audio_a, session.audio_b]:
+        stream = audio_streams.pop(audio_file, None)
+        if stream is not None:
+            stream.cancel()
+        try:
+            release_audio_file(audio_file)
+        except Exception as e:
+            app.logger.error(
+                f"Error removing conversational audio file: {str(e)}"
+            )
 
 
 # Schedule periodic cleanup
 def setup_cleanup():
-    def cleanup_expired_sessions():
-        with app.app_context(): # Ensure app context for logging
-            current_time = datetime.utcnow()
-            # Cleanup TTS sessions
-            expired_tts_sessions = [
-                sid
-                for sid, session_data in app.tts_sessions.items()
-                if current_time > session_data["expires_at"]
-            ]
-            for sid in expired_tts_sessions:
-                cleanup_session(sid)
-
-            # Cleanup conversational sessions
-            expired_conv_sessions = [
-                sid
-                for sid, session_data in app.conversational_sessions.items()
-                if current_time > session_data["expires_at"]
-            ]
-            for sid in expired_conv_sessions:
-                cleanup_conversational_session(sid)
-            app.logger.info(f"Cleaned up {len(expired_tts_sessions)} TTS and {len(expired_conv_sessions)} conversational sessions.")
-
-    # Also cleanup potentially expired cache entries (e.g., > 1 hour old)
-    # This prevents stale cache entries if generation is slow or failing
-    # cleanup_stale_cache_entries()
-
-    # Run cleanup every 15 minutes
+    # Release sessions as they expire, rather than scanning for them
+    session_reaper.watch(app.tts_sessions, release_session_audio)
+    session_reaper.watch(app.conversational_sessions, release_conversational_session_audio)
+    session_reaper.start()
+    atexit.register(session_reaper.shutdown)
+
     scheduler = BackgroundScheduler(daemon=True) # Run scheduler as daemon thread
-    scheduler.add_job(cleanup_expired_sessions, "interval", minutes=15)
+    # Retry cache slots whose fills failed since the last hit
+    scheduler.add_job(cache_refills.top_up, "interval", minutes=15)
+    # Evict expired cache entries and keep cached audio within its disk budget
+    scheduler.add_job(cleanup_stale_cache_entries, "interval", minutes=5)
+    if TTS_CACHE_AUTOSCALE:
+        # Resize the cache to follow demand
+        scheduler.add_job(cache_autoscaler.adjust, "interval", minutes=1)
+    if SHARED_STATE:
+        # Refill entries taken by cache hits on the other workers
+        scheduler.add_job(cache_refills.top_up, "interval", seconds=10, args=[PRIORITY_HIT])
     scheduler.start()
     print("Cleanup scheduler started") # Use print for startup messages
 
@@ -1483,19 +1793,40 @@ def toggle_leaderboard_visibility():
     })
 
 
+def recommend_sentences(limit, mode=None, pool=None):
+    """
+    Up to `limit` usable sentences as (sentence, tier) pairs. In "recommended"
+    mode, sentences the cache can serve right away come first ("cached"), then
+    ones being generated for it ("queued"), then the rest of the unconsumed
+    pool ("pool"). "uniform" mode samples the unconsumed pool only.
+    `pool` defaults to the unconsumed sentences in the dataset.
+    """
+    mode = mode or SENTENCE_RECOMMENDATION_MODE
+    if pool is None:
+        pool = get_unconsumed_sentences(all_harvard_sentences)
+
+    recommended = []
+    if mode == "recommended":
+        cached = tts_cache.sentences()
+        queued = list(cache_refills.queued_sentences() - set(cached))
+        random.shuffle(cached)
+        random.shuffle(queued)
+        recommended = [(s, "cached") for s in cached] + [(s, "queued") for s in queued]
+
+    taken = {sentence for sentence, _ in recommended}
+    remaining = [s for s in pool if s not in taken]
+    needed = max(0, limit - len(recommended))
+    recommended += [(s, "pool") for s in random.sample(remaining, min(len(remaining), needed))]
+    return recommended[:limit]
+
+
 @app.route("/api/tts/cached-sentences")
 def get_cached_sentences():
-    """Returns a list of unconsumed sentences available for random selection."""
-    # Get unconsumed sentences from the full pool (not just cached ones)
-    unconsumed_sentences = get_unconsumed_sentences(all_harvard_sentences)
-    
+    """Returns unconsumed sentences for random selection, cached ones first in recommended mode."""
     # Limit the response size to avoid overwhelming the frontend
     max_sentences = 1000
-    if len(unconsumed_sentences) > max_sentences:
-        import random
-        unconsumed_sentences = random.sample(unconsumed_sentences, max_sentences)
-    
-    return jsonify(unconsumed_sentences)
+    sentences = recommend_sentences(max_sentences, request.args.get("mode"))
+    return jsonify([sentence for sentence, _ in sentences])
 
 
 @app.route("/api/tts/sentence-stats")
@@ -1515,10 +1846,18 @@ def get_sentence_stats():
 
 @app.route("/api/tts/random-sentence")
 def get_random_sentence():
-    """Returns a random unconsumed sentence."""
-    random_sentence = get_random_unconsumed_sentence(all_harvard_sentences)
+    """Returns a random unconsumed sentence, preferring cached ones in recommended mode."""
+    mode = request.args.get("mode") or SENTENCE_RECOMMENDATION_MODE
+    if mode == "recommended":
+        # The best tier available, picked at random within it
+        candidates = recommend_sentences(cache_refills.target, mode)
+        best_tier = [c for c in candidates if c[1] == candidates[0][1]] if candidates else []
+        random_sentence, tier = random.choice(best_tier) if best_tier else (None, None)
+    else:
+        random_sentence, tier = get_random_unconsumed_sentence(all_harvard_sentences), "pool"
     if random_sentence:
-        return jsonify({"sentence": random_sentence})
+        metrics.increment("tts_sentence_recommendation_total", mode=mode, tier=tier)
+        return jsonify({"sentence": random_sentence, "tier": tier})
     else:
         total_sentences = len(all_harvard_sentences)
         consumed_count = get_consumed_sentences_count()
@@ -1528,6 +1867,21 @@ def get_random_sentence():
         }), 404
 
 
+def filter_healthy_models(models, num_required=2):
+    """
+    Drops models whose provider circuit breaker is open. Falls back to the full
+    list if that would leave fewer than num_required, so the arena keeps working
+    when several providers are degraded at once.
+    """
+    healthy_models = [model for model in models if provider_health.is_available(model.id)]
+    if len(healthy_models) < num_required:
+        app.logger.warning(
+            f"Only {len(healthy_models)} healthy models available, ignoring circuit breakers."
+        )
+        return models
+    return healthy_models
+
+
 def get_weighted_random_models(
     applicable_models: list[Model], num_to_select: int, model_type: ModelType
 ) -> list[Model]:
@@ -1606,28 +1960,38 @@ def check_for_coordinated_campaigns():
         app.logger.error(f"Error in coordinated campaign check: {str(e)}")
 
 
-if __name__ == "__main__":
+def start_worker():
+    """
+    Prepares this process to serve requests. Called by python app.py before
+    serving, and by each gunicorn worker once it has loaded the app (see
+    gunicorn.conf.py). With shared state, only the worker holding the leader
+    lock restores the cache and runs the background jobs.
+    """
+    # Configure Flask to recognize HTTPS when behind a reverse proxy
+    from werkzeug.middleware.proxy_fix import ProxyFix
+
+    # Apply ProxyFix middleware to handle reverse proxy headers
+    # This ensures Flask generates correct URLs with https scheme
+    # X-Forwarded-Proto header will be used to detect the original protocol
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
+
+    # Force Flask to prefer HTTPS for generated URLs
+    app.config["PREFERRED_URL_SCHEME"] = "https"
+
+    # Open PlayDialog channels ahead of the first conversational request
+    threading.Thread(target=pyht_clients.warm, daemon=True).start()
+
+    if SHARED_STATE and not acquire_leader_lock():
+        print(f"Worker {os.getpid()} serving requests; another worker runs the background jobs")
+        # The random button fallback is per worker
+        with app.app_context():
+            update_initial_sentences()
+        return
+
     with app.app_context():
         # Ensure ./instance and ./votes directories exist
         os.makedirs("instance", exist_ok=True)
         os.makedirs("./votes", exist_ok=True) # Create votes directory if it doesn't exist
-        os.makedirs(CACHE_AUDIO_DIR, exist_ok=True) # Ensure cache audio dir exists
-
-        # Clean up old cache audio files on startup
-        try:
-            app.logger.info(f"Clearing old cache audio files from {CACHE_AUDIO_DIR}")
-            for filename in os.listdir(CACHE_AUDIO_DIR):
-                file_path = os.path.join(CACHE_AUDIO_DIR, filename)
-                try:
-                    if os.path.isfile(file_path) or os.path.islink(file_path):
-                        os.unlink(file_path)
-                    elif os.path.isdir(file_path):
-                        shutil.rmtree(file_path)
-                except Exception as e:
-                    app.logger.error(f'Failed to delete {file_path}. Reason: {e}')
-        except Exception as e:
-             app.logger.error(f"Error clearing cache directory {CACHE_AUDIO_DIR}: {e}")
-
 
         # Download database if it doesn't exist (only on initial space start)
         if IS_SPACES and not os.path.exists(app.config["SQLALCHEMY_DATABASE_URI"].replace("sqlite:///", "")):
@@ -1647,21 +2011,30 @@ if __name__ == "__main__":
 
         db.create_all()  # Create tables if they don't exist
         insert_initial_models()
+
+        # Warm restart: keep cached generations from the last run, then clear out
+        # audio nothing references any more (preference exports keep theirs as
+        # hard links under ./votes)
+        try:
+            restore_tts_cache()
+        except Exception as e:
+            app.logger.error(f"Error restoring TTS cache from manifest: {e}")
+        try:
+            # Other workers may already be writing new audio into staging
+            removed = audio_store.sweep(min_staging_age=3600 if SHARED_STATE else 0)
+            app.logger.info(f"Removed {removed} unreferenced files from the audio store")
+        except Exception as e:
+            app.logger.error(f"Error sweeping audio store {audio_store.root}: {e}")
+
         # Setup background tasks
+        cache_refills.start()
         initialize_tts_cache() # Start populating the cache
         setup_cleanup()
         setup_periodic_tasks() # Renamed function call
 
-    # Configure Flask to recognize HTTPS when behind a reverse proxy
-    from werkzeug.middleware.proxy_fix import ProxyFix
-
-    # Apply ProxyFix middleware to handle reverse proxy headers
-    # This ensures Flask generates correct URLs with https scheme
-    # X-Forwarded-Proto header will be used to detect the original protocol
-    app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
 
-    # Force Flask to prefer HTTPS for generated URLs
-    app.config["PREFERRED_URL_SCHEME"] = "https"
+if __name__ == "__main__":
+    start_worker()
 
     from waitress import serve
 
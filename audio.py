@@ -0,0 +1,233 @@
+"""
+Audio results returned by the TTS backends.
+
+Every backend hands back an AudioResult, whether the provider gave us base64
+text, raw bytes, a stream of chunks or a file. The audio is only decoded or
+buffered when a caller asks for it, and save() writes it exactly once,
+straight to where the caller wants it stored.
+"""
+
+import base64
+import os
+import re
+import shutil
+import tempfile
+import threading
+
+# Base64 characters decoded per step; a multiple of 4 so every slice decodes on its own
+B64_DECODE_CHUNK = 256 * 1024
+# Bytes per chunk when reading audio back from disk
+FILE_READ_CHUNK = 256 * 1024
+
+# Line breaks or spaces in base64 would shift the slices off 4-character boundaries
+_WHITESPACE = re.compile(r"\s")
+_WHITESPACE_BYTES = re.compile(rb"\s")
+
+
+class AudioResult:
+    """Generated audio exposed as a path, bytes or chunks, materialized lazily."""
+
+    def __init__(self, b64_data=None, data=None, chunks=None, path=None, extension="wav"):
+        self._b64_data = b64_data
+        self._data = data
+        self._chunks = chunks
+        self._path = path
+        self._owns_path = False  # True when _path is a temp file we created
+        self.extension = extension
+
+    @classmethod
+    def from_base64(cls, b64_data, extension="wav"):
+        return cls(b64_data=b64_data, extension=extension)
+
+    @classmethod
+    def from_bytes(cls, data, extension="wav"):
+        return cls(data=data, extension=extension)
+
+    @classmethod
+    def from_chunks(cls, chunks, extension="wav"):
+        """Wrap a one-shot iterator of byte chunks, e.g. a streaming response."""
+        return cls(chunks=iter(chunks), extension=extension)
+
+    @classmethod
+    def from_path(cls, path, extension=None):
+        extension = extension or os.path.splitext(path)[1].lstrip(".") or "wav"
+        return cls(path=path, extension=extension)
+
+    def fork(self):
+        """
+        A separate handle on the same audio, for callers that share one provider
+        call. Each handle can be saved or read on its own.
+        """
+        if self._b64_data is not None:
+            return AudioResult.from_base64(self._b64_data, self.extension)
+        return AudioResult.from_bytes(self.read(), self.extension)
+
+    @property
+    def nbytes(self):
+        """Size of the decoded audio, or None while it is still streaming in."""
+        if self._data is not None:
+            return len(self._data)
+        if self._path is not None:
+            return os.path.getsize(self._path)
+        if self._b64_data is not None:
+            data = self._compact_b64()
+            padding = data[-2:].count("=" if isinstance(data, str) else b"=")
+            return len(data) * 3 // 4 - padding
+        return None
+
+    def _compact_b64(self):
+        """The base64 data without whitespace, e.g. from line-wrapped encoders."""
+        data = self._b64_data
+        pattern = _WHITESPACE if isinstance(data, str) else _WHITESPACE_BYTES
+        if pattern.search(data):
+            data = self._b64_data = data[:0].join(data.split())
+        return data
+
+    def _iter_source(self):
+        if self._path is not None:
+            with open(self._path, "rb") as f:
+                while chunk := f.read(FILE_READ_CHUNK):
+                    yield chunk
+        elif self._data is not None:
+            yield self._data
+        elif self._b64_data is not None:
+            data = self._compact_b64()
+            for start in range(0, len(data), B64_DECODE_CHUNK):
+                yield base64.b64decode(data[start:start + B64_DECODE_CHUNK])
+        elif self._chunks is not None:
+            chunks, self._chunks = self._chunks, None
+            yield from chunks
+        else:
+            raise ValueError("Audio has already been consumed")
+
+    def stream_chunks(self):
+        """Yield the audio once, as it arrives, without keeping a copy."""
+        return self._iter_source()
+
+    def iter_chunks(self):
+        """Yield the audio in chunks, buffering a streamed source so it can be re-read."""
+        if self._chunks is None:
+            yield from self._iter_source()
+            return
+        buffered = []
+        for chunk in self._iter_source():
+            buffered.append(chunk)
+            yield chunk
+        self._data = b"".join(buffered)
+
+    def read(self):
+        if self._data is None:
+            self._data = b"".join(self.iter_chunks())
+        return self._data
+
+    @property
+    def bytes(self):
+        return self.read()
+
+    @property
+    def path(self):
+        """Path to the audio on disk, writing a temporary file the first time if needed."""
+        if self._path is None:
+            fd, temp_path = tempfile.mkstemp(suffix=f".{self.extension}")
+            os.close(fd)
+            self.save(temp_path)
+            self._owns_path = True
+        return self._path
+
+    def save(self, dest_path, digest=None):
+        """
+        Write the audio to dest_path exactly once and return it. A hashlib
+        object passed as digest is updated with the audio as it is written.
+        """
+        if self._path is not None and self._owns_path:
+            # Already materialized to our own temp file, so just move it into place
+            shutil.move(self._path, dest_path)
+            if digest is not None:
+                with open(dest_path, "rb") as f:
+                    while chunk := f.read(FILE_READ_CHUNK):
+                        digest.update(chunk)
+        else:
+            partial_path = f"{dest_path}.part"
+            try:
+                with open(partial_path, "wb") as f:
+                    for chunk in self._iter_source():
+                        f.write(chunk)
+                        if digest is not None:
+                            digest.update(chunk)
+                # Same directory, so this is a rename rather than a second write
+                os.replace(partial_path, dest_path)
+            except Exception:
+                if os.path.exists(partial_path):
+                    os.remove(partial_path)
+                raise
+        # Later reads come from the saved file
+        self._path = dest_path
+        self._owns_path = False
+        self._b64_data = self._chunks = None
+        return dest_path
+
+
+class StreamingAudioFile:
+    """
+    An audio file that is still being written. Chunks are appended as the
+    provider produces them and readers can follow the file while it grows.
+    """
+
+    def __init__(self, path, idle_timeout=60):
+        self.path = path
+        self.idle_timeout = idle_timeout  # Seconds a reader waits for new audio
+        self.complete = False
+        self.error = None
+        self._size = 0
+        self._cancelled = False
+        self._cond = threading.Condition()
+        # Create the file up front so readers can open it straight away
+        open(path, "wb").close()
+
+    def write_from(self, audio):
+        """Append an AudioResult's chunks to the file. Blocks until the audio ends."""
+        try:
+            with open(self.path, "ab") as f:
+                for chunk in audio.stream_chunks():
+                    if self._cancelled:
+                        raise RuntimeError("Audio stream cancelled")
+                    f.write(chunk)
+                    f.flush()
+                    with self._cond:
+                        self._size += len(chunk)
+                        self._cond.notify_all()
+        except Exception as e:
+            self.error = e
+            raise
+        finally:
+            with self._cond:
+                self.complete = True
+                self._cond.notify_all()
+
+    def follow(self):
+        """Yield the file's contents, waiting for more until the writer finishes."""
+        offset = 0
+        with open(self.path, "rb") as f:
+            while True:
+                with self._cond:
+                    self._cond.wait_for(
+                        lambda: self._size > offset or self.complete, self.idle_timeout
+                    )
+                    size = self._size
+                if size > offset:
+                    f.seek(offset)
+                    data = f.read(size - offset)
+                    offset += len(data)
+                    yield data
+                else:
+                    # Writer finished, or stalled for longer than idle_timeout
+                    return
+
+    def wait(self, timeout=None):
+        """Wait for the writer to finish; True if the audio is complete and intact."""
+        with self._cond:
+            self._cond.wait_for(lambda: self.complete, timeout)
+        return self.complete and self.error is None
+
+    def cancel(self):
+        self._cancelled = True
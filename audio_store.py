@@ -0,0 +1,202 @@
+"""
+Content-addressed audio store for TTS Arena.
+
+Generated clips are stored once under their SHA-256, as
+blobs/<id[:2]>/<id>.wav. Their compressed variants and waveform peaks sit
+next to them and share the blob id. Sessions and cache entries hold
+references to a blob, and the blob and its sidecars are deleted when the
+last reference is released. Reference counts are kept in memory, or in the
+shared state database when worker processes share the store. Preference exports hold their
+reference as a hard link into ./votes instead of a copy. The link survives
+restarts and is dropped when the uploaded vote directory is removed.
+"""
+
+import errno
+import hashlib
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from shared_state import SHARED_STATE, SharedRefCounts
+from transcode import remove_variants
+from waveform import remove_peaks
+
+# Kept on the same filesystem as ./votes so preference exports can hard link
+AUDIO_STORE_DIR = os.getenv("AUDIO_STORE_DIR", "./audio_store")
+
+_BLOB_NAME = re.compile(r"^([0-9a-f]{64})\.wav$")
+_BLOB_ID = re.compile(r"^[0-9a-f]{64}$")
+
+
+class MemoryRefCounts:
+    """Reference counts for a store used by a single process. get() and set() are only valid inside locked()."""
+
+    def __init__(self):
+        self._refs = {}  # blob id -> reference count
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def locked(self):
+        with self._lock:
+            yield self
+
+    def get(self, blob_id):
+        return self._refs.get(blob_id, 0)
+
+    def set(self, blob_id, count):
+        if count > 0:
+            self._refs[blob_id] = count
+        else:
+            self._refs.pop(blob_id, None)
+
+    def referenced(self):
+        return set(self._refs)
+
+    def totals(self):
+        with self._lock:
+            return len(self._refs), sum(self._refs.values())
+
+
+class BlobStore:
+    def __init__(self, root=AUDIO_STORE_DIR, refs=None):
+        self.root = root
+        self.blob_dir = os.path.join(root, "blobs")
+        # Partial writes and progressive streams, whose hash isn't known yet
+        self.staging_dir = os.path.join(root, "staging")
+        os.makedirs(self.blob_dir, exist_ok=True)
+        os.makedirs(self.staging_dir, exist_ok=True)
+        self.refs = refs or MemoryRefCounts()
+
+    def blob_path(self, blob_id):
+        return os.path.join(self.blob_dir, blob_id[:2], f"{blob_id}.wav")
+
+    def blob_id(self, path):
+        """The blob id for a path inside the store, or None for any other file."""
+        match = _BLOB_NAME.match(os.path.basename(path))
+        if match and os.path.abspath(path) == os.path.abspath(self.blob_path(match.group(1))):
+            return match.group(1)
+        return None
+
+    def audio_id(self, path):
+        """
+        A short id for a clip: the blob id for a blob, the file name for a
+        staging file, or the absolute path for any other file.
+        """
+        blob_id = self.blob_id(path)
+        if blob_id:
+            return blob_id
+        if os.path.dirname(os.path.abspath(path)) == os.path.abspath(self.staging_dir):
+            return os.path.basename(path)
+        return os.path.abspath(path)
+
+    def audio_path(self, audio_id):
+        """The path of the clip with an id from audio_id()."""
+        if _BLOB_ID.match(audio_id):
+            return self.blob_path(audio_id)
+        if os.sep in audio_id:
+            return audio_id
+        return os.path.join(self.staging_dir, audio_id)
+
+    def staging_path(self, extension="wav"):
+        """A fresh path for audio that is written before its content is known."""
+        return os.path.join(self.staging_dir, f"{uuid.uuid4()}.{extension}")
+
+    def put(self, audio):
+        """
+        Store an AudioResult and take one reference to it for the caller.
+        Returns (path, created); created is False when identical audio was
+        already stored.
+        """
+        staging_path = self.staging_path()
+        digest = hashlib.sha256()
+        audio.save(staging_path, digest)
+        blob_id = digest.hexdigest()
+        dest_path = self.blob_path(blob_id)
+
+        with self.refs.locked() as refs:
+            created = not os.path.exists(dest_path)
+            if created:
+                os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+                os.replace(staging_path, dest_path)
+            else:
+                os.remove(staging_path)
+            refs.set(blob_id, refs.get(blob_id) + 1)
+        return dest_path, created
+
+    def acquire(self, path):
+        """Take another reference to a stored blob."""
+        blob_id = self.blob_id(path)
+        if blob_id is None:
+            return
+        with self.refs.locked() as refs:
+            refs.set(blob_id, refs.get(blob_id) + 1)
+
+    def release(self, path):
+        """
+        Drop a reference, deleting the blob and its sidecars once none remain.
+        Files outside the store, such as progressive streams, are deleted
+        straight away.
+        """
+        if not path:
+            return
+        blob_id = self.blob_id(path)
+        if blob_id is None:
+            self._remove_with_sidecars(path)
+            return
+        with self.refs.locked() as refs:
+            remaining = refs.get(blob_id) - 1
+            refs.set(blob_id, remaining)
+            if remaining <= 0:
+                # Under the lock so a concurrent put() of the same audio can't lose its file
+                self._remove_with_sidecars(path)
+
+    @staticmethod
+    def _remove_with_sidecars(path):
+        if os.path.exists(path):
+            os.remove(path)
+        remove_variants(path)
+        remove_peaks(path)
+
+    def link(self, path, dest_path):
+        """Hard link a stored clip into dest_path, copying only across filesystems."""
+        try:
+            os.link(path, dest_path)
+        except OSError as e:
+            if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK):
+                raise
+            shutil.copyfile(path, dest_path)
+
+    def sweep(self, min_staging_age=0):
+        """
+        Delete blobs and leftover staging files that nothing references.
+        Staging files younger than min_staging_age seconds are kept, since
+        another process may still be writing them. Returns the count.
+        """
+        removed = 0
+        with self.refs.locked() as refs:
+            referenced = refs.referenced()
+            for dirpath, _, filenames in os.walk(self.blob_dir):
+                for filename in filenames:
+                    # Sidecars share the blob id prefix, e.g. <id>.mp3 or <id>.peaks.json
+                    if filename.split(".", 1)[0] not in referenced:
+                        os.remove(os.path.join(dirpath, filename))
+                        removed += 1
+            for filename in os.listdir(self.staging_dir):
+                path = os.path.join(self.staging_dir, filename)
+                if min_staging_age and time.time() - os.path.getmtime(path) < min_staging_age:
+                    continue
+                os.remove(path)
+                removed += 1
+        return removed
+
+    def stats(self):
+        blobs, references = self.refs.totals()
+        return {"blobs": blobs, "references": references}
+
+
+# Shared refs make a worker's release() see references taken by the others
+audio_store = BlobStore(refs=SharedRefCounts() if SHARED_STATE else None)
@@ -0,0 +1,156 @@
+"""
+Memory and serialization benchmark for arena session records.
+
+Builds the same live sessions twice, once as the per-session dicts sessions
+used to be (datetimes, absolute audio paths, a fresh model id string per
+session) and once as session_store records, and reports the memory each
+layout holds as measured by tracemalloc. It also times a round trip of every
+session through the shared store's row format against the JSON the shared
+store used to write, and through SharedSessionStore itself.
+
+Usage:
+    python bench_sessions.py --sessions 20000
+"""
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+import uuid
+from datetime import datetime
+
+_workdir = tempfile.mkdtemp(prefix="bench_sessions_")
+os.environ.setdefault("AUDIO_STORE_DIR", os.path.join(_workdir, "audio_store"))
+os.environ["STATE_BACKEND"] = "memory"
+
+from audio_store import audio_store  # noqa: E402
+from session_store import (  # noqa: E402
+    SESSION_TTL,
+    SharedSessionStore,
+    TTSSession,
+)
+
+MODEL_IDS = [f"provider-{i}/model-{i}" for i in range(12)]
+TEXT = "The birch canoe slid on the smooth planks."
+
+
+def sample_sessions(count):
+    """(session_id, model_a, model_b, audio_a, audio_b) for each session."""
+    samples = []
+    for i in range(count):
+        # Model ids arrive as new strings from request and database rows
+        model_a = "".join(MODEL_IDS[i % len(MODEL_IDS)])
+        model_b = "".join(MODEL_IDS[(i + 1) % len(MODEL_IDS)])
+        audio_a = audio_store.blob_path(uuid.uuid4().hex * 2)
+        audio_b = audio_store.blob_path(uuid.uuid4().hex * 2)
+        samples.append((str(uuid.uuid4()), model_a, model_b, audio_a, audio_b))
+    return samples
+
+
+def dict_session(model_a, model_b, audio_a, audio_b):
+    created_at = datetime.utcnow()
+    return {
+        "model_a": model_a,
+        "model_b": model_b,
+        "audio_a": os.path.abspath(audio_a),
+        "audio_b": os.path.abspath(audio_b),
+        "text": TEXT,
+        "created_at": created_at,
+        "expires_at": created_at + SESSION_TTL,
+        "voted": False,
+        "cache_hit": False,
+    }
+
+
+def record_session(model_a, model_b, audio_a, audio_b):
+    return TTSSession.create(model_a, model_b, audio_a, audio_b, text=TEXT)
+
+
+def measure_memory(samples, build):
+    """Bytes held by the sessions built from samples, keyed by session id as stores keep them."""
+    # Copies made before tracing, so the samples themselves aren't counted
+    args = [(sid, "".join(a), "".join(b), audio_a, audio_b) for sid, a, b, audio_a, audio_b in samples]
+    tracemalloc.start()
+    sessions = {}
+    for session_id, model_a, model_b, audio_a, audio_b in args:
+        sessions[session_id] = build(model_a, model_b, audio_a, audio_b)
+    held, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return held
+
+
+def encode_json(data):
+    encoded = dict(data)
+    for field in ("created_at", "expires_at"):
+        encoded[field] = encoded[field].isoformat()
+    return json.dumps(encoded)
+
+
+def decode_json(text):
+    data = json.loads(text)
+    for field in ("created_at", "expires_at"):
+        data[field] = datetime.fromisoformat(data[field])
+    return data
+
+
+def time_round_trips(sessions, encode, decode):
+    start = time.perf_counter()
+    for session in sessions:
+        decode(encode(session))
+    return time.perf_counter() - start
+
+
+def time_shared_store(samples):
+    store = SharedSessionStore("tts", path=os.path.join(_workdir, "shared_state.db"))
+    records = [(sid, record_session(a, b, audio_a, audio_b)) for sid, a, b, audio_a, audio_b in samples]
+    start = time.perf_counter()
+    for session_id, record in records:
+        store.add(session_id, record)
+    added = time.perf_counter() - start
+    start = time.perf_counter()
+    for session_id, _ in records:
+        store.get(session_id)
+    fetched = time.perf_counter() - start
+    start = time.perf_counter()
+    store.pop_expired(time.time() + SESSION_TTL.total_seconds() + 1)
+    expired = time.perf_counter() - start
+    store.close()
+    return added, fetched, expired
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--sessions", type=int, default=20000, help="live sessions to build")
+    args = parser.parse_args()
+
+    samples = sample_sessions(args.sessions)
+    dict_bytes = measure_memory(samples, dict_session)
+    record_bytes = measure_memory(samples, record_session)
+    print(f"{args.sessions} live sessions")
+    print(f"  dicts:   {dict_bytes / 1024:10.1f} KiB  ({dict_bytes / args.sessions:6.0f} B/session)")
+    print(f"  records: {record_bytes / 1024:10.1f} KiB  ({record_bytes / args.sessions:6.0f} B/session)")
+    print(f"  saved:   {100 * (1 - record_bytes / dict_bytes):9.1f} %")
+
+    dicts = [dict_session(a, b, audio_a, audio_b) for _, a, b, audio_a, audio_b in samples]
+    records = [record_session(a, b, audio_a, audio_b) for _, a, b, audio_a, audio_b in samples]
+    json_time = time_round_trips(dicts, encode_json, decode_json)
+    row_time = time_round_trips(records, TTSSession.to_row, TTSSession.from_row)
+    print("Serialization round trips")
+    print(f"  JSON dicts:   {1e6 * json_time / args.sessions:6.2f} us/session")
+    print(f"  record rows:  {1e6 * row_time / args.sessions:6.2f} us/session")
+
+    try:
+        added, fetched, expired = time_shared_store(samples)
+    finally:
+        shutil.rmtree(_workdir, ignore_errors=True)
+    print("SharedSessionStore")
+    print(f"  add:          {1e6 * added / args.sessions:6.2f} us/session")
+    print(f"  get:          {1e6 * fetched / args.sessions:6.2f} us/session")
+    print(f"  pop_expired:  {1e6 * expired / args.sessions:6.2f} us/session")
+
+
+if __name__ == "__main__":
+    main()
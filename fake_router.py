@@ -0,0 +1,236 @@
+"""
+Local stand-in for the TTS providers, for offline load testing.
+
+Speaks the same contracts tts.py uses for the TTS router (/tts returning
+audio_data and extension), fal CSM (/fal/csm-1b returning audio.url),
+PlayDialog (/pyht/tts streaming audio chunks) and the Dia gradio space
+(/gradio_api/call/generate_dialogue plus its SSE stream), with configurable
+latency, error rate and payload size per model.
+
+Usage:
+    python fake_router.py --port 7861 --config fake_router.json
+    TTS_FAKE_ROUTER_URL=http://127.0.0.1:7861 python app.py
+
+Config (all keys optional; per-model entries override "default" and are
+looked up by router model name, provider name or conversational model id):
+    {
+        "default": {
+            "latency": {"distribution": "lognormal", "median": 2.0, "sigma": 0.5},
+            "error_rate": 0.02,
+            "payload_bytes": 200000
+        },
+        "models": {
+            "eleven_multilingual_v2": {"latency": {"distribution": "uniform", "min": 0.5, "max": 1.5}},
+            "dia-1.6b": {"error_rate": 0.2, "quota_error_rate": 0.1}
+        }
+    }
+Latency distributions: "fixed" (seconds), "uniform" (min, max) and
+"lognormal" (median, sigma).
+"""
+
+import argparse
+import base64
+import io
+import json
+import math
+import os
+import random
+import re
+import time
+import uuid
+import wave
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SAMPLE_RATE = 24000
+
+DEFAULT_PROFILE = {
+    "latency": {"distribution": "lognormal", "median": 1.5, "sigma": 0.5},
+    "error_rate": 0.0,
+    "quota_error_rate": 0.0,
+    "payload_bytes": 200000,
+}
+
+
+def tone_period():
+    """One period of a tone with a random pitch, amplitude and starting phase."""
+    samples = random.randint(55, 220)  # 109 to 436 Hz
+    amplitude = random.randint(4000, 12000)
+    phase = random.randrange(samples)
+    return b"".join(
+        int(amplitude * math.sin(2 * math.pi * (i + phase) / samples)).to_bytes(2, "little", signed=True)
+        for i in range(samples)
+    )
+
+
+def make_wav(payload_bytes):
+    """
+    A mono 16-bit WAV of roughly payload_bytes. Each call returns a different
+    tone, like real generations, so the audio store doesn't deduplicate them.
+    """
+    frames = max(1, (payload_bytes - 44) // 2)
+    period = tone_period()
+    pcm = (period * (frames * 2 // len(period) + 1))[:frames * 2]
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(SAMPLE_RATE)
+        wav.writeframes(pcm)
+    return buffer.getvalue()
+
+
+def sample_latency(spec):
+    distribution = spec.get("distribution", "fixed")
+    if distribution == "uniform":
+        return random.uniform(spec.get("min", 0), spec.get("max", 1))
+    if distribution == "lognormal":
+        return random.lognormvariate(math.log(spec.get("median", 1)), spec.get("sigma", 0.5))
+    return spec.get("seconds", 0)
+
+
+class FakeRouterHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, like the real providers
+    config = {}
+    dia_events = {}  # event id -> model id
+
+    def profile(self, *keys):
+        profile = dict(DEFAULT_PROFILE)
+        profile.update(self.config.get("default", {}))
+        models = self.config.get("models", {})
+        for key in keys:
+            if key in models:
+                profile.update(models[key])
+                break
+        return profile
+
+    def simulate(self, profile):
+        """Sleep for a sampled latency; returns an error status to send, or None."""
+        time.sleep(sample_latency(profile["latency"]))
+        if random.random() < profile.get("quota_error_rate", 0):
+            return 429
+        if random.random() < profile["error_rate"]:
+            return 500
+        return None
+
+    def read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def send_body(self, status, body, content_type="application/json"):
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def file_url(self, payload_bytes):
+        host = self.headers.get("Host", f"127.0.0.1:{self.server.server_port}")
+        return f"http://{host}/files/{payload_bytes}/{uuid.uuid4().hex}.wav"
+
+    def do_POST(self):
+        if self.path == "/tts":
+            request = self.read_json()
+            profile = self.profile(request.get("model"), request.get("provider"))
+            error = self.simulate(profile)
+            if error:
+                return self.send_body(error, {"error": "Simulated provider failure"})
+            audio = make_wav(profile["payload_bytes"])
+            return self.send_body(200, {
+                "audio_data": base64.b64encode(audio).decode(),
+                "extension": "wav",
+            })
+
+        if self.path == "/fal/csm-1b":
+            self.read_json()
+            profile = self.profile("csm-1b")
+            error = self.simulate(profile)
+            if error:
+                return self.send_body(error, {"detail": "Simulated fal failure"})
+            return self.send_body(200, {"audio": {"url": self.file_url(profile["payload_bytes"])}})
+
+        if self.path == "/pyht/tts":
+            self.read_json()
+            profile = self.profile("playdialog-1.0")
+            error = self.simulate(profile)
+            if error:
+                return self.send_body(error, {"error": "Simulated PlayHT failure"})
+            # Stream the audio in chunks spread over a second, like PlayDialog does
+            audio = make_wav(profile["payload_bytes"])
+            self.send_response(200)
+            self.send_header("Content-Type", "audio/wav")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            chunk_size = max(4096, len(audio) // 10)
+            for start in range(0, len(audio), chunk_size):
+                chunk = audio[start:start + chunk_size]
+                self.wfile.write(f"{len(chunk):X}\r\n".encode() + chunk + b"\r\n")
+                self.wfile.flush()
+                time.sleep(0.1)
+            self.wfile.write(b"0\r\n\r\n")
+            return
+
+        if self.path == "/gradio_api/call/generate_dialogue":
+            self.read_json()
+            profile = self.profile("dia-1.6b")
+            if random.random() < profile.get("quota_error_rate", 0):
+                return self.send_body(429, {"error": "You have exceeded your GPU quota"})
+            event_id = uuid.uuid4().hex
+            self.dia_events[event_id] = profile
+            return self.send_body(200, {"event_id": event_id})
+
+        self.send_body(404, {"error": "Not found"})
+
+    def do_GET(self):
+        match = re.fullmatch(r"/gradio_api/call/generate_dialogue/(\w+)", self.path)
+        if match:
+            profile = self.dia_events.pop(match.group(1), None)
+            if profile is None:
+                return self.send_body(404, {"error": "Unknown event"})
+            error = self.simulate(dict(profile, quota_error_rate=0))
+            if error:
+                events = 'event: error\ndata: "Simulated Dia failure"\n\n'
+            else:
+                url = json.dumps([{"url": self.file_url(profile["payload_bytes"])}])
+                events = f"event: complete\ndata: {url}\n\n"
+            return self.send_body(200, events.encode(), "text/event-stream")
+
+        match = re.fullmatch(r"/files/(\d+)/\w+\.wav", self.path)
+        if match:
+            return self.send_body(200, make_wav(int(match.group(1))), "audio/wav")
+
+        self.send_body(404, {"error": "Not found"})
+
+    def log_message(self, format, *args):
+        if os.getenv("FAKE_ROUTER_VERBOSE"):
+            super().log_message(format, *args)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7861)
+    parser.add_argument("--config", default=os.getenv("FAKE_ROUTER_CONFIG"))
+    parser.add_argument("--seed", type=int, help="Seed for reproducible latency, errors and audio")
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+    if args.config:
+        with open(args.config) as f:
+            FakeRouterHandler.config = json.load(f)
+
+    server = ThreadingHTTPServer((args.host, args.port), FakeRouterHandler)
+    server.daemon_threads = True
+    print(f"Fake TTS router listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
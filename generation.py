@@ -0,0 +1,165 @@
+"""
+Shared generation engine for TTS Arena.
+
+All provider calls run through one long-lived asyncio event loop instead of a
+fresh ThreadPoolExecutor per request. The loop fans out the calls for a
+request concurrently, limits how many calls may be in flight per provider and
+enforces an overall deadline. Live requests and background work such as cache
+refills have separate per-provider budgets, so a live cache miss never queues
+behind refills. Identical (text, model) calls that overlap share one provider
+call, and each caller gets its own handle on the audio.
+
+generate() still blocks the calling request thread until the audio is ready
+or the deadline passes; the engine bounds how long that is and how many calls
+reach each provider, not how many server threads are waiting.
+"""
+
+import asyncio
+import atexit
+import hashlib
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from tts import predict_tts, model_mapping
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Worker threads available for blocking provider SDK calls (fal, pyht, requests)
+GENERATION_MAX_WORKERS = int(os.getenv("GENERATION_MAX_WORKERS", "16"))
+# Maximum concurrent calls to a single provider for live requests
+PROVIDER_MAX_CONCURRENCY = int(os.getenv("PROVIDER_MAX_CONCURRENCY", "4"))
+# Maximum concurrent background calls (cache refills) to a single provider, on top of live ones
+PROVIDER_BACKGROUND_CONCURRENCY = int(os.getenv("PROVIDER_BACKGROUND_CONCURRENCY", "2"))
+
+
+class GenerationEngine:
+    """Runs provider calls on a dedicated event loop thread."""
+
+    def __init__(self, max_workers=GENERATION_MAX_WORKERS,
+                 provider_concurrency=PROVIDER_MAX_CONCURRENCY,
+                 background_concurrency=PROVIDER_BACKGROUND_CONCURRENCY):
+        self.provider_concurrency = provider_concurrency
+        self.background_concurrency = background_concurrency
+        self._provider_semaphores = {}  # (provider, background) -> semaphore, loop thread only
+        self._inflight = {}  # generation_key -> shared call and waiter count, loop thread only
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="ProviderCall"
+        )
+        self._loop = asyncio.new_event_loop()
+        self._loop.set_default_executor(self._executor)
+        self._thread = threading.Thread(
+            target=self._run_loop, name="GenerationEngine", daemon=True
+        )
+        self._thread.start()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+
+    def _provider_semaphore(self, model_id, background):
+        provider = model_mapping.get(model_id, {}).get("provider", model_id)
+        semaphore = self._provider_semaphores.get((provider, background))
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(
+                self.background_concurrency if background else self.provider_concurrency
+            )
+            self._provider_semaphores[(provider, background)] = semaphore
+        return semaphore
+
+    @staticmethod
+    def generation_key(text, model_id):
+        """Identifies a generation; text may be a string or a conversational script."""
+        payload = json.dumps([text, model_id], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    async def _call_provider(self, text, model_id, stream, background):
+        if stream:
+            # A streamed result can only be read once, so it can't be shared
+            return await self._call_provider_once(text, model_id, stream, background)
+
+        key = self.generation_key(text, model_id)
+        entry = self._inflight.get(key)
+        if entry is not None and entry["background"] and entry["queued"] and not background:
+            # A live request doesn't wait for a background call to get a provider slot
+            entry = None
+        if entry is None:
+            entry = {"waiters": 0, "background": background, "queued": True}
+            shared = asyncio.ensure_future(
+                self._call_provider_once(text, model_id, stream, background, entry)
+            )
+            entry["call"] = shared
+            self._inflight[key] = entry
+
+            def forget(future):
+                if self._inflight.get(key) is entry:
+                    del self._inflight[key]
+                if not future.cancelled():
+                    future.exception()  # Retrieved here in case every caller gave up
+
+            shared.add_done_callback(forget)
+        else:
+            metrics.increment("tts_generation_coalesced", model=model_id)
+            logger.info(f"Joining in-flight generation for model {model_id}")
+
+        entry["waiters"] += 1
+        try:
+            # Shielded so one caller giving up doesn't cancel the call for the others
+            audio = await asyncio.shield(entry["call"])
+        finally:
+            entry["waiters"] -= 1
+            if not entry["waiters"] and not entry["call"].done():
+                # Nobody is waiting any more, so don't spend a provider slot on it
+                entry["call"].cancel()
+        return audio.fork()
+
+    async def _call_provider_once(self, text, model_id, stream, background, entry=None):
+        semaphore = self._provider_semaphore(model_id, background)
+        await semaphore.acquire()
+        if entry is not None:
+            entry["queued"] = False
+        call = self._loop.run_in_executor(None, predict_tts, text, model_id, stream)
+        # The worker thread can't be interrupted, so keep the provider slot
+        # until it actually finishes even if the caller stops waiting.
+        call.add_done_callback(lambda _: semaphore.release())
+        return await asyncio.shield(call)
+
+    async def _generate_all(self, text, model_ids, timeout, stream, background):
+        calls = [
+            self._call_provider(text, model_id, stream, background) for model_id in model_ids
+        ]
+        return await asyncio.wait_for(asyncio.gather(*calls), timeout)
+
+    def submit(self, text, model_ids, timeout=None, stream=False, background=False):
+        """
+        Schedule generation of text (or a conversational script) for each model.
+        Returns a concurrent.futures.Future resolving to the predict_tts results
+        in model order. With stream=True, backends that support it resolve as
+        soon as audio starts arriving. Background calls use their own, smaller
+        provider budget, so they never hold up live requests.
+        """
+        return asyncio.run_coroutine_threadsafe(
+            self._generate_all(text, list(model_ids), timeout, stream, background), self._loop
+        )
+
+    def generate(self, text, model_ids, timeout=None, stream=False, background=False):
+        """Blocking helper for request handlers and background tasks."""
+        future = self.submit(text, model_ids, timeout, stream, background)
+        try:
+            return future.result()
+        except BaseException:
+            future.cancel()
+            raise
+
+    def shutdown(self):
+        if self._loop.is_running():
+            self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+generation_engine = GenerationEngine()
+atexit.register(generation_engine.shutdown)
@@ -0,0 +1,42 @@
+"""
+Gunicorn settings for serving TTS Arena from several worker processes.
+
+    STATE_BACKEND=sqlite gunicorn app:app
+
+Sessions, the TTS cache and audio references are shared through SQLite (see
+shared_state.py), so any worker can serve any request. Each worker calls
+app.start_worker() after loading the app, and the first one to take the
+leader lock also runs cache refills and cleanup.
+"""
+
+import multiprocessing
+import os
+import secrets
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", str(multiprocessing.cpu_count())))
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "6"))
+# Cache misses wait on the providers for up to TTS_GENERATION_TIMEOUT
+timeout = int(os.getenv("TTS_GENERATION_TIMEOUT", "120")) + 30
+
+# Login cookies must verify on every worker, so they can't each pick a random key
+os.environ.setdefault("SECRET_KEY", secrets.token_hex(24))
+
+
+def on_starting(server):
+    if workers > 1 and os.getenv("STATE_BACKEND", "memory").lower() != "sqlite":
+        server.log.warning(
+            "Running %d workers without STATE_BACKEND=sqlite: sessions and the "
+            "TTS cache won't be shared between them", workers
+        )
+
+
+def post_worker_init(worker):
+    from app import start_worker
+
+    start_worker()
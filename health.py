@@ -0,0 +1,175 @@
+"""
+Provider health tracking for TTS Arena.
+
+Every predict_tts call reports its outcome here. Each model gets a circuit
+breaker that opens after repeated failures or a high error rate, so model
+selection can skip a degraded provider instead of queueing requests behind
+it. After a cooldown the breaker lets a single probe request through
+(half-open) and closes again if it succeeds.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+
+# Consecutive failures that open a breaker
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "3"))
+# Error rate over the recent window that opens a breaker
+CIRCUIT_ERROR_RATE = float(os.getenv("CIRCUIT_ERROR_RATE", "0.5"))
+# Number of recent calls considered for the error rate
+CIRCUIT_WINDOW = int(os.getenv("CIRCUIT_WINDOW", "20"))
+# Calls needed in the window before the error rate is trusted
+CIRCUIT_MIN_CALLS = int(os.getenv("CIRCUIT_MIN_CALLS", "6"))
+# Seconds an open breaker waits before allowing a probe
+CIRCUIT_COOLDOWN = float(os.getenv("CIRCUIT_COOLDOWN", "60"))
+# Successful calls slower than this count against the error rate
+CIRCUIT_SLOW_CALL_SECONDS = float(os.getenv("CIRCUIT_SLOW_CALL_SECONDS", "60"))
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=CIRCUIT_FAILURE_THRESHOLD,
+                 error_rate=CIRCUIT_ERROR_RATE, window=CIRCUIT_WINDOW,
+                 min_calls=CIRCUIT_MIN_CALLS, cooldown=CIRCUIT_COOLDOWN,
+                 slow_call_seconds=CIRCUIT_SLOW_CALL_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.error_rate_threshold = error_rate
+        self.min_calls = min_calls
+        self.cooldown = cooldown
+        self.slow_call_seconds = slow_call_seconds
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.probe_started_at = None
+        self.latencies = deque(maxlen=window)  # Seconds, successful calls only
+        self._outcomes = deque(maxlen=window)  # True for a healthy call
+        self._lock = threading.Lock()
+
+    @property
+    def error_rate(self):
+        if not self._outcomes:
+            return 0.0
+        return 1 - sum(self._outcomes) / len(self._outcomes)
+
+    def is_available(self):
+        """Whether a call may be sent now. Only reads the state; start_call() claims the probe."""
+        with self._lock:
+            now = time.monotonic()
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN:
+                return now - self.opened_at >= self.cooldown
+            # Half-open: one probe at a time, re-issued if the last one never reported
+            return now - self.probe_started_at >= self.cooldown
+
+    def start_call(self):
+        """
+        Note a call being sent. Past the cooldown, an open breaker turns
+        half-open with this call as its probe.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self.state == self.OPEN and now - self.opened_at >= self.cooldown:
+                self.state = self.HALF_OPEN
+                self.probe_started_at = now
+            elif self.state == self.HALF_OPEN and now - self.probe_started_at >= self.cooldown:
+                self.probe_started_at = now
+
+    def record_success(self, latency):
+        with self._lock:
+            self.latencies.append(latency)
+            self._outcomes.append(latency <= self.slow_call_seconds)
+            self.consecutive_failures = 0
+            if self.state == self.HALF_OPEN:
+                self._close()
+            elif self._error_rate_exceeded():
+                self._open()
+
+    def record_failure(self):
+        with self._lock:
+            self._outcomes.append(False)
+            self.consecutive_failures += 1
+            if (
+                self.state == self.HALF_OPEN
+                or self.consecutive_failures >= self.failure_threshold
+                or self._error_rate_exceeded()
+            ):
+                self._open()
+
+    def _error_rate_exceeded(self):
+        return (
+            len(self._outcomes) >= self.min_calls
+            and self.error_rate >= self.error_rate_threshold
+        )
+
+    def _open(self):
+        self.state = self.OPEN
+        self.opened_at = time.monotonic()
+        self.probe_started_at = None
+
+    def _close(self):
+        self.state = self.CLOSED
+        self.opened_at = None
+        self.probe_started_at = None
+        self._outcomes.clear()
+
+    def latency_quantile(self, quantile, min_samples=1):
+        """Recent successful-call latency at `quantile`, or None without enough samples."""
+        with self._lock:
+            latencies = sorted(self.latencies)
+        if len(latencies) < min_samples:
+            return None
+        index = min(len(latencies) - 1, int(quantile * len(latencies)))
+        return latencies[index]
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "state": self.state,
+                "error_rate": round(self.error_rate, 3),
+                "consecutive_failures": self.consecutive_failures,
+                "recent_calls": len(self._outcomes),
+            }
+
+
+class ProviderHealth:
+    """Circuit breakers keyed by model id."""
+
+    def __init__(self):
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def breaker(self, model_id):
+        with self._lock:
+            breaker = self._breakers.get(model_id)
+            if breaker is None:
+                breaker = CircuitBreaker()
+                self._breakers[model_id] = breaker
+            return breaker
+
+    def record_success(self, model_id, latency):
+        self.breaker(model_id).record_success(latency)
+
+    def record_failure(self, model_id):
+        self.breaker(model_id).record_failure()
+
+    def is_available(self, model_id):
+        return self.breaker(model_id).is_available()
+
+    def start_call(self, model_id):
+        self.breaker(model_id).start_call()
+
+    def latency_quantile(self, model_id, quantile, min_samples=1):
+        return self.breaker(model_id).latency_quantile(quantile, min_samples)
+
+    def snapshot(self):
+        with self._lock:
+            breakers = dict(self._breakers)
+        return {model_id: breaker.snapshot() for model_id, breaker in breakers.items()}
+
+
+provider_health = ProviderHealth()
@@ -0,0 +1,185 @@
+"""
+In-process metrics registry for TTS Arena.
+
+Counters, gauges and fixed-bucket histograms keyed by name and labels. Updates
+are a dict lookup and a few integer operations under a lock, cheap enough to
+record on every provider call. The admin panel reads snapshots from here.
+"""
+
+import bisect
+import threading
+
+# Upper bounds in seconds for generation latency histograms
+LATENCY_BUCKETS = (0.25, 0.5, 1, 2, 3, 5, 8, 13, 20, 30, 45, 60, 90, 120, float("inf"))
+# Upper bounds in bytes for audio payload size histograms
+SIZE_BUCKETS = (
+    16_000, 64_000, 128_000, 256_000, 512_000, 1_000_000, 2_000_000,
+    5_000_000, 10_000_000, float("inf"),
+)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.total = 0.0
+        self.max = None
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = value if self.max is None else max(self.max, value)
+
+    def quantile(self, q):
+        """Estimate a quantile as the upper bound of the bucket containing it."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, bucket_count in zip(self.buckets, self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                # The overflow bucket has no upper bound, so report the largest value seen
+                return self.max if bound == float("inf") else bound
+        return self.max
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else None,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "buckets": [
+                {"le": "inf" if bound == float("inf") else bound, "count": bucket_count}
+                for bound, bucket_count in zip(self.buckets, self.counts)
+            ],
+        }
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def increment(self, name, amount=1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def set_gauge(self, name, value, **labels):
+        with self._lock:
+            self._gauges[self._key(name, labels)] = value
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = Histogram(buckets)
+                self._histograms[key] = histogram
+            histogram.observe(value)
+
+    def counter_value(self, name, **labels):
+        with self._lock:
+            return self._counters.get(self._key(name, labels), 0)
+
+    def cache_summary(self):
+        """TTS cache hit rate, recommendations, evictions and refill queue, for the admin panel."""
+        with self._lock:
+            lookups = {"hit": 0, "miss": 0}
+            recommendations = {}
+            evictions = {}
+            for (name, labels), value in self._counters.items():
+                labels = dict(labels)
+                if name == "tts_cache_lookup_total":
+                    lookups[labels["outcome"]] = lookups.get(labels["outcome"], 0) + value
+                elif name == "tts_sentence_recommendation_total":
+                    recommendations[labels["tier"]] = recommendations.get(labels["tier"], 0) + value
+                elif name == "tts_cache_evictions_total":
+                    evictions[labels["reason"]] = evictions.get(labels["reason"], 0) + value
+            refill_queue_depth = self._gauges.get(self._key("tts_cache_refill_queue_depth", {}))
+            refill_in_flight = self._gauges.get(self._key("tts_cache_refill_in_flight", {}))
+            target_size = self._gauges.get(self._key("tts_cache_target_size", {}))
+
+        total = lookups["hit"] + lookups["miss"]
+        return {
+            "hits": lookups["hit"],
+            "misses": lookups["miss"],
+            "hit_rate": lookups["hit"] / total if total else None,
+            "recommendations": recommendations,
+            "evictions": evictions,
+            "refill_queue_depth": refill_queue_depth,
+            "refill_in_flight": refill_in_flight,
+            "target_size": target_size,
+        }
+
+    def snapshot(self):
+        """All metrics as JSON-serializable lists of {name, labels, value}."""
+        with self._lock:
+            return {
+                "counters": [
+                    {"name": name, "labels": dict(labels), "value": value}
+                    for (name, labels), value in sorted(self._counters.items())
+                ],
+                "gauges": [
+                    {"name": name, "labels": dict(labels), "value": value}
+                    for (name, labels), value in sorted(self._gauges.items())
+                ],
+                "histograms": [
+                    {"name": name, "labels": dict(labels), "value": histogram.snapshot()}
+                    for (name, labels), histogram in sorted(self._histograms.items())
+                ],
+            }
+
+    def generation_summary(self):
+        """Per-model generation stats, slowest p95 first, for the admin panel."""
+        with self._lock:
+            models = {}
+            for (name, labels), value in self._counters.items():
+                if name != "tts_generation_total":
+                    continue
+                labels = dict(labels)
+                entry = models.setdefault(
+                    (labels["model"], labels["provider"]), {"success": 0, "error": 0}
+                )
+                entry[labels["outcome"]] = entry.get(labels["outcome"], 0) + value
+            latency = {}
+            size = {}
+            for (name, labels), histogram in self._histograms.items():
+                labels = dict(labels)
+                key = (labels.get("model"), labels.get("provider"))
+                if name == "tts_generation_seconds":
+                    latency[key] = histogram.snapshot()
+                elif name == "tts_generation_bytes":
+                    size[key] = histogram.snapshot()
+
+        summary = []
+        for (model_id, provider), counts in models.items():
+            total = counts["success"] + counts["error"]
+            model_latency = latency.get((model_id, provider), {})
+            summary.append({
+                "model": model_id,
+                "provider": provider,
+                "success": counts["success"],
+                "error": counts["error"],
+                "error_rate": counts["error"] / total if total else 0,
+                "latency_p50": model_latency.get("p50"),
+                "latency_p95": model_latency.get("p95"),
+                "latency_p99": model_latency.get("p99"),
+                "latency_mean": model_latency.get("mean"),
+                "bytes_mean": size.get((model_id, provider), {}).get("mean"),
+            })
+        summary.sort(key=lambda row: row["latency_p95"] or 0, reverse=True)
+        return summary
+
+
+metrics = MetricsRegistry()
@@ -244,8 +244,10 @@ def record_vote(user_id, text, chosen_model_id, rejected_model_id, model_type,
     if all_dataset_sentences and text in all_dataset_sentences:
         sentence_origin = 'dataset'
         # For dataset sentences, check if already consumed to prevent fraud
-        # But now we'll mark as consumed AFTER successful vote recording
-        counts_for_public = not is_sentence_consumed(text)
+        # But now we'll mark as consumed AFTER successful vote recording.
+        # Filling the TTS cache reserves its sentences, and each cached pair is served once,
+        # so that reservation doesn't disqualify the vote on it
+        counts_for_public = not is_sentence_used(text)
     else:
         sentence_origin = 'custom'
         counts_for_public = False  # Custom sentences never count for public leaderboard
@@ -994,10 +996,23 @@ def hash_sentence(sentence_text):
     return hashlib.sha256(sentence_text.strip().encode('utf-8')).hexdigest()
 
 
-def is_sentence_consumed(sentence_text):
-    """Check if a sentence has already been consumed"""
+def is_sentence_consumed(sentence_text, ignore_usage_types=()):
+    """Check if a sentence has already been consumed, other than as one of `ignore_usage_types`"""
     sentence_hash = hash_sentence(sentence_text)
-    return ConsumedSentence.query.filter_by(sentence_hash=sentence_hash).first() is not None
+    query = ConsumedSentence.query.filter_by(sentence_hash=sentence_hash)
+    if ignore_usage_types:
+        query = query.filter(ConsumedSentence.usage_type.notin_(ignore_usage_types))
+    return query.first() is not None
+
+
+def is_sentence_used(sentence_text):
+    """
+    Check if a sentence was already used by a generation or a vote. Filling the TTS
+    cache reserves a sentence without using it: the cache recommends its sentences to
+    everyone, and only the first submitter gets the cached pair, so the others
+    generate it live
+    """
+    return is_sentence_consumed(sentence_text, ignore_usage_types=('cache',))
 
 
 def mark_sentence_consumed(sentence_text, session_id=None, usage_type='direct'):
@@ -1007,6 +1022,10 @@ def mark_sentence_consumed(sentence_text, session_id=None, usage_type='direct'):
     # Check if already consumed
     existing = ConsumedSentence.query.filter_by(sentence_hash=sentence_hash).first()
     if existing:
+        if existing.usage_type == 'cache' and usage_type != 'cache':
+            # A cached sentence now used for real, so evicting its cache entry must not release it
+            existing.usage_type = usage_type
+            db.session.commit()
         return existing  # Already consumed
     
     consumed_sentence = ConsumedSentence(
@@ -1021,6 +1040,16 @@ def mark_sentence_consumed(sentence_text, session_id=None, usage_type='direct'):
     return consumed_sentence
 
 
+def release_consumed_sentence(sentence_text, usage_type='cache'):
+    """Return a sentence to the pool if it was only consumed as `usage_type`, e.g. an evicted cache entry nobody heard"""
+    sentence_hash = hash_sentence(sentence_text)
+    deleted = ConsumedSentence.query.filter_by(
+        sentence_hash=sentence_hash, usage_type=usage_type
+    ).delete()
+    db.session.commit()
+    return deleted > 0
+
+
 def get_unconsumed_sentences(sentence_pool):
     """Filter a list of sentences to only include unconsumed ones"""
     if not sentence_pool:
@@ -0,0 +1,388 @@
+"""
+Arena session stores for TTS Arena.
+
+A session pairs two generated clips for one vote and expires SESSION_TTL
+after it was created. Sessions are TTSSession and ConversationalSession
+records: slotted dataclasses holding Unix timestamps, interned model ids
+and audio store ids instead of datetimes and absolute paths, so thousands of
+live sessions stay small and map directly onto a database row.
+
+MemorySessionStore keeps sessions for a single server process.
+SharedSessionStore keeps them in the shared state database, so every worker
+process sees them. Both index sessions by expiry, a min-heap in memory and
+an SQLite index when shared, so expired sessions can be found without
+scanning the live ones.
+
+SessionReaper sleeps until the earliest expiry among its stores and hands
+each expired session to a callback that releases its audio. Sessions are
+released within moments of their deadline instead of at the next periodic
+scan.
+"""
+
+import heapq
+import json
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from datetime import timedelta
+
+from audio_store import audio_store
+from metrics import metrics
+from shared_state import SHARED_STATE, SHARED_STATE_PATH, SharedDatabase
+
+SESSION_TTL = timedelta(minutes=30)
+# Longest the reaper sleeps; sessions other workers add to a shared store don't wake it
+SESSION_REAPER_MAX_WAIT = 60
+
+
+@dataclass(slots=True, kw_only=True)
+class ArenaSession:
+    model_a: str
+    model_b: str
+    audio_a_id: str  # audio_store.audio_id() of each clip
+    audio_b_id: str
+    created_at: float  # Unix time
+    expires_at: float
+    voted: bool = False
+    cache_hit: bool = False
+
+    def __post_init__(self):
+        # A handful of model ids are shared by every session
+        self.model_a = sys.intern(self.model_a)
+        self.model_b = sys.intern(self.model_b)
+
+    @classmethod
+    def create(cls, model_a, model_b, audio_a, audio_b, **fields):
+        """A new session for the clips at paths audio_a and audio_b, expiring SESSION_TTL from now."""
+        now = time.time()
+        return cls(
+            model_a=model_a,
+            model_b=model_b,
+            audio_a_id=audio_store.audio_id(audio_a),
+            audio_b_id=audio_store.audio_id(audio_b),
+            created_at=now,
+            expires_at=now + SESSION_TTL.total_seconds(),
+            **fields,
+        )
+
+    @property
+    def audio_a(self):
+        return audio_store.audio_path(self.audio_a_id)
+
+    @property
+    def audio_b(self):
+        return audio_store.audio_path(self.audio_b_id)
+
+    def to_row(self):
+        """Column values for SharedSessionStore, after kind and session_id."""
+        return (
+            self.model_a, self.model_b, self.audio_a_id, self.audio_b_id,
+            self.created_at, self.expires_at, int(self.voted), int(self.cache_hit),
+            self.payload(),
+        )
+
+    @classmethod
+    def from_row(cls, row):
+        model_a, model_b, audio_a_id, audio_b_id, created_at, expires_at, voted, cache_hit, payload = row
+        return cls(
+            model_a=model_a,
+            model_b=model_b,
+            audio_a_id=audio_a_id,
+            audio_b_id=audio_b_id,
+            created_at=created_at,
+            expires_at=expires_at,
+            voted=bool(voted),
+            cache_hit=bool(cache_hit),
+            **cls.parse_payload(payload),
+        )
+
+
+@dataclass(slots=True, kw_only=True)
+class TTSSession(ArenaSession):
+    text: str
+
+    def payload(self):
+        return self.text
+
+    @staticmethod
+    def parse_payload(payload):
+        return {"text": payload}
+
+
+@dataclass(slots=True, kw_only=True)
+class ConversationalSession(ArenaSession):
+    script: list  # [{"text", "speaker_id"}, ...], saved with preference data
+
+    @property
+    def text(self):
+        """The script's lines joined, as recorded with the vote."""
+        return " ".join(line["text"] for line in self.script)[:1000]  # Limit text length
+
+    def payload(self):
+        return json.dumps(self.script, separators=(",", ":"))
+
+    @staticmethod
+    def parse_payload(payload):
+        return {"script": json.loads(payload)}
+
+
+SESSION_CLASSES = {"tts": TTSSession, "conversational": ConversationalSession}
+
+
+class MemorySessionStore:
+    """Sessions of one kind ("tts" or "conversational") for a single process."""
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.on_add = None  # Called with the expiry of each new session
+        self._sessions = {}
+        # (expires_at, session_id); entries of sessions already removed are skipped when popped
+        self._expiry = []
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def __contains__(self, session_id):
+        return session_id in self._sessions
+
+    def add(self, session_id, session):
+        with self._lock:
+            self._sessions[session_id] = session
+            heapq.heappush(self._expiry, (session.expires_at, session_id))
+        if self.on_add:
+            self.on_add(session.expires_at)
+
+    def get(self, session_id):
+        """The session, or None if it doesn't exist. Expired sessions are returned until reaped."""
+        return self._sessions.get(session_id)
+
+    def claim_vote(self, session_id):
+        """Mark the session voted; False if it was voted already or is gone."""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None or session.voted:
+                return False
+            session.voted = True
+            return True
+
+    def release_vote(self, session_id):
+        """Undo claim_vote() when the vote couldn't be recorded."""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                session.voted = False
+
+    def pop(self, session_id):
+        with self._lock:
+            return self._sessions.pop(session_id, None)
+
+    def next_expiry(self):
+        with self._lock:
+            self._drop_stale_expiries()
+            return self._expiry[0][0] if self._expiry else None
+
+    def pop_expired(self, now):
+        """Remove and return the (session_id, session) pairs expired by Unix time `now`."""
+        expired = []
+        with self._lock:
+            self._drop_stale_expiries()
+            while self._expiry and self._expiry[0][0] <= now:
+                _, session_id = heapq.heappop(self._expiry)
+                expired.append((session_id, self._sessions.pop(session_id)))
+                self._drop_stale_expiries()
+        return expired
+
+    def _drop_stale_expiries(self):
+        while self._expiry and self._expiry[0][1] not in self._sessions:
+            heapq.heappop(self._expiry)
+
+
+class SharedSessionStore(SharedDatabase):
+    """
+    Sessions of one kind in the shared state database, one column per
+    record field; same interface as MemorySessionStore. get() returns a
+    copy, so changes go through the store's methods.
+    """
+
+    _COLUMNS = (
+        "model_a, model_b, audio_a_id, audio_b_id, created_at, expires_at, voted, cache_hit, payload"
+    )
+
+    def __init__(self, kind, path=SHARED_STATE_PATH):
+        super().__init__(path)
+        self.kind = kind
+        self.session_class = SESSION_CLASSES[kind]
+        self.on_add = None
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS arena_sessions (
+                kind TEXT NOT NULL,
+                session_id TEXT NOT NULL,
+                model_a TEXT NOT NULL,
+                model_b TEXT NOT NULL,
+                audio_a_id TEXT NOT NULL,
+                audio_b_id TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                expires_at REAL NOT NULL,
+                voted INTEGER NOT NULL,
+                cache_hit INTEGER NOT NULL,
+                payload TEXT NOT NULL,
+                PRIMARY KEY (kind, session_id)
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS arena_sessions_expiry ON arena_sessions (kind, expires_at)"
+        )
+
+    def __len__(self):
+        return self.query("SELECT COUNT(*) FROM arena_sessions WHERE kind = ?", (self.kind,))[0][0]
+
+    def __contains__(self, session_id):
+        return bool(self.query(
+            "SELECT 1 FROM arena_sessions WHERE kind = ? AND session_id = ?", (self.kind, session_id)
+        ))
+
+    def add(self, session_id, session):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO arena_sessions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (self.kind, session_id) + session.to_row(),
+            )
+        if self.on_add:
+            self.on_add(session.expires_at)
+
+    def get(self, session_id):
+        rows = self.query(
+            f"SELECT {self._COLUMNS} FROM arena_sessions WHERE kind = ? AND session_id = ?",
+            (self.kind, session_id),
+        )
+        return self.session_class.from_row(rows[0]) if rows else None
+
+    def claim_vote(self, session_id):
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE arena_sessions SET voted = 1 WHERE kind = ? AND session_id = ? AND voted = 0",
+                (self.kind, session_id),
+            )
+            return cursor.rowcount == 1
+
+    def release_vote(self, session_id):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE arena_sessions SET voted = 0 WHERE kind = ? AND session_id = ?",
+                (self.kind, session_id),
+            )
+
+    def pop(self, session_id):
+        """Remove and return a session; of several workers popping it, only one gets it."""
+        with self.transaction() as conn:
+            row = conn.execute(
+                f"SELECT {self._COLUMNS} FROM arena_sessions WHERE kind = ? AND session_id = ?",
+                (self.kind, session_id),
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "DELETE FROM arena_sessions WHERE kind = ? AND session_id = ?",
+                (self.kind, session_id),
+            )
+        return self.session_class.from_row(row)
+
+    def next_expiry(self):
+        rows = self.query("SELECT MIN(expires_at) FROM arena_sessions WHERE kind = ?", (self.kind,))
+        return rows[0][0]
+
+    def pop_expired(self, now):
+        with self.transaction() as conn:
+            rows = conn.execute(
+                f"SELECT session_id, {self._COLUMNS} FROM arena_sessions "
+                "WHERE kind = ? AND expires_at <= ?",
+                (self.kind, now),
+            ).fetchall()
+            conn.execute(
+                "DELETE FROM arena_sessions WHERE kind = ? AND expires_at <= ?", (self.kind, now)
+            )
+        return [(row[0], self.session_class.from_row(row[1:])) for row in rows]
+
+
+class SessionReaper:
+    """
+    Expires sessions in a background thread, calling on_expire(session_id,
+    session) for each one after it has been removed from its store.
+    """
+
+    def __init__(self, max_wait=SESSION_REAPER_MAX_WAIT):
+        self.max_wait = max_wait
+        self._stores = []  # (store, on_expire)
+        self._cond = threading.Condition()
+        self._deadline = None  # Unix time the reaper next wakes; None while it is reaping
+        self._woken = False
+        self._stopped = False
+        self._thread = None
+
+    def watch(self, store, on_expire):
+        self._stores.append((store, on_expire))
+        store.on_add = self.wake
+
+    def wake(self, expires_at):
+        """Wake the reaper if a new session expires before it would next wake."""
+        with self._cond:
+            if self._deadline is None or expires_at < self._deadline:
+                self._woken = True
+                self._cond.notify()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="SessionReaper", daemon=True)
+            self._thread.start()
+
+    def reap(self, now=None):
+        """Expire every session past its deadline; returns how many were expired."""
+        now = now or time.time()
+        expired = 0
+        for store, on_expire in self._stores:
+            for session_id, session in store.pop_expired(now):
+                expired += 1
+                metrics.increment("sessions_expired_total", kind=store.kind)
+                try:
+                    on_expire(session_id, session)
+                except Exception as e:
+                    print(f"Error expiring {store.kind} session {session_id}: {str(e)}")
+        return expired
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if self._stopped:
+                    return
+                self._deadline = None
+                self._woken = False
+            try:
+                self.reap()
+                expiries = [store.next_expiry() for store, _ in self._stores]
+            except Exception as e:
+                print(f"Error in session reaper: {str(e)}")
+                expiries = []
+            now = time.time()
+            deadline = min([expiry for expiry in expiries if expiry] + [now + self.max_wait])
+            with self._cond:
+                self._deadline = deadline
+                if not self._woken and not self._stopped and deadline > now:
+                    self._cond.wait(deadline - now)
+
+    def shutdown(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+
+
+if SHARED_STATE:
+    tts_sessions = SharedSessionStore("tts")
+    conversational_sessions = SharedSessionStore("conversational")
+else:
+    tts_sessions = MemorySessionStore("tts")
+    conversational_sessions = MemorySessionStore("conversational")
+session_reaper = SessionReaper()
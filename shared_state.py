@@ -0,0 +1,178 @@
+"""
+State shared between TTS Arena worker processes on one host.
+
+By default (STATE_BACKEND=memory) sessions, the TTS cache and audio
+references live in the memory of the single server process. With
+STATE_BACKEND=sqlite they live in SQLite databases in WAL mode, so several
+worker processes (for example gunicorn workers) see the same sessions and
+cache. Operations that must not interleave between workers, such as popping
+a cache entry or dropping the last reference to a clip, each run in one
+write transaction.
+
+Background jobs such as cache refills, cleanup and autoscaling must run in
+exactly one process. That process is the one holding the leader lock.
+"""
+
+import fcntl
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+STATE_BACKEND = os.getenv("STATE_BACKEND", "memory").lower()
+SHARED_STATE = STATE_BACKEND == "sqlite"
+SHARED_STATE_PATH = os.getenv("SHARED_STATE_PATH", "./instance/shared_state.db")
+
+# Seconds a worker waits for another worker's write transaction
+SQLITE_BUSY_TIMEOUT = 30
+
+_leader_lock_file = None
+
+
+def connect(path):
+    """A WAL-mode connection in autocommit mode, shared by this process's threads."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    conn = sqlite3.connect(
+        path, check_same_thread=False, isolation_level=None, timeout=SQLITE_BUSY_TIMEOUT
+    )
+    conn.execute("PRAGMA journal_mode=WAL")
+    # WAL stays consistent without an fsync per commit; a power cut may lose the last ones
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def acquire_leader_lock(path=None):
+    """
+    Try to become the process that runs background jobs. The lock is held
+    until the process exits. When the leader dies, the next process to ask
+    gets it, such as the worker gunicorn starts to replace it.
+    """
+    global _leader_lock_file
+    if _leader_lock_file is not None:
+        return True
+    path = path or f"{SHARED_STATE_PATH}.leader"
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    lock_file = open(path, "a")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock_file.close()
+        return False
+    _leader_lock_file = lock_file
+    return True
+
+
+class SharedDatabase:
+    """One connection per process, used by all its threads through a lock."""
+
+    def __init__(self, path=SHARED_STATE_PATH):
+        self.path = path
+        self._conn = connect(path)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def transaction(self):
+        """
+        A write transaction. It takes the database write lock up front, so
+        reads made inside it can't go stale before the writes commit, even
+        when the other writers are separate processes.
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def query(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class SharedRefCounts(SharedDatabase):
+    """Audio store reference counts, for BlobStore. get() and set() are only valid inside locked()."""
+
+    def __init__(self, path=SHARED_STATE_PATH):
+        super().__init__(path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS blob_refs (blob_id TEXT PRIMARY KEY, refs INTEGER NOT NULL)"
+        )
+        self._txn = None
+
+    @contextmanager
+    def locked(self):
+        with self.transaction() as conn:
+            self._txn = conn
+            try:
+                yield self
+            finally:
+                self._txn = None
+
+    def get(self, blob_id):
+        row = self._txn.execute("SELECT refs FROM blob_refs WHERE blob_id = ?", (blob_id,)).fetchone()
+        return row[0] if row else 0
+
+    def set(self, blob_id, count):
+        if count > 0:
+            self._txn.execute("INSERT OR REPLACE INTO blob_refs VALUES (?, ?)", (blob_id, count))
+        else:
+            self._txn.execute("DELETE FROM blob_refs WHERE blob_id = ?", (blob_id,))
+
+    def referenced(self):
+        return {row[0] for row in self._txn.execute("SELECT blob_id FROM blob_refs")}
+
+    def totals(self):
+        """(blobs, references) across every process."""
+        blobs, references = self.query("SELECT COUNT(*), COALESCE(SUM(refs), 0) FROM blob_refs")[0]
+        return blobs, references
+
+
+class SharedArrivals(SharedDatabase):
+    """Generate request times from every worker, for CacheAutoscaler."""
+
+    def __init__(self, path=SHARED_STATE_PATH):
+        super().__init__(path)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS cache_arrivals (at REAL NOT NULL)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS cache_arrivals_at ON cache_arrivals (at)")
+
+    def record(self, at):
+        with self._lock:
+            self._conn.execute("INSERT INTO cache_arrivals VALUES (?)", (at,))
+
+    def count_since(self, since):
+        """Arrivals at or after `since`; older ones are deleted."""
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM cache_arrivals WHERE at < ?", (since,))
+            return conn.execute("SELECT COUNT(*) FROM cache_arrivals").fetchone()[0]
+
+
+class SharedRefillState(SharedDatabase):
+    """The leader's cache refill target and queued sentences, for RefillScheduler in the other workers."""
+
+    def __init__(self, path=SHARED_STATE_PATH):
+        super().__init__(path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS refill_target (id INTEGER PRIMARY KEY CHECK (id = 0), target INTEGER NOT NULL)"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS refill_queue (sentence TEXT PRIMARY KEY)")
+
+    def publish(self, target, queued):
+        """Replace the published state with the leader's current one."""
+        with self.transaction() as conn:
+            conn.execute("INSERT OR REPLACE INTO refill_target VALUES (0, ?)", (target,))
+            conn.execute("DELETE FROM refill_queue")
+            conn.executemany("INSERT OR IGNORE INTO refill_queue VALUES (?)", ((s,) for s in queued))
+
+    def target(self):
+        """The leader's target, or None before a leader has published one."""
+        rows = self.query("SELECT target FROM refill_target")
+        return rows[0][0] if rows else None
+
+    def queued_sentences(self):
+        return {row[0] for row in self.query("SELECT sentence FROM refill_queue")}
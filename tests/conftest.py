@@ -0,0 +1,10 @@
+import os
+import sys
+import tempfile
+
+# The app's modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Keep the audio store and the cache manifest the modules open on import out of the checkout
+os.environ.setdefault("AUDIO_STORE_DIR", tempfile.mkdtemp(prefix="tts_arena_tests_"))
+os.environ.setdefault("STATE_BACKEND", "memory")
@@ -0,0 +1,38 @@
+import base64
+import os
+
+import audio
+from audio import AudioResult
+
+
+def wrapped_base64(data, width=76):
+    encoded = base64.b64encode(data).decode()
+    return "\n".join(encoded[i:i + width] for i in range(0, len(encoded), width)) + "\n"
+
+
+def test_line_wrapped_base64_decodes_across_slices(monkeypatch):
+    monkeypatch.setattr(audio, "B64_DECODE_CHUNK", 64)  # Many slices, each cut by line breaks
+    data = os.urandom(1000)
+
+    result = AudioResult.from_base64(wrapped_base64(data))
+
+    assert result.nbytes == len(data)
+    assert result.read() == data
+
+
+def test_base64_with_spaces_saves_intact(tmp_path, monkeypatch):
+    monkeypatch.setattr(audio, "B64_DECODE_CHUNK", 64)
+    data = os.urandom(500)
+    encoded = " ".join(base64.b64encode(data).decode()[i:i + 10] for i in range(0, 668, 10))
+
+    path = AudioResult.from_base64(encoded).save(str(tmp_path / "clip.wav"))
+
+    with open(path, "rb") as f:
+        assert f.read() == data
+
+
+def test_unwrapped_base64_decodes():
+    data = os.urandom(300)
+
+    assert AudioResult.from_base64(base64.b64encode(data).decode()).read() == data
+    assert AudioResult.from_base64(base64.b64encode(data)).read() == data
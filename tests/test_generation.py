@@ -0,0 +1,65 @@
+import threading
+import time
+
+import pytest
+
+import generation
+from audio import AudioResult
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    release = threading.Event()
+    calls = []
+
+    def fake_predict_tts(text, model_id, stream=False):
+        calls.append((text, model_id))
+        if text.startswith("slow"):
+            release.wait(5)
+        return AudioResult.from_bytes(text.encode())
+
+    monkeypatch.setattr(generation, "predict_tts", fake_predict_tts)
+    engine = generation.GenerationEngine(max_workers=8, provider_concurrency=1, background_concurrency=1)
+    yield engine, release, calls
+    release.set()
+    engine.shutdown()
+
+
+def test_live_calls_do_not_queue_behind_background_calls(engine):
+    engine, release, _ = engine
+    # Fill the background budget, then queue another background call behind it
+    running = engine.submit("slow fill", ["model-a"], background=True)
+    queued = engine.submit("fill", ["model-a"], background=True)
+
+    (audio,) = engine.generate("live", ["model-a"], timeout=2)
+
+    assert audio.read() == b"live"
+    assert not running.done() and not queued.done()
+    release.set()
+    assert queued.result(timeout=2)[0].read() == b"fill"
+
+
+def test_live_call_skips_a_queued_background_call_for_the_same_text(engine):
+    engine, release, calls = engine
+    engine.submit("slow fill", ["model-a"], background=True)
+    queued = engine.submit("shared", ["model-a"], background=True)
+
+    (audio,) = engine.generate("shared", ["model-a"], timeout=2)
+
+    assert audio.read() == b"shared"
+    release.set()
+    assert queued.result(timeout=2)[0].read() == b"shared"
+
+
+def test_live_call_joins_a_running_background_call(engine):
+    engine, release, calls = engine
+    running = engine.submit("slow shared", ["model-a"], background=True)
+    while not calls:
+        time.sleep(0.01)  # Until the background call holds its provider slot
+    live = engine.submit("slow shared", ["model-a"])
+
+    release.set()
+
+    assert live.result(timeout=2)[0].read() == b"slow shared"
+    assert running.result(timeout=2)[0].read() == b"slow shared"
+    assert calls.count(("slow shared", "model-a")) == 1
@@ -0,0 +1,48 @@
+import time
+
+from health import CircuitBreaker
+
+COOLDOWN = 0.05
+
+
+def open_breaker():
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=COOLDOWN)
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    return breaker
+
+
+def test_availability_checks_do_not_claim_the_probe():
+    breaker = open_breaker()
+    assert not breaker.is_available()
+
+    time.sleep(COOLDOWN)
+
+    # Checked for every candidate, including models that are never called
+    assert breaker.is_available()
+    assert breaker.is_available()
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_dispatched_call_claims_the_probe():
+    breaker = open_breaker()
+    time.sleep(COOLDOWN)
+
+    breaker.start_call()
+
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.is_available()
+    breaker.record_success(0.1)
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.is_available()
+
+
+def test_failed_probe_reopens_the_breaker():
+    breaker = open_breaker()
+    time.sleep(COOLDOWN)
+
+    breaker.start_call()
+    breaker.record_failure()
+
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.is_available()
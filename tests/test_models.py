@@ -0,0 +1,109 @@
+from datetime import datetime
+
+import pytest
+from flask import Flask
+
+from models import (
+    ConsumedSentence,
+    Model,
+    ModelType,
+    User,
+    db,
+    get_leaderboard_data,
+    is_sentence_consumed,
+    is_sentence_used,
+    mark_sentence_consumed,
+    record_vote,
+)
+from tts_cache import CacheManifest, MemoryTTSCache
+
+SENTENCE = "The birch canoe slid on the smooth planks."
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(id=1, username="voter", hf_id="voter"))
+        # Past the leaderboard's minimum vote count
+        for model_id in ("model-a", "model-b"):
+            db.session.add(Model(
+                id=model_id, name=model_id, model_type=ModelType.TTS,
+                current_elo=1500.0, win_count=150, match_count=300,
+            ))
+        db.session.commit()
+        yield app
+
+
+def leaderboard_elos():
+    return {row["id"]: (row["elo"], row["total_votes"]) for row in get_leaderboard_data(ModelType.TTS)}
+
+
+def test_vote_on_cache_hit_counts_for_public_leaderboard(app):
+    # Filling the cache consumed the sentence before it was served
+    mark_sentence_consumed(SENTENCE, usage_type="cache")
+    before = leaderboard_elos()
+
+    vote, error = record_vote(
+        1, SENTENCE, "model-a", "model-b", ModelType.TTS,
+        cache_hit=True, all_dataset_sentences=[SENTENCE],
+    )
+
+    assert error is None
+    assert vote.counts_for_public_leaderboard
+    after = leaderboard_elos()
+    assert after["model-a"][0] > before["model-a"][0]
+    assert after["model-b"][0] < before["model-b"][0]
+    assert after["model-a"][1] == before["model-a"][1] + 1
+
+
+def test_vote_marks_cached_sentence_voted(app):
+    mark_sentence_consumed(SENTENCE, usage_type="cache")
+
+    record_vote(1, SENTENCE, "model-a", "model-b", ModelType.TTS, all_dataset_sentences=[SENTENCE])
+
+    assert ConsumedSentence.query.one().usage_type == "voted"
+    assert is_sentence_consumed(SENTENCE, ignore_usage_types=("cache",))
+
+
+def test_second_vote_on_sentence_does_not_count(app):
+    record_vote(1, SENTENCE, "model-a", "model-b", ModelType.TTS, all_dataset_sentences=[SENTENCE])
+    before = leaderboard_elos()
+
+    vote, _ = record_vote(1, SENTENCE, "model-a", "model-b", ModelType.TTS, all_dataset_sentences=[SENTENCE])
+
+    assert not vote.counts_for_public_leaderboard
+    assert leaderboard_elos() == before
+
+
+def test_two_clients_submit_the_same_recommended_sentence(app, tmp_path):
+    cache = MemoryTTSCache(CacheManifest(str(tmp_path / "manifest.db")))
+    clips = {
+        model_id: {"audio": f"{model_id}.wav", "created_at": datetime.utcnow()}
+        for model_id in ("model-a", "model-b")
+    }
+    cache.add(SENTENCE, {"clips": clips, "created_at": datetime.utcnow()}, limit=10)
+    mark_sentence_consumed(SENTENCE, usage_type="cache")
+
+    # Both were recommended the sentence; only the first gets the cached pair
+    assert cache.pop(SENTENCE) is not None
+    assert cache.pop(SENTENCE) is None
+    # The second generates it live instead of being told it was already used
+    assert not is_sentence_used(SENTENCE)
+
+    first, _ = record_vote(
+        1, SENTENCE, "model-a", "model-b", ModelType.TTS,
+        cache_hit=True, all_dataset_sentences=[SENTENCE],
+    )
+    second, _ = record_vote(
+        1, SENTENCE, "model-b", "model-a", ModelType.TTS,
+        cache_hit=False, all_dataset_sentences=[SENTENCE],
+    )
+
+    assert first.counts_for_public_leaderboard
+    assert not second.counts_for_public_leaderboard
+    # Once voted on, the sentence is used up for later clients
+    assert is_sentence_used(SENTENCE)
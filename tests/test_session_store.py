@@ -0,0 +1,122 @@
+import threading
+import time
+
+import pytest
+
+from session_store import MemorySessionStore, SessionReaper, SharedSessionStore, TTSSession
+
+SENTENCE = "The birch canoe slid on the smooth planks."
+
+
+def tts_session(expires_in=60):
+    now = time.time()
+    return TTSSession(
+        model_a="model-a", model_b="model-b", audio_a_id="a.wav", audio_b_id="b.wav",
+        created_at=now, expires_at=now + expires_in, text=SENTENCE,
+    )
+
+
+@pytest.fixture
+def shared_stores(tmp_path):
+    """Two stores on one database, as two worker processes would open it."""
+    path = str(tmp_path / "shared_state.db")
+    stores = [SharedSessionStore("tts", path=path) for _ in range(2)]
+    yield stores
+    for store in stores:
+        store.close()
+
+
+def run_concurrently(calls, per_call=4):
+    """Run each call on several threads at once; returns their results."""
+    barrier = threading.Barrier(len(calls) * per_call)
+    results = []
+
+    def run(call):
+        barrier.wait()
+        results.append(call())
+
+    threads = [threading.Thread(target=run, args=(c,)) for c in calls for _ in range(per_call)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    return results
+
+
+def test_only_one_worker_pops_a_shared_session(shared_stores):
+    first, second = shared_stores
+    first.add("session", tts_session())
+    assert second.get("session").text == SENTENCE
+
+    results = run_concurrently([lambda: first.pop("session"), lambda: second.pop("session")])
+
+    assert len([session for session in results if session is not None]) == 1
+    assert "session" not in first and "session" not in second
+
+
+def test_only_one_worker_claims_a_shared_session_vote(shared_stores):
+    first, second = shared_stores
+    first.add("session", tts_session())
+
+    results = run_concurrently([lambda: first.claim_vote("session"), lambda: second.claim_vote("session")])
+
+    assert results.count(True) == 1
+    assert second.get("session").voted
+
+
+@pytest.fixture(params=["memory", "shared"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        yield MemorySessionStore("tts")
+    else:
+        store = SharedSessionStore("tts", path=str(tmp_path / "shared_state.db"))
+        yield store
+        store.close()
+
+
+def test_reap_expires_only_sessions_past_their_deadline(store):
+    expired = []
+    reaper = SessionReaper()
+    reaper.watch(store, lambda session_id, session: expired.append(session_id))
+    store.add("late", tts_session(expires_in=120))
+    store.add("due", tts_session(expires_in=60))
+    store.add("overdue", tts_session(expires_in=-1))
+
+    assert reaper.reap(now=time.time() + 90) == 2
+
+    assert sorted(expired) == ["due", "overdue"]
+    assert "late" in store and "due" not in store
+    assert store.next_expiry() == store.get("late").expires_at
+
+
+def test_reaper_wakes_for_a_session_expiring_before_its_next_deadline(store):
+    expired = threading.Event()
+    # Without the wake-up, the reaper would sleep for a minute before looking again
+    reaper = SessionReaper(max_wait=60)
+    reaper.watch(store, lambda session_id, session: expired.set())
+    reaper.start()
+    try:
+        time.sleep(0.1)  # Until the reaper is asleep with nothing to expire
+        store.add("session", tts_session(expires_in=0.2))
+
+        assert expired.wait(2)
+        assert "session" not in store
+    finally:
+        reaper.shutdown()
+
+
+def test_a_failing_expiry_callback_does_not_stop_the_others(store):
+    reaper = SessionReaper()
+    released = []
+
+    def on_expire(session_id, session):
+        if session_id == "broken":
+            raise OSError("audio already gone")
+        released.append(session_id)
+
+    reaper.watch(store, on_expire)
+    store.add("broken", tts_session(expires_in=-2))
+    store.add("fine", tts_session(expires_in=-1))
+
+    assert reaper.reap() == 2
+    assert released == ["fine"]
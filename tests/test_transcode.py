@@ -0,0 +1,44 @@
+import pytest
+from werkzeug.datastructures import MIMEAccept
+
+import transcode
+
+MP3_ACCEPT = MIMEAccept([("audio/mpeg", 1), ("*/*", 0.5)])
+
+
+@pytest.fixture
+def wav_path(tmp_path):
+    path = tmp_path / "clip.wav"
+    path.write_bytes(b"RIFF")
+    return str(path)
+
+
+def fake_transcode(calls):
+    def transcode_(wav_path, fmt):
+        calls.append(fmt)
+        dest_path = transcode.variant_path(wav_path, fmt)
+        with open(dest_path, "wb") as f:
+            f.write(fmt.encode())
+        return dest_path
+    return transcode_
+
+
+def test_first_request_gets_the_negotiated_variant(monkeypatch, wav_path):
+    calls = []
+    monkeypatch.setattr(transcode, "_ffmpeg_path", "ffmpeg")
+    monkeypatch.setattr(transcode, "TRANSCODE_ENABLED", True)
+    monkeypatch.setattr(transcode, "transcode", fake_transcode(calls))
+
+    # Before the worker pool has produced any variant
+    first = transcode.negotiate_variant(wav_path, MP3_ACCEPT)
+    second = transcode.negotiate_variant(wav_path, MP3_ACCEPT)
+
+    assert first == second == (transcode.variant_path(wav_path, "mp3"), "audio/mpeg")
+    assert calls == ["mp3"]
+
+
+def test_wav_when_transcoding_is_unavailable(monkeypatch, wav_path):
+    monkeypatch.setattr(transcode, "_ffmpeg_path", None)
+
+    assert transcode.negotiate_variant(wav_path, MP3_ACCEPT) == (wav_path, "audio/wav")
+    assert transcode.negotiate_variant(wav_path, MP3_ACCEPT, "opus") == (wav_path, "audio/wav")
@@ -0,0 +1,196 @@
+import queue
+import time
+
+import pytest
+
+import tts
+from audio import AudioResult
+
+
+class FakePyhtClient:
+    def __init__(self):
+        self.closed = False
+
+    def tts(self, text, options, voice_engine=None):
+        yield b"RIFF"
+        yield b"data"
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def pyht_pool(monkeypatch):
+    pool = tts.PyhtClientPool(size=2)
+    monkeypatch.setattr(pool, "_new_client", FakePyhtClient)
+    monkeypatch.setattr(tts, "pyht_clients", pool)
+    monkeypatch.setattr(tts, "TTS_FAKE_ROUTER_URL", None)
+    return pool
+
+
+def test_dropped_playdialog_streams_return_their_clients(pyht_pool):
+    for _ in range(pyht_pool.size * 2):
+        tts.predict_playdialog("Host 1: hello", stream=True)  # Dropped without being read
+
+    client, created_at = pyht_pool.acquire(timeout=0)
+    pyht_pool.release(client, created_at)
+
+
+def test_playdialog_stream_closed_early_returns_its_client(pyht_pool):
+    for _ in range(pyht_pool.size * 2):
+        chunks = tts.predict_playdialog("Host 1: hello", stream=True).stream_chunks()
+        assert next(chunks) == b"RIFF"
+        chunks.close()
+
+    client, created_at = pyht_pool.acquire(timeout=0)
+    assert not client.closed
+
+
+def test_playdialog_pool_is_bounded(pyht_pool):
+    leased = [pyht_pool.acquire(timeout=0) for _ in range(pyht_pool.size)]
+
+    with pytest.raises(queue.Empty):
+        pyht_pool.acquire(timeout=0)
+
+    for client, created_at in leased:
+        pyht_pool.release(client, created_at)
+
+
+@pytest.fixture
+def provider_server():
+    """Local HTTP server answering POSTs with the queued statuses, then 200."""
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    statuses = []
+    requests_seen = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            requests_seen.append(self.path)
+            status = statuses.pop(0) if statuses else 200
+            self.send_response(status)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}", statuses, requests_seen
+    server.shutdown()
+
+
+def test_gateway_timeout_is_not_retried(provider_server, monkeypatch):
+    url, statuses, requests_seen = provider_server
+    monkeypatch.setattr(tts, "HTTP_RETRY_BACKOFF", 0.01)
+    statuses.append(504)
+
+    response = tts.get_http_session(url).post(f"{url}/tts", json={"text": "hi"}, timeout=(1, 5))
+
+    assert response.status_code == 504
+    assert len(requests_seen) == 1
+
+
+def test_unavailable_is_retried_within_the_timeout(provider_server, monkeypatch):
+    url, statuses, requests_seen = provider_server
+    monkeypatch.setattr(tts, "HTTP_RETRY_BACKOFF", 0.01)
+    statuses.extend([503, 502])
+
+    response = tts.get_http_session(url).post(f"{url}/tts", json={"text": "hi"}, timeout=(1, 5))
+
+    assert response.status_code == 200
+    assert len(requests_seen) == 3
+
+
+def test_retries_stop_at_the_call_timeout(provider_server, monkeypatch):
+    url, statuses, requests_seen = provider_server
+    monkeypatch.setattr(tts, "HTTP_RETRY_BACKOFF", 1.0)
+    statuses.extend([503, 503, 503])
+
+    start = time.monotonic()
+    response = tts.get_http_session(url).post(f"{url}/tts", json={"text": "hi"}, timeout=(0.2, 0.5))
+
+    assert response.status_code == 503
+    assert len(requests_seen) == 1
+    assert time.monotonic() - start < 0.7
+
+
+@pytest.fixture
+def health(monkeypatch):
+    from health import ProviderHealth
+
+    provider_health = ProviderHealth()
+    monkeypatch.setattr(tts, "provider_health", provider_health)
+    return provider_health
+
+
+def stream_of(*chunks, error=None):
+    def chunks_():
+        yield from chunks
+        if error:
+            raise error
+    return AudioResult.from_chunks(chunks_())
+
+
+def test_stream_failing_partway_is_recorded_as_a_failure(monkeypatch, health):
+    monkeypatch.setattr(
+        tts, "_predict_tts", lambda *args: stream_of(b"RIFF", error=ConnectionError("reset"))
+    )
+    before = tts.metrics.counter_value(
+        "tts_generation_total", model="stream-model", provider="unknown", outcome="error"
+    )
+
+    audio = tts.predict_tts("hello", "stream-model", stream=True)
+    # Nothing is recorded at first byte
+    assert health.snapshot()["stream-model"]["recent_calls"] == 0
+    with pytest.raises(ConnectionError):
+        audio.read()
+
+    assert health.snapshot()["stream-model"]["consecutive_failures"] == 1
+    assert tts.metrics.counter_value(
+        "tts_generation_total", model="stream-model", provider="unknown", outcome="error"
+    ) == before + 1
+
+
+def test_stream_is_recorded_as_a_success_when_it_ends(monkeypatch, health):
+    monkeypatch.setattr(tts, "_predict_tts", lambda *args: stream_of(b"RIFF", b"data"))
+
+    audio = tts.predict_tts("hello", "stream-model", stream=True)
+
+    assert audio.read() == b"RIFFdata"
+    assert health.breaker("stream-model").latencies
+    assert health.snapshot()["stream-model"]["consecutive_failures"] == 0
+
+
+class FakeDiaSession:
+    """Records the headers of the first POST, then answers it with a quota error."""
+
+    def __init__(self):
+        self.headers = None
+
+    def post(self, url, headers=None, **kwargs):
+        self.headers = headers
+
+        class Response:
+            status_code = 429
+            text = "quota exceeded"
+
+        return Response()
+
+
+@pytest.mark.parametrize("tokens, authorization", [
+    ([""], None),
+    (["hf_token"], "Bearer hf_token"),
+])
+def test_dia_sends_a_token_only_when_the_pool_has_one(monkeypatch, tokens, authorization):
+    session = FakeDiaSession()
+    monkeypatch.setattr(tts, "zerogpu_tokens", tts.ZeroGPUTokenPool(tokens))
+    monkeypatch.setattr(tts, "get_http_session", lambda url: session)
+
+    with pytest.raises(tts.ZeroGPUQuotaError):
+        tts.predict_dia([{"text": "Hello.", "speaker_id": 0}, {"text": "Hi.", "speaker_id": 1}])
+
+    assert session.headers.get("Authorization") == authorization
@@ -0,0 +1,261 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+import tts_cache
+from shared_state import SharedRefillState
+from tts_cache import (
+    PRIORITY_BACKGROUND,
+    PRIORITY_HIT,
+    ArrivalWindow,
+    CacheAutoscaler,
+    CacheManifest,
+    MemoryTTSCache,
+    RefillScheduler,
+    SharedTTSCache,
+    select_evictions,
+)
+
+SENTENCES = [f"Sentence {i}." for i in range(10)]
+
+
+@pytest.fixture
+def blocked_fills():
+    """A fill function that holds every fill until released, recording the sentences filled."""
+    release = threading.Event()
+    started = threading.Semaphore(0)
+    filled = []
+
+    def fill(sentence):
+        filled.append(sentence)
+        started.release()
+        release.wait(5)
+        return False
+
+    yield fill, started, release, filled
+    release.set()
+
+
+def choose_from(sentences):
+    def choose(exclude):
+        return next((s for s in sentences if s not in exclude), None)
+    return choose
+
+
+def test_refills_replacing_cache_hits_run_before_background_fills(blocked_fills):
+    fill, started, release, filled = blocked_fills
+    scheduler = RefillScheduler(
+        choose_from(SENTENCES), fill, cache_size=lambda: 0, target=0, max_concurrency=1,
+    )
+    scheduler.start()
+    try:
+        scheduler.schedule("running")
+        assert started.acquire(timeout=2)  # The only worker is busy from here on
+        scheduler.schedule("background", priority=PRIORITY_BACKGROUND)
+        scheduler.schedule("hit", priority=PRIORITY_HIT)
+
+        release.set()
+        assert started.acquire(timeout=2) and started.acquire(timeout=2)
+
+        assert filled == ["running", "hit", "background"]
+    finally:
+        scheduler.shutdown()
+
+
+def test_top_up_counts_cached_queued_and_running_fills(blocked_fills):
+    fill, started, _, filled = blocked_fills
+    scheduler = RefillScheduler(
+        choose_from(SENTENCES), fill, cache_size=lambda: 2, target=5, max_concurrency=1,
+    )
+    assert scheduler.top_up() == 0  # Nothing is queued before start()
+    scheduler.start()
+    try:
+        assert scheduler.top_up() == 3
+        assert started.acquire(timeout=2)
+        assert scheduler.top_up() == 0
+        assert (scheduler.in_flight, scheduler.pending) == (1, 2)
+
+        scheduler.set_target(6)
+        assert scheduler.pending == 3
+    finally:
+        scheduler.shutdown()
+    assert filled == [SENTENCES[0]]
+
+
+def test_workers_other_than_the_leader_report_its_refills(tmp_path, blocked_fills):
+    fill, started, _, _ = blocked_fills
+    path = str(tmp_path / "shared_state.db")
+    leader = RefillScheduler(
+        choose_from(SENTENCES), fill, cache_size=lambda: 0, target=3,
+        max_concurrency=2, shared=SharedRefillState(path),
+    )
+    follower = RefillScheduler(
+        choose_from(SENTENCES), fill, cache_size=lambda: 0, target=5,
+        shared=SharedRefillState(path),
+    )
+    leader.start()
+    try:
+        leader.top_up()
+        assert started.acquire(timeout=2) and started.acquire(timeout=2)
+
+        assert follower.target == 3
+        assert follower.queued_sentences() == leader.queued_sentences() == set(SENTENCES[:2])
+    finally:
+        leader.shutdown()
+
+
+def cache_entry(created_at, *model_ids):
+    return {
+        "clips": {m: {"audio": f"/audio/{m}.wav", "created_at": created_at} for m in model_ids},
+        "created_at": created_at,
+    }
+
+
+def test_entries_past_their_ttl_are_evicted_first_then_the_oldest_over_budget():
+    now = datetime(2025, 1, 1, 12)
+    entries = [  # Oldest first, as the cache lists them
+        ("stale", cache_entry(now - timedelta(hours=30), "a", "b")),
+        ("old", cache_entry(now - timedelta(hours=3), "a", "b")),
+        ("older than new", cache_entry(now - timedelta(hours=2), "a", "b")),
+        ("new", cache_entry(now - timedelta(hours=1), "a", "b")),
+    ]
+
+    expired, over_budget, remaining = select_evictions(
+        entries, now, timedelta(hours=24), max_bytes=250, entry_bytes=lambda entry: 100,
+    )
+
+    assert expired == ["stale"]
+    assert over_budget == ["old"]
+    assert remaining == 200
+
+
+def test_no_disk_budget_evicts_only_expired_entries():
+    now = datetime(2025, 1, 1, 12)
+    entries = [(f"s{i}", cache_entry(now, "a", "b")) for i in range(3)]
+
+    assert select_evictions(entries, now, timedelta(hours=24), 0, lambda entry: 10**9) == ([], [], 3 * 10**9)
+
+
+@pytest.fixture(params=["memory", "shared"])
+def cache(request, tmp_path):
+    manifest = CacheManifest(str(tmp_path / "cache_manifest.db"))
+    cache = MemoryTTSCache(manifest) if request.param == "memory" else SharedTTSCache(manifest)
+    yield cache
+    manifest.close()
+
+
+def test_deactivated_model_clips_are_dropped_and_small_entries_reported(cache):
+    created_at = datetime(2025, 1, 1)
+    cache.add("three clips", cache_entry(created_at, "a", "b", "c"), limit=10)
+    cache.add("two clips", cache_entry(created_at, "a", "c"), limit=10)
+    cache.add("without it", cache_entry(created_at, "b", "c"), limit=10)
+
+    dropped_clips, too_small = cache.drop_model("a")
+
+    assert set(dropped_clips) == {"three clips", "two clips"}
+    assert dropped_clips["two clips"]["audio"] == "/audio/a.wav"
+    assert too_small == ["two clips"]
+    entries = dict(cache.items())
+    assert set(entries["three clips"]["clips"]) == {"b", "c"}
+    # Restarts reload what the manifest recorded, without the dropped clips
+    assert set(dict(cache.manifest.entries())["three clips"]["clips"]) == {"b", "c"}
+
+
+def test_model_deactivation_reaches_every_listener(monkeypatch):
+    monkeypatch.setattr(tts_cache, "_model_deactivation_listeners", [])
+    deactivated = []
+    tts_cache.on_model_deactivated(deactivated.append)
+    tts_cache.on_model_deactivated(lambda model_id: deactivated.append(model_id.upper()))
+
+    tts_cache.model_deactivated("model-a")
+
+    assert deactivated == ["model-a", "MODEL-A"]
+
+
+class FakeScheduler:
+    def __init__(self, target, fill_seconds):
+        self.target = target
+        self.fill_seconds = fill_seconds
+
+    def set_target(self, target):
+        self.target = target
+
+
+def autoscaler_with(arrivals, target, fill_seconds):
+    window = ArrivalWindow()
+    now = time.time()
+    for _ in range(arrivals):
+        window.record(now)
+    scheduler = FakeScheduler(target, fill_seconds)
+    # Fresh, so the rate is over one second rather than the whole window
+    return CacheAutoscaler(scheduler, min_size=4, max_size=40, headroom=2.0, arrivals=window), scheduler
+
+
+def test_autoscaler_grows_the_target_to_cover_arrivals_during_a_fill():
+    autoscaler, scheduler = autoscaler_with(arrivals=3, target=4, fill_seconds=2.0)
+
+    assert autoscaler.adjust() == 12  # 3/s x 2s x 2
+    assert scheduler.target == 12
+    assert autoscaler.decisions[-1]["from"] == 4
+
+
+def test_autoscaler_keeps_the_target_within_its_bounds():
+    autoscaler, _ = autoscaler_with(arrivals=100, target=4, fill_seconds=2.0)
+    assert autoscaler.adjust() == 40
+
+
+def test_autoscaler_shrinks_by_at_most_a_quarter_per_adjustment():
+    autoscaler, _ = autoscaler_with(arrivals=0, target=40, fill_seconds=2.0)
+
+    assert autoscaler.adjust() == 30
+    assert autoscaler.adjust() == 23
+
+
+def test_autoscaler_waits_for_a_measured_fill():
+    autoscaler, scheduler = autoscaler_with(arrivals=100, target=4, fill_seconds=None)
+
+    assert autoscaler.adjust() == 4
+    assert not autoscaler.decisions
+
+
+def pop_concurrently(caches, sentence, per_cache=4):
+    """Pop `sentence` from each cache on several threads at once; returns the entries popped."""
+    barrier = threading.Barrier(len(caches) * per_cache)
+    popped = []
+
+    def pop(cache):
+        barrier.wait()
+        popped.append(cache.pop(sentence))
+
+    threads = [threading.Thread(target=pop, args=(c,)) for c in caches for _ in range(per_cache)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    return [entry for entry in popped if entry is not None]
+
+
+def test_only_one_worker_pops_a_shared_cache_entry(tmp_path):
+    path = str(tmp_path / "cache_manifest.db")
+    # One manifest connection per simulated worker process
+    caches = [SharedTTSCache(CacheManifest(path)) for _ in range(2)]
+    caches[0].add(SENTENCES[0], cache_entry(datetime(2025, 1, 1), "a", "b"), limit=10)
+    assert SENTENCES[0] in caches[1]
+
+    popped = pop_concurrently(caches, SENTENCES[0])
+
+    assert len(popped) == 1
+    assert set(popped[0]["clips"]) == {"a", "b"}
+    assert len(caches[0]) == len(caches[1]) == 0
+
+
+def test_shared_cache_limit_holds_across_workers(tmp_path):
+    path = str(tmp_path / "cache_manifest.db")
+    caches = [SharedTTSCache(CacheManifest(path)) for _ in range(2)]
+    created_at = datetime(2025, 1, 1)
+
+    assert caches[0].add(SENTENCES[0], cache_entry(created_at, "a", "b"), limit=1)
+    assert not caches[1].add(SENTENCES[1], cache_entry(created_at, "a", "b"), limit=1)
+    assert not caches[1].add(SENTENCES[0], cache_entry(created_at, "a", "b"), limit=10)
@@ -0,0 +1,132 @@
+"""
+Compressed audio variants for TTS Arena.
+
+Generated WAV files are transcoded with ffmpeg into smaller Opus and MP3
+variants stored next to the WAV, on a small worker pool so generation isn't
+held up. Audio endpoints serve the variant the client accepts, transcoding it
+on the spot if the pool hasn't reached it yet, so a URL always returns the
+same encoding for the same Accept header; range requests can't mix bytes of
+two encodings. The WAV is served only when transcoding is unavailable, and
+stays the source of truth for preference exports.
+"""
+
+import os
+import shutil
+import subprocess
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+FFMPEG_BIN = os.getenv("FFMPEG_BIN", "ffmpeg")
+TRANSCODE_ENABLED = os.getenv("TRANSCODE_ENABLED", "True").lower() == "true"
+TRANSCODE_WORKERS = int(os.getenv("TRANSCODE_WORKERS", "2"))
+TRANSCODE_TIMEOUT = 60
+
+# format -> (mimetype, file extension, ffmpeg output arguments)
+AUDIO_VARIANTS = {
+    "mp3": ("audio/mpeg", ".mp3", ["-c:a", "libmp3lame", "-q:a", "5", "-f", "mp3"]),
+    "opus": ("audio/ogg", ".opus", ["-c:a", "libopus", "-b:a", "32k", "-f", "ogg"]),
+}
+# Offered to clients in this order; a bare */* gets MP3, which every browser plays
+NEGOTIABLE_MIMETYPES = ["audio/mpeg", "audio/ogg", "audio/wav"]
+MIMETYPE_FORMATS = {"audio/mpeg": "mp3", "audio/ogg": "opus", "audio/wav": "wav"}
+
+transcode_executor = ThreadPoolExecutor(
+    max_workers=TRANSCODE_WORKERS, thread_name_prefix="Transcode"
+)
+_ffmpeg_path = shutil.which(FFMPEG_BIN)
+if TRANSCODE_ENABLED and not _ffmpeg_path:
+    print(f"Warning: {FFMPEG_BIN} not found, compressed audio variants are disabled")
+
+# variant path -> lock held while it is transcoded, so concurrent requests wait for one ffmpeg run
+_variant_locks = {}
+_variant_locks_lock = threading.Lock()
+
+
+def variant_path(wav_path, fmt):
+    return os.path.splitext(wav_path)[0] + AUDIO_VARIANTS[fmt][1]
+
+
+def transcode(wav_path, fmt):
+    """Write the `fmt` variant of wav_path next to it, returning its path."""
+    dest_path = variant_path(wav_path, fmt)
+    # Unique, so a request transcoding on demand can't clash with the worker pool
+    partial_path = f"{dest_path}.{uuid.uuid4().hex}.part"
+    command = [
+        _ffmpeg_path, "-nostdin", "-loglevel", "error", "-y",
+        "-i", wav_path, *AUDIO_VARIANTS[fmt][2], partial_path,
+    ]
+    try:
+        subprocess.run(command, check=True, capture_output=True, timeout=TRANSCODE_TIMEOUT)
+        os.replace(partial_path, dest_path)
+    except Exception:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        raise
+    return dest_path
+
+
+def ensure_variant(wav_path, fmt):
+    """
+    Path of the `fmt` variant of wav_path, transcoding it now if it doesn't
+    exist yet. None when variants are disabled or transcoding fails.
+    """
+    path = variant_path(wav_path, fmt)
+    if os.path.exists(path):
+        return path
+    if not (TRANSCODE_ENABLED and _ffmpeg_path):
+        return None
+    with _variant_locks_lock:
+        lock = _variant_locks.setdefault(path, threading.Lock())
+    try:
+        with lock:
+            if not os.path.exists(path):
+                transcode(wav_path, fmt)
+        return path
+    except Exception as e:
+        print(f"Error transcoding {wav_path} to {fmt}: {str(e)}")
+        return None
+    finally:
+        with _variant_locks_lock:
+            _variant_locks.pop(path, None)
+
+
+def _transcode_all(wav_path):
+    for fmt in AUDIO_VARIANTS:
+        if not os.path.exists(wav_path):
+            return  # Session or cache entry was cleaned up in the meantime
+        ensure_variant(wav_path, fmt)
+
+
+def schedule_variants(wav_path):
+    """Queue compressed variants of wav_path on the transcode worker pool."""
+    if TRANSCODE_ENABLED and _ffmpeg_path:
+        transcode_executor.submit(_transcode_all, wav_path)
+
+
+def negotiate_variant(wav_path, accept_mimetypes, requested_format=None):
+    """
+    Pick the file and mimetype to serve for wav_path. requested_format
+    ("mp3", "opus" or "wav") overrides the Accept header. A variant that
+    isn't ready is transcoded before returning; the WAV is the fallback only
+    when variants are disabled or transcoding fails.
+    """
+    fmt = requested_format
+    if fmt not in MIMETYPE_FORMATS.values():
+        best = accept_mimetypes.best_match(NEGOTIABLE_MIMETYPES, default="audio/wav")
+        fmt = MIMETYPE_FORMATS[best]
+    if fmt != "wav":
+        path = ensure_variant(wav_path, fmt)
+        if path:
+            return path, AUDIO_VARIANTS[fmt][0]
+    return wav_path, "audio/wav"
+
+
+def remove_variants(wav_path):
+    for fmt in AUDIO_VARIANTS:
+        path = variant_path(wav_path, fmt)
+        if os.path.exists(path):
+            try:
+                os.remove(path)
+            except OSError as e:
+                print(f"Error removing audio variant {path}: {str(e)}")
@@ -9,17 +9,97 @@ import time
 import io
 from pyht import Client as PyhtClient
 from pyht.client import TTSOptions
-import base64
-import tempfile
-import random
+from urllib.parse import urlsplit
+import threading
+import queue
+import atexit
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from audio import AudioResult
+from health import provider_health
+from metrics import metrics, SIZE_BUCKETS
 
 load_dotenv()
 
 ZEROGPU_TOKENS = os.getenv("ZEROGPU_TOKENS", "").split(",")
+# Seconds a token rests after a quota error, doubled for each repeated error
+ZEROGPU_TOKEN_COOLDOWN = float(os.getenv("ZEROGPU_TOKEN_COOLDOWN", "300"))
 
 
-def get_zerogpu_token():
-    return random.choice(ZEROGPU_TOKENS)
+class ZeroGPUQuotaError(Exception):
+    """The ZeroGPU space rejected a request because the token is out of quota."""
+
+
+class ZeroGPUTokenPool:
+    """
+    Hands out the least-loaded ZeroGPU token, skipping tokens that are cooling
+    down after a 429 or quota error.
+    """
+
+    def __init__(self, tokens, cooldown=ZEROGPU_TOKEN_COOLDOWN):
+        self.cooldown = cooldown
+        self._tokens = {
+            token: {"in_flight": 0, "quota_errors": 0, "cooldown_until": 0.0, "last_used": 0.0}
+            for token in tokens
+            if token
+        }
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            if not self._tokens:
+                return None
+            now = time.monotonic()
+            healthy = [
+                token for token, state in self._tokens.items()
+                if state["cooldown_until"] <= now
+            ]
+            if healthy:
+                token = min(
+                    healthy,
+                    key=lambda t: (self._tokens[t]["in_flight"], self._tokens[t]["last_used"]),
+                )
+            else:
+                # Every token is cooling down; use the one that recovers first
+                token = min(self._tokens, key=lambda t: self._tokens[t]["cooldown_until"])
+            state = self._tokens[token]
+            state["in_flight"] += 1
+            state["last_used"] = now
+            return token
+
+    def release(self, token, quota_exceeded=False):
+        if token is None:
+            return
+        with self._lock:
+            state = self._tokens[token]
+            state["in_flight"] -= 1
+            if quota_exceeded:
+                state["quota_errors"] += 1
+                backoff = self.cooldown * min(2 ** (state["quota_errors"] - 1), 8)
+                state["cooldown_until"] = time.monotonic() + backoff
+                print(f"ZeroGPU token ...{token[-4:]} out of quota, resting {backoff:.0f}s")
+            else:
+                state["quota_errors"] = 0
+
+    @contextmanager
+    def lease(self):
+        """Acquire a token for the duration of a request, cooling it down on quota errors."""
+        token = self.acquire()
+        try:
+            yield token
+        except ZeroGPUQuotaError:
+            self.release(token, quota_exceeded=True)
+            raise
+        except BaseException:
+            self.release(token)
+            raise
+        else:
+            self.release(token)
+
+
+zerogpu_tokens = ZeroGPUTokenPool(ZEROGPU_TOKENS)
 
 
 model_mapping = {
@@ -46,6 +126,7 @@ model_mapping = {
     "spark-tts": {
         "provider": "spark",
         "model": "spark-tts",
+        "timeout": (10, 180),
     },
     "playht-2.0": {
         "provider": "playht",
@@ -54,14 +135,17 @@ model_mapping = {
     "styletts2": {
         "provider": "styletts",
         "model": "styletts2",
+        "timeout": (10, 180),
     },
     "kokoro-v1": {
         "provider": "kokoro",
         "model": "kokoro_v1",
+        "timeout": (10, 180),
     },
     "cosyvoice-2.0": {
         "provider": "cosyvoice",
         "model": "cosyvoice_2_0",
+        "timeout": (10, 180),
     },
     "papla-p1": {
         "provider": "papla",
@@ -74,6 +158,7 @@ model_mapping = {
     "megatts3": {
         "provider": "megatts3",
         "model": "megatts3",
+        "timeout": (10, 180),
     },
     "minimax-02-hd": {
         "provider": "minimax",
@@ -94,6 +179,7 @@ model_mapping = {
     "chatterbox": {
         "provider": "chatterbox",
         "model": "chatterbox",
+        "timeout": (10, 180),
     },
     "inworld": {
         "provider": "inworld",
@@ -136,7 +222,14 @@ model_mapping = {
         "model": "magpietts_research",
     },
 }
-url = "https://tts-agi-tts-router-v2.hf.space/tts"
+# Point every backend at a local fake_router.py instead of the real providers
+TTS_FAKE_ROUTER_URL = os.getenv("TTS_FAKE_ROUTER_URL", "").rstrip("/")
+
+url = (
+    f"{TTS_FAKE_ROUTER_URL}/tts"
+    if TTS_FAKE_ROUTER_URL
+    else "https://tts-agi-tts-router-v2.hf.space/tts"
+)
 headers = {
     "accept": "application/json",
     "Content-Type": "application/json",
@@ -144,8 +237,141 @@ headers = {
 }
 data = {"text": "string", "provider": "string", "model": "string"}
 
+DIA_API_URL = (
+    f"{TTS_FAKE_ROUTER_URL}/gradio_api/call"
+    if TTS_FAKE_ROUTER_URL
+    else "https://mrfakename-dia-1-6b.hf.space/gradio_api/call"
+)
+
+# Providers behind the conversational models, for health and metrics labels
+special_model_providers = {
+    "csm-1b": "fal",
+    "playdialog-1.0": "playht",
+    "dia-1.6b": "zerogpu",
+}
+
+# Timeouts for the conversational models, which don't go through the router
+special_model_timeouts = {
+    "csm-1b": (5, 120),
+    "playdialog-1.0": (5, 120),
+    "dia-1.6b": (10, 300),
+}
+
+# Default (connect, read) timeout in seconds for provider calls. Entries in
+# model_mapping can override it with a "timeout" key.
+DEFAULT_TIMEOUT = (
+    float(os.getenv("TTS_CONNECT_TIMEOUT", "5")),
+    float(os.getenv("TTS_READ_TIMEOUT", "90")),
+)
+HTTP_POOL_MAXSIZE = int(os.getenv("TTS_HTTP_POOL_MAXSIZE", "16"))
+HTTP_MAX_RETRIES = int(os.getenv("TTS_HTTP_MAX_RETRIES", "2"))
+HTTP_RETRY_BACKOFF = 0.5  # Seconds before the first retry, doubled for each one after
+# Responses where the provider or its gateway turned the request away unprocessed.
+# A 504 isn't one: the provider may still be generating, and billing, the clip.
+HTTP_RETRY_STATUSES = (502, 503)
+
+_http_sessions = {}  # host -> requests.Session
+_http_sessions_lock = threading.Lock()
+
+
+class ProviderAdapter(HTTPAdapter):
+    """
+    Keep-alive connection pool for one provider host. urllib3 retries
+    connection errors, which never reach the provider; read errors are never
+    replayed. HTTP_RETRY_STATUSES responses are retried here with backoff,
+    only while the call is within its first (connect, read) timeout: each
+    attempt's read timeout is cut to the time left, so retries can't stretch
+    a call past that limit.
+    """
+
+    def send(self, request, stream=False, timeout=None, **kwargs):
+        if isinstance(timeout, tuple):
+            connect_timeout, read_timeout = timeout
+        else:
+            connect_timeout = read_timeout = timeout
+        deadline = None
+        if connect_timeout is not None and read_timeout is not None:
+            deadline = time.monotonic() + connect_timeout + read_timeout
+        attempt = 0
+        while True:
+            if deadline is not None:
+                read_timeout = max(deadline - time.monotonic() - connect_timeout, connect_timeout)
+            response = super().send(
+                request, stream=stream, timeout=(connect_timeout, read_timeout), **kwargs
+            )
+            if response.status_code not in HTTP_RETRY_STATUSES or attempt >= HTTP_MAX_RETRIES:
+                return response
+            delay = HTTP_RETRY_BACKOFF * 2 ** attempt
+            if deadline is not None and time.monotonic() + delay + 2 * connect_timeout >= deadline:
+                return response  # No time left for a useful attempt
+            response.close()
+            time.sleep(delay)
+            attempt += 1
+
+
+def get_http_session(target_url):
+    """Return the shared keep-alive session for the host of target_url."""
+    host = urlsplit(target_url).netloc
+    with _http_sessions_lock:
+        http_session = _http_sessions.get(host)
+        if http_session is None:
+            # Connection errors only; status retries are bounded by ProviderAdapter
+            retry = Retry(
+                total=HTTP_MAX_RETRIES,
+                connect=HTTP_MAX_RETRIES,
+                read=0,  # Never replay a request the provider may still be running
+                status=0,
+                allowed_methods=None,
+                backoff_factor=HTTP_RETRY_BACKOFF,
+                raise_on_status=False,
+            )
+            adapter = ProviderAdapter(
+                pool_connections=1, pool_maxsize=HTTP_POOL_MAXSIZE, max_retries=retry
+            )
+            http_session = requests.Session()
+            http_session.mount("https://", adapter)
+            http_session.mount("http://", adapter)
+            _http_sessions[host] = http_session
+    return http_session
+
+
+def get_timeout(model):
+    """Return the (connect, read) timeout to use for a model's provider calls."""
+    if model in special_model_timeouts:
+        return special_model_timeouts[model]
+    return model_mapping.get(model, {}).get("timeout", DEFAULT_TIMEOUT)
+
+
+# Hedged router requests: send a duplicate request when a call runs past the
+# model's recent latency quantile, within a budget of extra load
+TTS_HEDGE_ENABLED = os.getenv("TTS_HEDGE_ENABLED", "False").lower() == "true"
+TTS_HEDGE_QUANTILE = float(os.getenv("TTS_HEDGE_QUANTILE", "0.95"))
+TTS_HEDGE_BUDGET = float(os.getenv("TTS_HEDGE_BUDGET", "0.1"))  # Hedges per router call
+TTS_HEDGE_MAX_INFLIGHT = int(os.getenv("TTS_HEDGE_MAX_INFLIGHT", "4"))
+TTS_HEDGE_MIN_SAMPLES = 10
+
+# Bytes per chunk when streaming generated audio from a provider
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def download_audio(audio_url, timeout, stream=False):
+    """Fetch generated audio from a provider URL, optionally as a chunk stream."""
+    response = get_http_session(audio_url).get(audio_url, timeout=timeout, stream=stream)
+    response.raise_for_status()
+    if stream:
+        return AudioResult.from_chunks(response.iter_content(chunk_size=STREAM_CHUNK_SIZE))
+    return AudioResult.from_bytes(response.content)
+
+
+def predict_csm(script, stream=False):
+    if TTS_FAKE_ROUTER_URL:
+        fake_url = f"{TTS_FAKE_ROUTER_URL}/fal/csm-1b"
+        response = get_http_session(fake_url).post(
+            fake_url, json={"scene": script}, timeout=get_timeout("csm-1b")
+        )
+        response.raise_for_status()
+        return download_audio(response.json()["audio"]["url"], get_timeout("csm-1b"), stream)
 
-def predict_csm(script):
     result = fal_client.subscribe(
         "fal-ai/csm-1b",
         arguments={
@@ -163,16 +389,123 @@ def predict_csm(script):
         },
         with_logs=True,
     )
-    return requests.get(result["audio"]["url"]).content
+    return download_audio(result["audio"]["url"], get_timeout("csm-1b"), stream)
 
 
-def predict_playdialog(script):
-    # Initialize the PyHT client
-    pyht_client = PyhtClient(
-        user_id=os.getenv("PLAY_USERID"),
-        api_key=os.getenv("PLAY_SECRETKEY"),
-    )
+# Warm PyHT clients kept for PlayDialog, and how long one may be reused
+PYHT_POOL_SIZE = int(os.getenv("PYHT_POOL_SIZE", "4"))
+PYHT_CLIENT_MAX_AGE = float(os.getenv("PYHT_CLIENT_MAX_AGE", "1800"))
+
+
+class PyhtClientPool:
+    """
+    Process-wide pool of PyHT clients, so PlayDialog calls reuse an open
+    channel instead of setting one up per generation. A client that fails a
+    call is closed and replaced; clients older than max_age are recycled.
+    """
+
+    def __init__(self, size=PYHT_POOL_SIZE, max_age=PYHT_CLIENT_MAX_AGE):
+        self.size = size
+        self.max_age = max_age
+        self._idle = queue.LifoQueue()  # (client, created_at), most recently used first
+        self._created = 0
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _new_client(self):
+        return PyhtClient(
+            user_id=os.getenv("PLAY_USERID"),
+            api_key=os.getenv("PLAY_SECRETKEY"),
+        )
+
+    def _close_client(self, client):
+        with self._lock:
+            self._created -= 1
+        try:
+            client.close()
+        except Exception as e:
+            print(f"Error closing PyHT client: {e}")
+
+    def acquire(self, timeout=30):
+        """Returns (client, created_at); pass both back to release() or discard()."""
+        while True:
+            try:
+                client, created_at = self._idle.get_nowait()
+            except queue.Empty:
+                with self._lock:
+                    can_create = self._created < self.size
+                    if can_create:
+                        self._created += 1
+                if can_create:
+                    try:
+                        return self._new_client(), time.monotonic()
+                    except Exception:
+                        with self._lock:
+                            self._created -= 1
+                        raise
+                # Pool is at capacity; wait for a client to come back
+                client, created_at = self._idle.get(timeout=timeout)
+            if time.monotonic() - created_at > self.max_age:
+                self._close_client(client)
+                continue
+            return client, created_at
+
+    def release(self, client, created_at):
+        if self._closed:
+            self._close_client(client)
+        else:
+            self._idle.put((client, created_at))
+
+    def discard(self, client):
+        self._close_client(client)
 
+    def warm(self):
+        """Open clients up to the pool size ahead of the first request."""
+        leased = []
+        try:
+            for _ in range(self.size):
+                leased.append(self.acquire(timeout=0))
+        except queue.Empty:
+            pass  # Clients are already in use up to the pool size
+        except Exception as e:
+            print(f"Error warming PyHT client pool: {e}")
+        for client, created_at in leased:
+            self.release(client, created_at)
+
+    def close(self):
+        self._closed = True
+        while True:
+            try:
+                client, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._close_client(client)
+
+
+pyht_clients = PyhtClientPool()
+atexit.register(pyht_clients.close)
+
+
+def _pooled_tts(text, options):
+    """
+    Yield PlayDialog chunks from a pooled client. The client is borrowed when
+    the first chunk is read, so a stream dropped unread never holds one, and
+    it goes back to the pool once the stream ends or is closed.
+    """
+    client, created_at = pyht_clients.acquire()
+    try:
+        yield from client.tts(text, options, voice_engine="PlayDialog")
+    except GeneratorExit:
+        # The reader stopped early; the client itself is still usable
+        pyht_clients.release(client, created_at)
+        raise
+    except Exception:
+        pyht_clients.discard(client)
+        raise
+    pyht_clients.release(client, created_at)
+
+
+def predict_playdialog(script, stream=False):
     # Define the voices
     voice_1 = "s3://voice-cloning-zero-shot/baf1ef41-36b6-428c-9bdf-50ba54682bd8/original/manifest.json"
     voice_2 = "s3://voice-cloning-zero-shot/e040bd1b-f190-4bdb-83f0-75ef85b18f84/original/manifest.json"
@@ -189,21 +522,33 @@ def predict_playdialog(script):
         # If it's already a string, use as is
         text = script
 
+    if TTS_FAKE_ROUTER_URL:
+        fake_url = f"{TTS_FAKE_ROUTER_URL}/pyht/tts"
+        response = get_http_session(fake_url).post(
+            fake_url, json={"text": text}, stream=True, timeout=get_timeout("playdialog-1.0")
+        )
+        response.raise_for_status()
+        audio_chunks = response.iter_content(chunk_size=STREAM_CHUNK_SIZE)
+        if stream:
+            return AudioResult.from_chunks(audio_chunks)
+        return AudioResult.from_bytes(b"".join(audio_chunks))
+
     # Set up TTSOptions
     options = TTSOptions(
         voice=voice_1, voice_2=voice_2, turn_prefix="Host 1:", turn_prefix_2="Host 2:"
     )
 
-    # Generate audio using PlayDialog
-    audio_chunks = []
-    for chunk in pyht_client.tts(text, options, voice_engine="PlayDialog"):
-        audio_chunks.append(chunk)
+    # Generate audio using PlayDialog, on a warm PyHT client from the pool
+    audio_chunks = _pooled_tts(text, options)
+    if stream:
+        # Hand chunks to the caller as PlayDialog produces them
+        return AudioResult.from_chunks(audio_chunks)
 
     # Combine all chunks into a single audio file
-    return b"".join(audio_chunks)
+    return AudioResult.from_bytes(b"".join(audio_chunks))
 
 
-def predict_dia(script):
+def predict_dia(script, stream=False):
     # Convert script to the required format for Dia
     if isinstance(script, list):
         # Convert from list of dictionaries to formatted string
@@ -217,49 +562,145 @@ def predict_dia(script):
     else:
         # If it's already a string, use as is
         text = script
-    # Make a POST request to initiate the dialogue generation
-    headers = {
-        # "Content-Type": "application/json",
-        "Authorization": f"Bearer {get_zerogpu_token()}"
-    }
-
-    response = requests.post(
-        "https://mrfakename-dia-1-6b.hf.space/gradio_api/call/generate_dialogue",
-        headers=headers,
-        json={"data": [text]},
-    )
+    timeout = get_timeout("dia-1.6b")
+    # Same host throughout, so the POST, the SSE stream and the audio download
+    # all reuse the pooled keep-alive connection
+    http_session = get_http_session(DIA_API_URL)
 
-    # Extract the event ID from the response
-    event_id = response.json()["event_id"]
+    with zerogpu_tokens.lease() as token:
+        # Without tokens the space is called anonymously, on its shared quota
+        headers = {"Authorization": f"Bearer {token}"} if token else {}
 
-    # Make a streaming request to get the generated dialogue
-    stream_url = f"https://mrfakename-dia-1-6b.hf.space/gradio_api/call/generate_dialogue/{event_id}"
+        # Make a POST request to initiate the dialogue generation
+        response = http_session.post(
+            f"{DIA_API_URL}/generate_dialogue",
+            headers=headers,
+            json={"data": [text]},
+            timeout=timeout,
+        )
+        if response.status_code == 429:
+            raise ZeroGPUQuotaError(response.text[:200])
+        response.raise_for_status()
+
+        # Extract the event ID from the response
+        event_id = response.json()["event_id"]
+
+        # Make a streaming request to get the generated dialogue
+        stream_url = f"{DIA_API_URL}/generate_dialogue/{event_id}"
 
-    # Use a streaming request to get the audio data
-    with requests.get(stream_url, headers=headers, stream=True) as stream_response:
-        # Process the streaming response
-        for line in stream_response.iter_lines():
-            if line:
-                if line.startswith(b"data: ") and not line.startswith(b"data: null"):
+        # Use a streaming request to get the audio data
+        with http_session.get(
+            stream_url, headers=headers, stream=True, timeout=timeout
+        ) as stream_response:
+            event = None
+            # Process the streaming response
+            for line in stream_response.iter_lines():
+                if not line:
+                    continue
+                if line.startswith(b"event: "):
+                    event = line[7:].strip()
+                elif event == b"error":
+                    message = line[6:].decode(errors="replace")
+                    if "quota" in message.lower():
+                        raise ZeroGPUQuotaError(message)
+                    raise RuntimeError(f"Dia generation failed: {message}")
+                elif line.startswith(b"data: ") and not line.startswith(b"data: null"):
                     audio_data = line[6:]
-                    return requests.get(json.loads(audio_data)[0]["url"]).content
+                    audio_url = json.loads(audio_data)[0]["url"]
+                    return download_audio(audio_url, timeout, stream)
+
+    raise ValueError("Dia stream ended without returning audio")
+
+
+def get_provider(model):
+    """Provider name used to label a model's health and metrics."""
+    if model in special_model_providers:
+        return special_model_providers[model]
+    return model_mapping.get(model, {}).get("provider", "unknown")
+
+
+def predict_tts(text, model, stream=False):
+    """
+    Generate audio for text with model, reporting the outcome to provider_health
+    and the metrics registry. Streamed audio is reported when the stream ends,
+    so a stream that breaks partway through counts as a failure.
+    """
+    provider = get_provider(model)
+    # Claims the half-open probe, now that the call is actually going out
+    provider_health.start_call(model)
+    start_time = time.monotonic()
+    try:
+        audio = _predict_tts(text, model, stream)
+    except Exception as e:
+        _record_failure(model, provider, start_time, e)
+        raise
+    if audio.nbytes is None:
+        # Still arriving from the provider
+        return AudioResult.from_chunks(
+            _reported_chunks(audio.stream_chunks(), model, provider, start_time), audio.extension
+        )
+    _record_success(model, provider, start_time, audio.nbytes)
+    return audio
+
 
+def _reported_chunks(chunks, model, provider, start_time):
+    """Yield a provider stream's chunks, reporting the call once the stream ends or fails."""
+    nbytes = 0
+    try:
+        for chunk in chunks:
+            nbytes += len(chunk)
+            yield chunk
+    except GeneratorExit:
+        # The reader stopped early, which says nothing about the provider
+        raise
+    except Exception as e:
+        _record_failure(model, provider, start_time, e)
+        raise
+    _record_success(model, provider, start_time, nbytes)
 
-def predict_tts(text, model):
+
+def _record_success(model, provider, start_time, nbytes):
+    latency = time.monotonic() - start_time
+    provider_health.record_success(model, latency)
+    metrics.increment("tts_generation_total", model=model, provider=provider, outcome="success")
+    metrics.observe("tts_generation_seconds", latency, model=model, provider=provider)
+    if nbytes is not None:
+        metrics.observe(
+            "tts_generation_bytes", nbytes, buckets=SIZE_BUCKETS, model=model, provider=provider
+        )
+
+
+def _record_failure(model, provider, start_time, error):
+    latency = time.monotonic() - start_time
+    provider_health.record_failure(model)
+    metrics.increment("tts_generation_total", model=model, provider=provider, outcome="error")
+    metrics.increment("tts_generation_errors", model=model, provider=provider, error=type(error).__name__)
+    metrics.observe("tts_generation_error_seconds", latency, model=model, provider=provider)
+
+
+def _predict_tts(text, model, stream=False):
     global client
     print(f"Predicting TTS for {model}")
-    # Exceptions: special models that shouldn't be passed to the router
+    # Exceptions: special models that shouldn't be passed to the router.
+    # With stream=True they return audio that is still arriving from the provider.
     if model == "csm-1b":
-        return predict_csm(text)
+        return predict_csm(text, stream)
     elif model == "playdialog-1.0":
-        return predict_playdialog(text)
+        return predict_playdialog(text, stream)
     elif model == "dia-1.6b":
-        return predict_dia(text)
+        return predict_dia(text, stream)
 
     if not model in model_mapping:
         raise ValueError(f"Model {model} not found")
 
-    result = requests.post(
+    if TTS_HEDGE_ENABLED:
+        return predict_router_hedged(text, model)
+    return predict_router(text, model)
+
+
+def predict_router(text, model):
+    """Generate audio for a model through the TTS router."""
+    result = get_http_session(url).post(
         url,
         headers=headers,
         data=json.dumps(
@@ -269,20 +710,84 @@ def predict_tts(text, model):
                 "model": model_mapping[model]["model"],
             }
         ),
+        timeout=get_timeout(model),
     )
+    result.raise_for_status()
     response_json = result.json()
 
-    audio_data = response_json["audio_data"]  # base64 encoded audio data
-    extension = response_json["extension"]
-    # Decode the base64 audio data
-    audio_bytes = base64.b64decode(audio_data)
+    # Keep the audio base64 encoded; the caller decodes it straight to its final location
+    return AudioResult.from_base64(
+        response_json["audio_data"], response_json.get("extension", "wav")
+    )
+
+
+class HedgeBudget:
+    """
+    Limits duplicate load from hedging: every router call earns `ratio` of a
+    token, each hedge spends a whole one, and at most `max_inflight` hedges
+    may be running at once.
+    """
+
+    def __init__(self, ratio, max_inflight, burst=5):
+        self.ratio = ratio
+        self.max_inflight = max_inflight
+        self.burst = burst
+        self.tokens = float(burst)
+        self.inflight = 0
+        self.sent = 0
+        self._lock = threading.Lock()
+
+    def record_call(self):
+        with self._lock:
+            self.tokens = min(self.burst, self.tokens + self.ratio)
+
+    def try_acquire(self):
+        with self._lock:
+            if self.tokens < 1 or self.inflight >= self.max_inflight:
+                return False
+            self.tokens -= 1
+            self.inflight += 1
+            self.sent += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self.inflight -= 1
+
+
+hedge_budget = HedgeBudget(TTS_HEDGE_BUDGET, TTS_HEDGE_MAX_INFLIGHT)
+_hedge_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="RouterHedge")
+
+
+def predict_router_hedged(text, model):
+    """
+    Router call that sends a duplicate request if the first hasn't returned by
+    the model's recent latency quantile, returning whichever succeeds first.
+    """
+    hedge_budget.record_call()
+    hedge_delay = provider_health.latency_quantile(
+        model, TTS_HEDGE_QUANTILE, min_samples=TTS_HEDGE_MIN_SAMPLES
+    )
+    if hedge_delay is None:
+        # Not enough history to know what "slow" means for this model yet
+        return predict_router(text, model)
 
-    # Create a temporary file to store the audio data
-    with tempfile.NamedTemporaryFile(delete=False, suffix=f".{extension}") as temp_file:
-        temp_file.write(audio_bytes)
-        temp_path = temp_file.name
+    primary = _hedge_executor.submit(predict_router, text, model)
+    done, _ = wait([primary], timeout=hedge_delay)
+    if done or not hedge_budget.try_acquire():
+        return primary.result()
 
-    return temp_path
+    print(f"Hedging router request for {model} after {hedge_delay:.1f}s")
+    hedge = _hedge_executor.submit(predict_router, text, model)
+    hedge.add_done_callback(lambda _: hedge_budget.release())
+    pending = {primary, hedge}
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        succeeded = [future for future in done if future.exception() is None]
+        if succeeded:
+            return succeeded[0].result()
+    # Both attempts failed
+    return primary.result()
 
 
 if __name__ == "__main__":
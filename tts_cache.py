@@ -0,0 +1,538 @@
+"""
+Pregenerated cache support for TTS Arena.
+
+The cache holds one clip per (sentence, model). MemoryTTSCache keeps it in
+a dict for a single server process. Every entry added to it or taken out of
+it is also written to a small SQLite file next to the audio store, so a
+restart can reload the clips whose audio is still on disk instead of paying
+for a full cache of provider calls again. When worker processes share state,
+SharedTTSCache uses that SQLite file as the cache itself.
+
+Admin changes reach the cache through on_model_deactivated() listeners,
+since admin.py can't import app.py.
+
+RefillScheduler keeps the cache topped up. It queues exactly as many fills
+as the cache is short, counting fills already queued or running, and runs
+them on a fixed number of workers so refills can't flood the providers.
+Only the process that starts it fills the cache. When workers share state,
+that process publishes its target and queued sentences, and the scheduler in
+every other worker reports those instead of its own idle ones.
+CacheAutoscaler moves its target between configured bounds, following the
+generate request rate and how long fills take.
+"""
+
+import heapq
+import itertools
+import math
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from audio_store import AUDIO_STORE_DIR
+from metrics import metrics
+from shared_state import SHARED_STATE, SharedArrivals, SharedDatabase, SharedRefillState
+
+CACHE_MANIFEST_PATH = os.getenv(
+    "TTS_CACHE_MANIFEST", os.path.join(AUDIO_STORE_DIR, "cache_manifest.db")
+)
+
+# Cache fills running at once. Each one makes TTS_CACHE_MODELS_PER_SENTENCE (default 3)
+# provider calls, so up to three times this many background calls are requested at once,
+# of which the generation engine runs PROVIDER_BACKGROUND_CONCURRENCY per provider
+CACHE_REFILL_CONCURRENCY = int(os.getenv("CACHE_REFILL_CONCURRENCY", "4"))
+
+# Weight of the latest fill in the fill duration moving average
+FILL_SECONDS_SMOOTHING = 0.2
+
+# Bounds and tuning for the adaptive cache size
+TTS_CACHE_MIN_SIZE = int(os.getenv("TTS_CACHE_MIN_SIZE", "4"))
+TTS_CACHE_MAX_SIZE = int(os.getenv("TTS_CACHE_MAX_SIZE", "40"))
+# Seconds of generate requests the arrival rate is measured over
+TTS_CACHE_AUTOSCALE_WINDOW = float(os.getenv("TTS_CACHE_AUTOSCALE_WINDOW", "900"))
+# Entries kept per entry expected to be taken while one fill runs
+TTS_CACHE_AUTOSCALE_HEADROOM = float(os.getenv("TTS_CACHE_AUTOSCALE_HEADROOM", "2.0"))
+
+# Refill priorities, lowest first
+PRIORITY_HIT = 0  # Replacing an entry a user just took
+PRIORITY_BACKGROUND = 1  # Startup fill and periodic top-ups
+
+_model_deactivation_listeners = []
+
+
+def on_model_deactivated(listener):
+    """Register listener(model_id), called when an admin deactivates a model."""
+    _model_deactivation_listeners.append(listener)
+    return listener
+
+
+def model_deactivated(model_id):
+    for listener in _model_deactivation_listeners:
+        listener(model_id)
+
+
+def _entries_from_rows(rows):
+    """Group (sentence, model_id, audio, created_at) rows into {sentence: entry}."""
+    entries = {}
+    for sentence, model_id, audio, created_at in rows:
+        created_at = datetime.fromisoformat(created_at)
+        entry = entries.setdefault(sentence, {"clips": {}, "created_at": created_at})
+        entry["clips"][model_id] = {"audio": audio, "created_at": created_at}
+    return entries
+
+
+def select_evictions(entries, now, ttl, max_bytes, entry_bytes):
+    """
+    Picks what to evict from (sentence, entry) pairs ordered oldest first:
+    entries older than `ttl`, then the oldest of the others until the rest
+    fit in max_bytes (0 for no limit), sizing each with entry_bytes(entry).
+    Returns (expired, over_budget, bytes left).
+    """
+    expired = [sentence for sentence, entry in entries if now - entry["created_at"] > ttl]
+    expired_set = set(expired)
+    remaining = [(s, entry_bytes(e)) for s, e in entries if s not in expired_set]
+    total_bytes = sum(size for _, size in remaining)
+    over_budget = []
+    for sentence, size in remaining:  # Oldest first
+        if not max_bytes or total_bytes <= max_bytes:
+            break
+        over_budget.append(sentence)
+        total_bytes -= size
+    return expired, over_budget, total_bytes
+
+
+class CacheManifest(SharedDatabase):
+    """One row per cached (sentence, model) clip."""
+
+    def __init__(self, path=CACHE_MANIFEST_PATH):
+        super().__init__(path)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS cache_clips (
+                sentence TEXT NOT NULL,
+                model_id TEXT NOT NULL,
+                audio TEXT NOT NULL,
+                created_at TEXT NOT NULL,
+                PRIMARY KEY (sentence, model_id)
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS cache_clips_model ON cache_clips (model_id)")
+
+    @staticmethod
+    def write_entry(conn, sentence, entry):
+        """Replace the rows recorded for a sentence, inside a transaction."""
+        conn.execute("DELETE FROM cache_clips WHERE sentence = ?", (sentence,))
+        conn.executemany(
+            "INSERT INTO cache_clips VALUES (?, ?, ?, ?)",
+            [
+                (sentence, model_id, clip["audio"], clip["created_at"].isoformat())
+                for model_id, clip in entry["clips"].items()
+            ],
+        )
+
+    def add(self, sentence, entry):
+        """Record every clip of a cache entry, replacing what was recorded for the sentence."""
+        with self.transaction() as conn:
+            self.write_entry(conn, sentence, entry)
+
+    def remove(self, sentence):
+        with self._lock:
+            self._conn.execute("DELETE FROM cache_clips WHERE sentence = ?", (sentence,))
+
+    def entries(self):
+        """All recorded entries as (sentence, entry) pairs, oldest first."""
+        rows = self.query(
+            "SELECT sentence, model_id, audio, created_at FROM cache_clips ORDER BY created_at"
+        )
+        return list(_entries_from_rows(rows).items())
+
+
+class MemoryTTSCache:
+    """
+    The cache of a single server process: sentence -> {"clips": {model_id:
+    {"audio", "created_at"}}, "created_at"}, mirrored to the manifest.
+    """
+
+    def __init__(self, manifest):
+        self.manifest = manifest
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, sentence):
+        return sentence in self._entries
+
+    def sentences(self):
+        with self._lock:
+            return list(self._entries)
+
+    def items(self):
+        """(sentence, entry) pairs, oldest first."""
+        with self._lock:
+            items = list(self._entries.items())
+        return sorted(items, key=lambda item: item[1]["created_at"])
+
+    def add(self, sentence, entry, limit):
+        """Cache an entry unless the sentence is cached already or `limit` entries are. Returns whether it was added."""
+        with self._lock:
+            if sentence in self._entries or len(self._entries) >= limit:
+                return False
+            self._entries[sentence] = entry
+            self.manifest.add(sentence, entry)
+        return True
+
+    def pop(self, sentence):
+        """Take an entry out of the cache, or None if it isn't cached."""
+        with self._lock:
+            entry = self._entries.pop(sentence, None)
+        if entry is not None:
+            self.manifest.remove(sentence)
+        return entry
+
+    def drop_model(self, model_id):
+        """
+        Remove a model's clips from every entry. Returns the dropped clips by
+        sentence, and the sentences left with fewer than two clips.
+        """
+        dropped_clips = {}
+        too_small = []
+        with self._lock:
+            for sentence, entry in self._entries.items():
+                clip = entry["clips"].pop(model_id, None)
+                if clip is None:
+                    continue
+                dropped_clips[sentence] = clip
+                if len(entry["clips"]) < 2:
+                    too_small.append(sentence)
+                else:
+                    self.manifest.add(sentence, entry)
+        return dropped_clips, too_small
+
+
+class SharedTTSCache:
+    """
+    The cache for worker processes sharing state: the manifest's rows are
+    the cache, so every worker sees the same entries and only one of them
+    can pop a given entry. Same interface as MemoryTTSCache.
+    """
+
+    def __init__(self, manifest):
+        self.manifest = manifest
+
+    def __len__(self):
+        return self.manifest.query("SELECT COUNT(DISTINCT sentence) FROM cache_clips")[0][0]
+
+    def __contains__(self, sentence):
+        return bool(self.manifest.query(
+            "SELECT 1 FROM cache_clips WHERE sentence = ? LIMIT 1", (sentence,)
+        ))
+
+    def sentences(self):
+        return [row[0] for row in self.manifest.query("SELECT DISTINCT sentence FROM cache_clips")]
+
+    def items(self):
+        return self.manifest.entries()
+
+    def add(self, sentence, entry, limit):
+        with self.manifest.transaction() as conn:
+            if conn.execute("SELECT 1 FROM cache_clips WHERE sentence = ? LIMIT 1", (sentence,)).fetchone():
+                return False
+            if conn.execute("SELECT COUNT(DISTINCT sentence) FROM cache_clips").fetchone()[0] >= limit:
+                return False
+            self.manifest.write_entry(conn, sentence, entry)
+        return True
+
+    def pop(self, sentence):
+        with self.manifest.transaction() as conn:
+            rows = conn.execute(
+                "SELECT sentence, model_id, audio, created_at FROM cache_clips WHERE sentence = ?",
+                (sentence,),
+            ).fetchall()
+            conn.execute("DELETE FROM cache_clips WHERE sentence = ?", (sentence,))
+        return _entries_from_rows(rows).get(sentence)
+
+    def drop_model(self, model_id):
+        with self.manifest.transaction() as conn:
+            rows = conn.execute(
+                "SELECT sentence, model_id, audio, created_at FROM cache_clips WHERE model_id = ?",
+                (model_id,),
+            ).fetchall()
+            conn.execute("DELETE FROM cache_clips WHERE model_id = ?", (model_id,))
+            too_small = [
+                row[0] for row in conn.execute(
+                    "SELECT sentence FROM cache_clips GROUP BY sentence HAVING COUNT(*) < 2"
+                )
+            ]
+        dropped_clips = {
+            sentence: entry["clips"][model_id]
+            for sentence, entry in _entries_from_rows(rows).items()
+        }
+        return dropped_clips, too_small
+
+
+class RefillScheduler:
+    """
+    Tops the cache up to `target` entries on a fixed pool of worker threads.
+
+    choose(exclude) picks an uncached sentence that isn't in `exclude`, or
+    returns None when none are left. fill(sentence) generates and caches it,
+    returning True when an entry was added. cache_size() returns the current
+    number of entries. Nothing is filled until start() is called.
+
+    With a SharedRefillState as `shared`, a started scheduler publishes its
+    target and queued sentences there, and one that isn't started reads them
+    back, so every worker sees the leader's.
+    """
+
+    def __init__(self, choose, fill, cache_size, target,
+                 max_concurrency=CACHE_REFILL_CONCURRENCY, shared=None):
+        self._target = target
+        self._shared = shared
+        self._choose = choose
+        self._fill = fill
+        self._cache_size = cache_size
+        self._queue = []  # Heap of (priority, sequence, sentence or None)
+        self._sequence = itertools.count()
+        self._in_flight = {}  # Worker name -> sentence being filled, None while choosing
+        self._choose_lock = threading.Lock()  # So two workers don't pick the same sentence
+        self._cond = threading.Condition()
+        self._stopped = False
+        self.fill_seconds = None  # Moving average duration of fills that added an entry
+        self.max_concurrency = max_concurrency
+        self._workers = []
+        metrics.set_gauge("tts_cache_target_size", target)
+
+    def start(self):
+        """Start the fill workers; top_up() and schedule() do nothing before this."""
+        with self._cond:
+            if self._workers:
+                return
+            self._workers = [
+                threading.Thread(target=self._run, name=f"CacheRefill-{i}", daemon=True)
+                for i in range(self.max_concurrency)
+            ]
+        for worker in self._workers:
+            worker.start()
+        with self._cond:
+            self._publish()  # Replaces whatever a previous leader left
+
+    @property
+    def target(self):
+        if self._shared is not None and not self._workers:
+            shared_target = self._shared.target()
+            if shared_target is not None:
+                return shared_target
+        return self._target
+
+    @property
+    def pending(self):
+        with self._cond:
+            return len(self._queue)
+
+    @property
+    def in_flight(self):
+        with self._cond:
+            return len(self._in_flight)
+
+    def top_up(self, priority=PRIORITY_BACKGROUND):
+        """Queue fills for every slot not already filled, queued or being filled."""
+        with self._cond:
+            if not self._workers:
+                return 0
+            missing = self._target - (self._cache_size() + len(self._queue) + len(self._in_flight))
+            for _ in range(missing):
+                heapq.heappush(self._queue, (priority, next(self._sequence), None))
+            if missing > 0:
+                self._cond.notify(missing)
+            self._publish()
+        return max(missing, 0)
+
+    def schedule(self, sentence, priority=PRIORITY_BACKGROUND):
+        """Queue a fill for a specific sentence, regardless of the target."""
+        with self._cond:
+            if not self._workers:
+                return
+            heapq.heappush(self._queue, (priority, next(self._sequence), sentence))
+            self._cond.notify()
+            self._publish()
+
+    def queued_sentences(self):
+        """Sentences queued or being generated; anonymous slots don't have one yet."""
+        if self._shared is not None and not self._workers:
+            return self._shared.queued_sentences()
+        with self._cond:
+            return self._queued()
+
+    def _queued(self):
+        queued = {sentence for _, _, sentence in self._queue if sentence}
+        queued.update(sentence for sentence in self._in_flight.values() if sentence)
+        return queued
+
+    def stats(self):
+        with self._cond:
+            return {
+                "target": self._target,
+                "fill_seconds": self.fill_seconds,
+                "pending": len(self._queue),
+                "in_flight": len(self._in_flight),
+                "workers": len(self._workers),
+            }
+
+    def _record_fill(self, seconds):
+        with self._cond:
+            if self.fill_seconds is None:
+                self.fill_seconds = seconds
+            else:
+                self.fill_seconds += FILL_SECONDS_SMOOTHING * (seconds - self.fill_seconds)
+
+    def _publish(self):
+        metrics.set_gauge("tts_cache_refill_queue_depth", len(self._queue))
+        metrics.set_gauge("tts_cache_refill_in_flight", len(self._in_flight))
+        if self._shared is not None and self._workers:
+            try:
+                self._shared.publish(self._target, self._queued())
+            except Exception as e:
+                print(f"Error publishing cache refill state: {str(e)}")
+
+    def _run(self):
+        name = threading.current_thread().name
+        while True:
+            with self._cond:
+                while not self._queue and not self._stopped:
+                    self._cond.wait()
+                if self._stopped:
+                    return
+                _, _, sentence = heapq.heappop(self._queue)
+                self._in_flight[name] = sentence
+                self._publish()
+            try:
+                if sentence is None:
+                    with self._choose_lock:
+                        sentence = self._choose(self.queued_sentences())
+                        with self._cond:
+                            self._in_flight[name] = sentence
+                            self._publish()
+                if sentence is not None:
+                    started = time.monotonic()
+                    added = self._fill(sentence)
+                    if added:
+                        self._record_fill(time.monotonic() - started)
+                    metrics.increment(
+                        "tts_cache_refill_total", outcome="added" if added else "discarded"
+                    )
+            except Exception as e:
+                metrics.increment("tts_cache_refill_total", outcome="error")
+                print(f"Error in cache refill for '{(sentence or '')[:50]}...': {str(e)}")
+            finally:
+                with self._cond:
+                    del self._in_flight[name]
+                    self._publish()
+
+    def set_target(self, target):
+        """Change the target size; growing queues fills for the new slots."""
+        with self._cond:
+            self._target = target
+        metrics.set_gauge("tts_cache_target_size", target)
+        return self.top_up()
+
+    def shutdown(self):
+        with self._cond:
+            self._stopped = True
+            self._queue.clear()
+            self._cond.notify_all()
+
+
+class ArrivalWindow:
+    """Generate request times seen by this process, for CacheAutoscaler."""
+
+    def __init__(self):
+        self._times = deque()
+        self._lock = threading.Lock()
+
+    def record(self, at):
+        with self._lock:
+            self._times.append(at)
+
+    def count_since(self, since):
+        """Arrivals at or after `since`; older ones are forgotten."""
+        with self._lock:
+            while self._times and self._times[0] < since:
+                self._times.popleft()
+            return len(self._times)
+
+
+class CacheAutoscaler:
+    """
+    Sizes the cache to cover the generate requests that arrive while a fill
+    runs: arrival rate × fill duration × headroom, kept within the min and
+    max sizes. Shrinks step by step so a quiet minute doesn't drop the
+    target all at once. Entries above a lowered target aren't evicted; they
+    are paid for already and simply aren't replaced.
+    """
+
+    def __init__(self, scheduler, min_size=TTS_CACHE_MIN_SIZE, max_size=TTS_CACHE_MAX_SIZE,
+                 window=TTS_CACHE_AUTOSCALE_WINDOW, headroom=TTS_CACHE_AUTOSCALE_HEADROOM,
+                 arrivals=None):
+        self.scheduler = scheduler
+        self.min_size = min_size
+        self.max_size = max_size
+        self.window = window
+        self.headroom = headroom
+        self.decisions = deque(maxlen=100)  # Recent target changes, for audit
+        # Wall clock times, so arrivals recorded by other processes compare
+        self._arrivals = arrivals or ArrivalWindow()
+        self._started = time.monotonic()
+
+    def clamp(self, size):
+        return max(self.min_size, min(self.max_size, size))
+
+    def record_request(self):
+        self._arrivals.record(time.time())
+
+    def arrival_rate(self):
+        """Generate requests per second over the window (or since startup, if shorter)."""
+        arrivals = self._arrivals.count_since(time.time() - self.window)
+        return arrivals / max(1.0, min(self.window, time.monotonic() - self._started))
+
+    def adjust(self):
+        """Recompute the target and apply it; returns the new target."""
+        current = self.scheduler.target
+        fill_seconds = self.scheduler.fill_seconds
+        if fill_seconds is None:
+            return current  # No completed fill to measure yet
+
+        rate = self.arrival_rate()
+        desired = self.clamp(math.ceil(rate * fill_seconds * self.headroom))
+        if desired < current:
+            # Step down by at most a quarter per adjustment
+            desired = max(desired, current - max(1, current // 4))
+        if desired == current:
+            return current
+
+        decision = {
+            "at": datetime.utcnow().isoformat(),
+            "from": current,
+            "to": desired,
+            "arrival_rate": round(rate, 4),
+            "fill_seconds": round(fill_seconds, 2),
+        }
+        self.decisions.append(decision)
+        print(
+            f"[Cache Autoscaler] Target {current} -> {desired} "
+            f"(arrivals {rate * 60:.2f}/min, fill {fill_seconds:.1f}s, "
+            f"bounds {self.min_size}-{self.max_size})"
+        )
+        metrics.increment("tts_cache_autoscale_total", direction="up" if desired > current else "down")
+        self.scheduler.set_target(desired)
+        return desired
+
+
+cache_manifest = CacheManifest()
+# Shared between workers when they share state, so any of them can pop an entry
+tts_cache = SharedTTSCache(cache_manifest) if SHARED_STATE else MemoryTTSCache(cache_manifest)
+cache_arrivals = SharedArrivals() if SHARED_STATE else ArrivalWindow()
+refill_state = SharedRefillState() if SHARED_STATE else None
@@ -0,0 +1,104 @@
+"""
+Waveform peaks for TTS Arena audio clips.
+
+The arena player draws its waveform from a compact array of min/max pairs
+instead of downloading and decoding the whole WAV first. Peaks are computed
+once per clip with NumPy and stored next to the audio as <name>.peaks.json.
+"""
+
+import json
+import os
+import subprocess
+import threading
+import wave
+
+import numpy as np
+
+from transcode import FFMPEG_BIN, TRANSCODE_TIMEOUT
+
+# Number of min/max pairs per clip
+PEAKS_RESOLUTION = int(os.getenv("PEAKS_RESOLUTION", "400"))
+DECODE_SAMPLE_RATE = 24000
+
+_SAMPLE_DTYPES = {1: np.uint8, 2: np.int16, 4: np.int32}
+
+
+def peaks_path(audio_path):
+    return os.path.splitext(audio_path)[0] + ".peaks.json"
+
+
+def _read_pcm(audio_path):
+    """Mono samples scaled to [-1, 1] and the sample rate."""
+    try:
+        with wave.open(audio_path, "rb") as wav:
+            channels = wav.getnchannels()
+            sample_width = wav.getsampwidth()
+            sample_rate = wav.getframerate()
+            frames = wav.readframes(wav.getnframes())
+        dtype = _SAMPLE_DTYPES[sample_width]
+    except (wave.Error, EOFError, KeyError):
+        # Not plain PCM (some providers return float WAV or MP3); let ffmpeg decode it
+        result = subprocess.run(
+            [FFMPEG_BIN, "-nostdin", "-loglevel", "error", "-i", audio_path,
+             "-f", "s16le", "-ac", "1", "-ar", str(DECODE_SAMPLE_RATE), "-"],
+            check=True, capture_output=True, timeout=TRANSCODE_TIMEOUT,
+        )
+        frames, channels, sample_rate, dtype = result.stdout, 1, DECODE_SAMPLE_RATE, np.int16
+
+    samples = np.frombuffer(frames, dtype=dtype).astype(np.float32)
+    if dtype is np.uint8:
+        samples = (samples - 128) / 128
+    else:
+        samples /= np.iinfo(dtype).max
+    if channels > 1:
+        samples = samples[: len(samples) // channels * channels].reshape(-1, channels).mean(axis=1)
+    return samples, sample_rate
+
+
+def compute_peaks(audio_path, resolution=PEAKS_RESOLUTION):
+    """
+    Interleaved [min, max, min, max, ...] pairs over `resolution` equal slices
+    of the clip, plus its duration in seconds.
+    """
+    samples, sample_rate = _read_pcm(audio_path)
+    duration = len(samples) / sample_rate if sample_rate else 0
+    buckets = min(resolution, len(samples))
+    if not buckets:
+        return {"duration": duration, "peaks": [[]]}
+
+    # Pad with silence to a whole number of slices, then reduce each row
+    bucket_size = -(-len(samples) // buckets)
+    padded = np.zeros(buckets * bucket_size, dtype=np.float32)
+    padded[: len(samples)] = samples
+    rows = padded.reshape(buckets, bucket_size)
+    pairs = np.empty(buckets * 2, dtype=np.float32)
+    pairs[0::2] = rows.min(axis=1)
+    pairs[1::2] = rows.max(axis=1)
+    return {
+        "duration": round(duration, 3),
+        "peaks": [np.round(pairs, 3).tolist()],
+    }
+
+
+def ensure_peaks(audio_path):
+    """Compute and store the peaks for audio_path if missing, returning their path."""
+    dest_path = peaks_path(audio_path)
+    if os.path.exists(dest_path):
+        return dest_path
+
+    peaks = compute_peaks(audio_path)
+    # Unique per thread, since two first requests may race to compute the same clip
+    partial_path = f"{dest_path}.{threading.get_ident()}.part"
+    with open(partial_path, "w") as f:
+        json.dump(peaks, f, separators=(",", ":"))
+    os.replace(partial_path, dest_path)
+    return dest_path
+
+
+def remove_peaks(audio_path):
+    path = peaks_path(audio_path)
+    if os.path.exists(path):
+        try:
+            os.remove(path)
+        except OSError as e:
+            print(f"Error removing peaks file {path}: {str(e)}")
@@ -231,9 +231,24 @@ class WavePlayer {
     });
   }
   
-  loadAudio(url) {
+  loadAudio(url, peaksUrl = null) {
     this.showLoading();
-    this.wavesurfer.load(url);
+    if (peaksUrl) {
+      // Draw from precomputed peaks so the waveform doesn't wait for the whole file
+      fetch(peaksUrl)
+        .then(response => {
+          if (!response.ok) throw new Error(`Peaks request failed: ${response.status}`);
+          return response.json();
+        })
+        // wavesurfer.js v6 signature: load(url, peaks, preload, duration)
+        .then(data => this.wavesurfer.load(url, data.peaks, null, data.duration))
+        .catch(err => {
+          console.warn('Falling back to decoding audio for waveform:', err);
+          this.wavesurfer.load(url);
+        });
+    } else {
+      this.wavesurfer.load(url);
+    }
     
     // Safety timeout to ensure loading indicator gets hidden
     // even if the 'ready' event doesn't fire properly